@@ -77,6 +77,8 @@ class EnterpriseAwsSsoManagementStack(Stack):
                             "sso:ListPermissionSetsProvisionedToAccount",
                             "sso:ListInstances",
                             "sso:DeleteAccountAssignment",
+                            "sso:DescribeAccountAssignmentCreationStatus",
+                            "sso:DescribeAccountAssignmentDeletionStatus",
                         ],
                         effect=iam.Effect.ALLOW,
                         resources=["*"],
@@ -49,9 +49,45 @@ class EnterpriseAwsSsoExecStack(Stack):
         lambda_execution_handler_timeout_seconds: int = context.get(
             "assignment_execution_handler_timeout_seconds", 300
         )
+        assignment_definition_stream_batch_size: int = context.get(
+            "assignment_definition_stream_batch_size", 50
+        )
+        assignment_definition_stream_workers: int = context.get(
+            "assignment_definition_stream_workers", 8
+        )
+        assignment_execution_max_concurrency: int = context.get(
+            "assignment_execution_max_concurrency", 2
+        )
+        assignment_execution_workers: int = context.get("assignment_execution_workers", 10)
+        # SSO Admin API request rate shared by all concurrent execution handler instances
+        sso_admin_requests_per_second: float = context.get("sso_admin_requests_per_second", 10)
+        organization_snapshot_ttl_seconds: int = context.get(
+            "organization_snapshot_ttl_seconds", 300
+        )
+        # Target accounts carried by one assignment task message
+        assignment_task_max_targets: int = context.get("assignment_task_max_targets", 50)
+        # Maintain a per-account index of effective assignments and their source mappings
+        effective_assignments_index_enabled: bool = context.get(
+            "effective_assignments_index_enabled", False
+        )
+        # Optional schedule expression of the reconciliation run, e.g. "rate(1 day)"
+        reconciliation_schedule: str = context.get("reconciliation_schedule")
+        reconciliation_dry_run: bool = context.get("reconciliation_dry_run", True)
+        # Buffer service events in a queue, so one invocation publishes many of them
+        service_event_queue_enabled: bool = context.get("service_event_queue_enabled", False)
+        service_event_queue_batch_size: int = context.get("service_event_queue_batch_size", 100)
+        service_event_queue_batching_window_seconds: int = context.get(
+            "service_event_queue_batching_window_seconds", 5
+        )
+        service_event_handler_timeout_seconds: int = context.get(
+            "service_event_handler_timeout_seconds", 30
+        )
         assignment_processing_queue_name: str = context.get(
             "assignment_processing_queue_name", "assignment-processing-queue"
         )
+        assignment_processing_queue_fifo: bool = context.get(
+            "assignment_processing_queue_fifo", False
+        )
         assignment_defenition_table_name: str = context.get(
             "assignment_defenition_table_name", "permission-assignments-table"
         )
@@ -61,6 +97,9 @@ class EnterpriseAwsSsoExecStack(Stack):
         assignment_definition_table_sort_key: str = context.get(
             "assignment_definition_table_sort_key", "mappingValue"
         )
+        permission_set_name_index_name: str = context.get(
+            "permission_set_name_index_name", "permission-set-name-index"
+        )
 
         lambda_runtime = _lambda.Runtime.PYTHON_3_12
 
@@ -117,12 +156,36 @@ class EnterpriseAwsSsoExecStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
             stream=ddb.StreamViewType.NEW_AND_OLD_IMAGES,
         )
+        # Permission set operations look up the mappings of one permission set
+        self.sso_assignments_table.add_global_secondary_index(
+            index_name=permission_set_name_index_name,
+            partition_key=ddb.Attribute(name="PermissionSetName", type=ddb.AttributeType.STRING),
+            projection_type=ddb.ProjectionType.INCLUDE,
+            non_key_attributes=["PermissionSetStatus"],
+        )
+
+        self.effective_assignments_table = None
+        if effective_assignments_index_enabled:
+            self.effective_assignments_table = ddb.Table(
+                self,
+                "effective-assignments-table",
+                partition_key=ddb.Attribute(name="AccountId", type=ddb.AttributeType.STRING),
+                sort_key=ddb.Attribute(name="Assignment", type=ddb.AttributeType.STRING),
+                billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+                encryption=ddb.TableEncryption.AWS_MANAGED,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
 
         ## assignment task queue
         self.assignment_processing_queue = sqs.Queue(
             self,
             "assignment-processing-queue",
-            queue_name=assignment_processing_queue_name,
+            queue_name=(
+                f"{assignment_processing_queue_name}.fifo"
+                if assignment_processing_queue_fifo
+                else assignment_processing_queue_name
+            ),
+            fifo=True if assignment_processing_queue_fifo else None,
             encryption=sqs.QueueEncryption.KMS_MANAGED,
             delivery_delay=Duration.seconds(sqs_delivery_delay_seconds),
             visibility_timeout=Duration.seconds(sqs_visibility_timeout_seconds),
@@ -208,6 +271,8 @@ class EnterpriseAwsSsoExecStack(Stack):
                         "sso:ListPermissionSetsProvisionedToAccount",
                         "sso:ListInstances",
                         "sso:DeleteAccountAssignment",
+                        "sso:DescribeAccountAssignmentCreationStatus",
+                        "sso:DescribeAccountAssignmentDeletionStatus",
                     ],
                     effect=iam.Effect.ALLOW,
                     resources=["*"],
@@ -354,6 +419,7 @@ class EnterpriseAwsSsoExecStack(Stack):
             runtime=lambda_runtime,
             handler="index.handler",
             memory_size=256,
+            timeout=Duration.seconds(service_event_handler_timeout_seconds),
             role=self.service_event_handler_role,
             code=_lambda.Code.from_asset(
                 path=str(Path("src/functions/service_event_handler")),
@@ -369,6 +435,36 @@ class EnterpriseAwsSsoExecStack(Stack):
             },
         )
 
+        if service_event_queue_enabled:
+            # EventBridge can not send to queues encrypted with the AWS managed KMS key
+            self.service_event_queue = sqs.Queue(
+                self,
+                "service-event-queue",
+                encryption=sqs.QueueEncryption.SQS_MANAGED,
+                visibility_timeout=Duration.seconds(6 * service_event_handler_timeout_seconds),
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=5,
+                    queue=sqs.Queue(
+                        self,
+                        "service-event-dlq",
+                        encryption=sqs.QueueEncryption.SQS_MANAGED,
+                    ),
+                ),
+            )
+            self.service_event_handler.add_event_source(
+                lambda_event_sources.SqsEventSource(
+                    self.service_event_queue,
+                    batch_size=service_event_queue_batch_size,
+                    max_batching_window=Duration.seconds(
+                        service_event_queue_batching_window_seconds
+                    ),
+                    report_batch_item_failures=True,
+                )
+            )
+            service_event_target = event_targets.SqsQueue(self.service_event_queue)
+        else:
+            service_event_target = event_targets.LambdaFunction(self.service_event_handler)
+
         self.service_lifecycle_events_rule = events.Rule(
             self,
             "ServiceEventHandlerEventsRule",
@@ -379,7 +475,7 @@ class EnterpriseAwsSsoExecStack(Stack):
                 detail_type=["AWS Service Event via CloudTrail", "AWS API Call via CloudTrail"],
             ),
             rule_name=f"Forwarding-to-service-event-handler",
-            targets=[event_targets.LambdaFunction(self.service_event_handler)],
+            targets=[service_event_target],
         )
 
         # This function will define the assignments from the metadata in DynamoDB
@@ -409,6 +505,10 @@ class EnterpriseAwsSsoExecStack(Stack):
                 "ASSOCIATIONID_KEY_NAME": assignment_definition_table_partition_key,
                 "ASSOCIATIONID_SORT_KEY_NAME": assignment_definition_table_sort_key,
                 "SSO_ADMIN_ROLE_ARN": f"arn:aws:iam::{management_account_id}:role/{sso_management_read_only_role}",
+                "ORGANIZATION_SNAPSHOT_TTL_SECONDS": str(organization_snapshot_ttl_seconds),
+                "STREAM_PROCESSING_WORKERS": str(assignment_definition_stream_workers),
+                "ASSIGNMENT_TASK_MAX_TARGETS": str(assignment_task_max_targets),
+                "PERMISSION_SET_NAME_INDEX": permission_set_name_index_name,
             },
         )
 
@@ -425,13 +525,42 @@ class EnterpriseAwsSsoExecStack(Stack):
             targets=[event_targets.LambdaFunction(self.assignment_definition_handler)],
         )
 
+        if self.effective_assignments_table is not None:
+            self.assignment_definition_handler.add_environment(
+                "EFFECTIVE_ASSIGNMENTS_TABLE_NAME", self.effective_assignments_table.table_name
+            )
+            self.effective_assignments_table.grant_read_write_data(
+                self.assignment_definition_handler
+            )
+
+        if reconciliation_schedule:
+            events.Rule(
+                self,
+                "AssignmentReconciliationSchedule",
+                description="Reconcile Identity Center assignments with the mappings table",
+                schedule=events.Schedule.expression(reconciliation_schedule),
+                targets=[
+                    event_targets.LambdaFunction(
+                        self.assignment_definition_handler,
+                        event=events.RuleTargetInput.from_object(
+                            {
+                                "source": "enterprise-aws-sso",
+                                "detail-type": "Reconciliation",
+                                "detail": {"DryRun": reconciliation_dry_run},
+                            }
+                        ),
+                    )
+                ],
+            )
+
         # setting the assignments topic as the event source for the execution lambda
         self.assignment_definition_handler.add_event_source(
             lambda_event_sources.DynamoEventSource(
                 table=self.sso_assignments_table,
                 starting_position=_lambda.StartingPosition.TRIM_HORIZON,
-                batch_size=5,
+                batch_size=assignment_definition_stream_batch_size,
                 bisect_batch_on_error=True,
+                report_batch_item_failures=True,
                 on_failure=lambda_event_sources.SnsDlq(self.error_notification_topic),
                 retry_attempts=3,
             )
@@ -459,21 +588,34 @@ class EnterpriseAwsSsoExecStack(Stack):
                 self.sso_lambda_layer,
             ],
             environment={
+                "ASSIGNMENTS_QUEUE_URL": self.assignment_processing_queue.queue_url,
                 "ERROR_TOPIC_NAME": self.error_notification_topic.topic_arn,
                 "LOG_LEVEL": "INFO",
                 "POWERTOOLS_SERVICE_NAME": "enterprise-sso",
                 "ASSOCIATIONID_CONCAT_CHAR": "|",
                 "SSO_ADMIN_ROLE_ARN": f"arn:aws:iam::{management_account_id}:role/{sso_management_role}",
                 "MANAGEMENT_ACCOUNT_ID": management_account_id,
+                "ASSIGNMENT_EXECUTION_WORKERS": str(assignment_execution_workers),
+                "SSO_ADMIN_REQUESTS_PER_SECOND": str(
+                    sso_admin_requests_per_second / assignment_execution_max_concurrency
+                ),
+                "SSO_ADMIN_BURST": str(
+                    max(1, sso_admin_requests_per_second / assignment_execution_max_concurrency)
+                ),
             },
         )
 
         # setting the assignments queue as the event source for the execution lambda
         self.assignment_execution_handler.add_event_source(
             lambda_event_sources.SqsEventSource(
-                self.assignment_processing_queue, batch_size=10, max_concurrency=2
+                self.assignment_processing_queue,
+                batch_size=10,
+                max_concurrency=assignment_execution_max_concurrency,
+                report_batch_item_failures=True,
             )
         )
+        # Failed targets of a multi-target task are requeued as a new message
+        self.assignment_processing_queue.grant_send_messages(self.assignment_execution_handler)
 
     def _create_lambda_role(
         scope: Construct,
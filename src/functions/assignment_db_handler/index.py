@@ -8,9 +8,12 @@ import boto3
 import os
 import json
 import datetime
+import random
+import time
 
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
 from common.error import Error
 
 # Static data
@@ -23,11 +26,18 @@ iam_event_bus_arn = os.environ.get("IAM_EVENT_BRIDGE_ARN", "IAM_EVENT_BRIDGE_ARN
 
 EVENT_SOURCE = "permissionEventSource"
 PERMISSION_FOR_OU = "OrganizationalUnit"
+PERMISSION_FOR_OU_TREE = "OrganizationalUnitTree"
 PERMISSION_FOR_ACCOUNT = "Account"
 PERMISSION_FOR_TAG = "Tag"
 PERMISSION_FOR_ROOT = "Root"
 PERMISSION_ACTION_ADD = "Add"
 PERMISSION_ACTION_REMOVE = "Remove"
+# DynamoDB limits of one BatchWriteItem and one TransactWriteItems call
+BATCH_WRITE_SIZE = 25
+TRANSACT_WRITE_SIZE = 100
+MAX_ATTEMPTS = 8
+BASE_RETRY_DELAY = 0.05
+MAX_RETRY_DELAY = 5
 
 session = boto3.Session()
 event_bridge_client = session.client("events")
@@ -47,12 +57,14 @@ logger = error_handler.get_logger()
 ddb_resource = session.resource("dynamodb")
 ddb_client = session.client("dynamodb")
 ddb_table = ddb_resource.Table(assignment_table_name)
+serializer = TypeSerializer()
 # Mapping Structure:
 # "o:{organization_unit}|g:{group_name}|{permission_set_name}"
 # "o:Dev-Workbench-DevKit|g:workbench-devkit-developer|WB-DevKit-Developer"
 # Sample Mappings:
 # a:1234567890|u:testuser|AWSReadOnlyAccess
 # o:ou_name|g:Network-Readonly|Network-Readonly
+# s:ou_name|g:Network-Readonly|Network-Readonly (OU and all nested OUs)
 # t:account_tag|u:SomeUser|Readonly
 # r:root|g:Sec-Audit|Readonly
 
@@ -62,68 +74,130 @@ def handler(event, context):
     event_detail = event.get("detail")
 
     if event_source == EVENT_SOURCE:
-        permissions = event_detail.get("permissions")
-        target_principle = None
-        user_principle = None
-
-        for permission_info in permissions:
-            action_type = permission_info["ActionType"]
-
-            if permission_info.get("UserName"):
-                user = permission_info.get("UserName")
-                user_principle = f"u:{user}"
-            elif permission_info.get("GroupName"):
-                group = permission_info.get("GroupName")
-                user_principle = f"g:{group}"
-            else:
-                raise AttributeError
-
-            permission_type = permission_info["PermissionFor"]
-
-            if permission_type == PERMISSION_FOR_OU:
-                organization_unit = permission_info["OrganizationalUnitName"]
-                mapping_value_prefix = f"o:{organization_unit}"
-                target_principle = organization_unit
-
-            elif permission_type == PERMISSION_FOR_ACCOUNT:
-                account_number = permission_info["AccountNumber"]
-                mapping_value_prefix = f"a:{account_number}"
-                target_principle = account_number
-
-            elif permission_type == PERMISSION_FOR_TAG:
-                tag_name = permission_info["Tag"]
-                mapping_value_prefix = f"t:{tag_name}"
-                target_principle = tag_name
-
-            elif permission_type == PERMISSION_FOR_ROOT:
-                mapping_value_prefix = f"r:root"
-                target_principle = "root"
-            else:
-                raise AttributeError
-
-            permission_set_name = permission_info["PermissionSetName"]
-            mapping_value = f"{mapping_value_prefix}|{user_principle}|{permission_set_name}"
-
-            if action_type == PERMISSION_ACTION_REMOVE:
-                ddb_table.delete_item(
-                    Key={
-                        map_key_name: str(target_principle),
-                        map_sortkey_name: mapping_value,
-                    }
-                )
-            elif action_type == PERMISSION_ACTION_ADD:
-                ddb_table.put_item(
-                    Item={
-                        map_key_name: str(target_principle),
-                        map_sortkey_name: mapping_value,
-                        "PermissionSetStatus": "Enabled",
-                        "PermissionSetName": permission_set_name,
-                    }
-                )
-            else:
-                raise AttributeError
+        writes = normalize_permissions(event_detail.get("permissions"))
+        if event_detail.get("Atomic"):
+            transact_write(writes)
+        else:
+            batch_write(writes)
 
     return {
         "statusCode": 200,
         "body": json.dumps("Event was handled properly by Assignment DB Handler."),
     }
+
+
+def normalize_permissions(permissions):
+    """Turns permission entries into write requests, keeping the last action per mapping"""
+    writes = {}
+    for permission_info in permissions:
+        action_type = permission_info["ActionType"]
+
+        if permission_info.get("UserName"):
+            user = permission_info.get("UserName")
+            user_principle = f"u:{user}"
+        elif permission_info.get("GroupName"):
+            group = permission_info.get("GroupName")
+            user_principle = f"g:{group}"
+        else:
+            raise AttributeError
+
+        permission_type = permission_info["PermissionFor"]
+
+        if permission_type == PERMISSION_FOR_OU:
+            organization_unit = permission_info["OrganizationalUnitName"]
+            mapping_value_prefix = f"o:{organization_unit}"
+            target_principle = organization_unit
+
+        elif permission_type == PERMISSION_FOR_OU_TREE:
+            organization_unit = permission_info["OrganizationalUnitName"]
+            mapping_value_prefix = f"s:{organization_unit}"
+            target_principle = organization_unit
+
+        elif permission_type == PERMISSION_FOR_ACCOUNT:
+            account_number = permission_info["AccountNumber"]
+            mapping_value_prefix = f"a:{account_number}"
+            target_principle = account_number
+
+        elif permission_type == PERMISSION_FOR_TAG:
+            tag_name = permission_info["Tag"]
+            mapping_value_prefix = f"t:{tag_name}"
+            target_principle = tag_name
+
+        elif permission_type == PERMISSION_FOR_ROOT:
+            mapping_value_prefix = f"r:root"
+            target_principle = "root"
+        else:
+            raise AttributeError
+
+        permission_set_name = permission_info["PermissionSetName"]
+        mapping_value = f"{mapping_value_prefix}|{user_principle}|{permission_set_name}"
+        key = {map_key_name: str(target_principle), map_sortkey_name: mapping_value}
+
+        if action_type == PERMISSION_ACTION_REMOVE:
+            request = {"DeleteRequest": {"Key": serialize(key)}}
+        elif action_type == PERMISSION_ACTION_ADD:
+            request = {
+                "PutRequest": {
+                    "Item": serialize(
+                        {
+                            **key,
+                            "PermissionSetStatus": "Enabled",
+                            "PermissionSetName": permission_set_name,
+                        }
+                    )
+                }
+            }
+        else:
+            raise AttributeError
+
+        # A later entry for the same mapping replaces the earlier one
+        writes.pop((key[map_key_name], mapping_value), None)
+        writes[(key[map_key_name], mapping_value)] = request
+    return list(writes.values())
+
+
+def serialize(item):
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+
+def batch_write(writes):
+    for idx in range(0, len(writes), BATCH_WRITE_SIZE):
+        request_items = {assignment_table_name: writes[idx : idx + BATCH_WRITE_SIZE]}
+        for attempt in range(MAX_ATTEMPTS):
+            request_items = ddb_client.batch_write_item(RequestItems=request_items).get(
+                "UnprocessedItems"
+            )
+            if not request_items:
+                break
+            # Unprocessed items are retried with a jittered exponential delay
+            delay = min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2**attempt)
+            time.sleep(random.uniform(delay / 2, delay))
+        else:
+            unprocessed = len(request_items[assignment_table_name])
+            error_handler.publish_error_message(
+                request_items, f"{unprocessed} mappings were not written."
+            )
+            raise Exception(
+                f"{unprocessed} mappings were not written after {MAX_ATTEMPTS} attempts"
+            )
+    logger.info(f"Wrote {len(writes)} mappings")
+
+
+def transact_write(writes):
+    """Writes all mappings or none of them"""
+    if len(writes) > TRANSACT_WRITE_SIZE:
+        raise ValueError(
+            f"Atomic permission events are limited to {TRANSACT_WRITE_SIZE} mappings, got {len(writes)}"
+        )
+    transact_items = []
+    for request in writes:
+        if "PutRequest" in request:
+            transact_items.append(
+                {"Put": {"TableName": assignment_table_name, **request["PutRequest"]}}
+            )
+        else:
+            transact_items.append(
+                {"Delete": {"TableName": assignment_table_name, **request["DeleteRequest"]}}
+            )
+    ddb_client.transact_write_items(TransactItems=transact_items)
+    logger.info(f"Wrote {len(writes)} mappings in one transaction")
@@ -0,0 +1,97 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import patch
+
+from .. import index
+
+
+def permission(action_type, group, permission_set_name="ReadOnly", ou="Dev"):
+    return {
+        "ActionType": action_type,
+        "PermissionFor": "OrganizationalUnit",
+        "OrganizationalUnitName": ou,
+        "GroupName": group,
+        "PermissionSetName": permission_set_name,
+    }
+
+
+"""
+Assignment DB handler testing class
+"""
+
+
+class TestApp(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def test_0_last_action_per_mapping_wins(self):
+        writes = index.normalize_permissions(
+            [
+                permission("Add", "GroupA"),
+                permission("Add", "GroupB"),
+                permission("Remove", "GroupA"),
+            ]
+        )
+        assert writes == [
+            {
+                "PutRequest": {
+                    "Item": {
+                        "mappingId": {"S": "Dev"},
+                        "mappingValue": {"S": "o:Dev|g:GroupB|ReadOnly"},
+                        "PermissionSetStatus": {"S": "Enabled"},
+                        "PermissionSetName": {"S": "ReadOnly"},
+                    }
+                }
+            },
+            {
+                "DeleteRequest": {
+                    "Key": {
+                        "mappingId": {"S": "Dev"},
+                        "mappingValue": {"S": "o:Dev|g:GroupA|ReadOnly"},
+                    }
+                }
+            },
+        ]
+
+    def test_1_batch_write_retries_unprocessed_items(self):
+        event = {
+            "source": index.EVENT_SOURCE,
+            "detail": {"permissions": [permission("Add", f"Group{idx}") for idx in range(30)]},
+        }
+        with (
+            patch.object(index, "ddb_client") as ddb_client,
+            patch.object(index, "BASE_RETRY_DELAY", 0),
+        ):
+            ddb_client.batch_write_item.side_effect = lambda RequestItems: {
+                # The first chunk is only partially written on the first attempt
+                "UnprocessedItems": (
+                    {index.assignment_table_name: RequestItems[index.assignment_table_name][:2]}
+                    if ddb_client.batch_write_item.call_count == 1
+                    else {}
+                )
+            }
+            index.handler(event, {})
+        sizes = [
+            len(call.kwargs["RequestItems"][index.assignment_table_name])
+            for call in ddb_client.batch_write_item.call_args_list
+        ]
+        assert sizes == [25, 2, 5]
+
+    def test_2_atomic_write(self):
+        event = {
+            "source": index.EVENT_SOURCE,
+            "detail": {
+                "Atomic": True,
+                "permissions": [permission("Add", "GroupA"), permission("Remove", "GroupB")],
+            },
+        }
+        with patch.object(index, "ddb_client") as ddb_client:
+            index.handler(event, {})
+        transact_items = ddb_client.transact_write_items.call_args.kwargs["TransactItems"]
+        assert [list(item) for item in transact_items] == [["Put"], ["Delete"]]
+        ddb_client.batch_write_item.assert_not_called()
+
+        event["detail"]["permissions"] = [permission("Add", f"Group{idx}") for idx in range(101)]
+        with self.assertRaises(ValueError):
+            index.handler(event, {})
@@ -4,17 +4,22 @@
 ################################################################################
 
 import json
-from processing import process_mapdata, PrincipalNotFound
+from concurrent.futures import ThreadPoolExecutor
+from processing import mapping_source, process_mapdata, PrincipalNotFound
+from queries import query_mappings, scan_tag_mappings
 from config import Config_object
+from effective_index import SOURCES
+from orgz.tag_expression import TagExpressionError
 
 
 # {
 #  "AccountOperations":
 #     {
-#       "Action": "tagged|created|moved",
-#       "TagKey": "",
-#       "TagValue": "",
+#       "Action": "tagged|untagged|created|moved",
+#       "Tags": {},
+#       "TagKeys": [],
 #       "AccountId": "",
+#       "AccountIds": [], (created and moved, accounts aggregated by the service event handler)
 #       "AccountOuName": "",
 #       "AccountOldOuName": "",
 #     }
@@ -25,70 +30,288 @@ def account_operations_handler(controller: Config_object, payload: dict):
     controller.clients.logger.info("Received event from Service Handler.")
     action: str = payload.get("Action")
     account_id: str = payload.get("AccountId")
-    tag_key: str = payload.get("TagKey")
-    tag_value: str = payload.get("TagValue")
     parent_ou_name: str = payload.get("AccountOuName")
     parent_old_ou_name: str = payload.get("AccountOldOuName")
 
-    # Tag deletion is now handled as an untagresource api call when done from the web console. Can now be implemented.
-    # if action == "tagged":
-    #     if tag_key is not None:
-    #         controller.clients.logger.info(f"Org action detected. Account is tagged")
-    #         query_dynamo_table(
-    #            controller, f"{tag_key}={tag_value}", account_id, controller.data.ACTION_TYPE_CREATE
-    #         )
+    # Tag changes keep the tag index of this execution environment up to date
+    if action == "tagged":
+        controller.clients.logger.info(f"Organizations action detected. Account is tagged")
+        controller.clients.org.tag_index.apply_tags(account_id, payload.get("Tags", {}))
+    if action == "untagged":
+        controller.clients.logger.info(f"Organizations action detected. Account is untagged")
+        controller.clients.org.tag_index.remove_tags(account_id, payload.get("TagKeys", []))
+    if action in ("created", "moved"):
+        account_ids = active_account_ids(controller, payload.get("AccountIds") or [account_id])
     if action == "created":
-        controller.clients.logger.info(f"Organizatins action detected. Account is created")
-        query_dynamo_table(controller, "root", account_id, controller.data.ACTION_TYPE_CREATE)
+        controller.clients.logger.info(
+            f"Organizatins action detected. {len(account_ids)} accounts are created"
+        )
+        root_mappings = find_effective_mappings(controller, [("root", None)])[0]
+        apply_account_mappings(
+            controller,
+            {account_id: ({}, root_mappings) for account_id in account_ids},
+        )
     if action == "moved":
-        controller.clients.logger.info(f"Organizations action detected. Account is moved")
-        query_dynamo_table(
+        controller.clients.logger.info(
+            f"Organizations action detected. {len(account_ids)} accounts are moved"
+        )
+        # The mappings of both parents are queried once for all accounts of the move.
+        # A backfilled effective index already lists the OU mappings of each account.
+        effective_index = controller.clients.effective_index
+        from_index = effective_index is not None and effective_index.is_backfilled()
+        old_lookups = (
+            []
+            if from_index
+            else ou_lookups(controller, ou_mapping_scopes(controller, parent_old_ou_name))
+        )
+        new_lookups = ou_lookups(controller, ou_mapping_scopes(controller, parent_ou_name))
+        lookup_sets = []
+        for moved_account_id in account_ids:
+            # Root and account mappings and mappings of OUs above both parents
+            # apply before and after the move
+            common_lookups = [("root", None), (moved_account_id, None)]
+            lookup_sets += [common_lookups + old_lookups, common_lookups + new_lookups]
+        effective_sets = find_effective_mappings(controller, *lookup_sets)
+        # Tag mappings apply before and after the move as well
+        for idx, tag_mappings in enumerate(matching_tag_mappings(controller, account_ids)):
+            for effective_mappings in effective_sets[2 * idx : 2 * idx + 2]:
+                for key, items in tag_mappings.items():
+                    effective_mappings.setdefault(key, []).extend(items)
+        if from_index:
+            for idx, ou_mappings in enumerate(indexed_ou_mappings(controller, account_ids)):
+                for key, items in ou_mappings.items():
+                    effective_sets[2 * idx].setdefault(key, []).extend(items)
+        apply_account_mappings(
             controller,
-            (
-                "root"
-                if parent_old_ou_name.startswith("r-")
-                else controller.clients.org.describe_ou_name(parent_old_ou_name)
-            ),
-            account_id,
-            controller.data.ACTION_TYPE_DELETE,
+            {
+                moved_account_id: (effective_sets[2 * idx], effective_sets[2 * idx + 1])
+                for idx, moved_account_id in enumerate(account_ids)
+            },
         )
-        if not parent_ou_name.startswith("r-"):
-            query_dynamo_table(
-                controller,
-                controller.clients.org.describe_ou_name(parent_ou_name),
-                account_id,
-                controller.data.ACTION_TYPE_CREATE,
-            )
     return {
         "statusCode": 200,
         "body": json.dumps("Received Organizations Event has been successfully processed."),
     }
 
 
-def query_dynamo_table(controller, query_key, account_id, assignment_action):
-    key_condition_expression_value = f"{controller.config.map_key_name} = :queryValue"
-    result = controller.clients.dynamodb.query(
-        TableName=controller.config.table_name,
-        KeyConditionExpression=key_condition_expression_value,
-        ExpressionAttributeValues={":queryValue": {"S": query_key}},
-    )
-    controller.clients.logger.info(f"search results :{str(result)}")
-
-    if result.get("Count") > 0:
-        for item in result["Items"]:
-            aws_principal, idp_principal, permission_set_name = item[
-                controller.config.map_sortkey_name
-            ]["S"].split(controller.config.associationid_concat_char)
-            try:
-                process_mapdata(
-                    controller,
-                    f"a:{account_id}",
-                    idp_principal,
-                    permission_set_name,
-                    assignment_action,
-                    item,
+def active_account_ids(controller, account_ids):
+    active = []
+    for account_id in account_ids:
+        if controller.clients.org.describe_account(account_id)["Account"]["Status"] == "ACTIVE":
+            active.append(account_id)
+        else:
+            controller.clients.logger.warning(
+                f"AWS Account {account_id} was not found or is not active, skipping it"
+            )
+    return active
+
+
+def ou_mapping_scopes(controller, parent_id):
+    """Mapping types per OU id which apply to accounts directly under the parent"""
+    if parent_id.startswith("r-"):
+        return {}
+    scopes = {parent_id: {"o", "s"}}
+    for ancestor_id in controller.clients.org.get_ancestor_ou_ids(parent_id):
+        scopes[ancestor_id] = {"s"}
+    return scopes
+
+
+def ou_lookups(controller, scopes):
+    """OU mappings are stored under the path of the OU, not under its name"""
+    return [
+        (controller.clients.org.get_ou_path(ou_id), mapping_types)
+        for ou_id, mapping_types in scopes.items()
+    ]
+
+
+def indexed_ou_mappings(controller, account_ids):
+    """Returns, per account, the OU mappings the effective index lists as sources.
+
+    Mappings are grouped by principal and permission set like the ones of
+    find_effective_mappings, each as an item holding only its keys.
+    """
+    concat_char = controller.config.associationid_concat_char
+
+    def read(account_id):
+        mappings = {}
+        for assignment in controller.clients.effective_index.get_account_assignments(account_id):
+            for source in assignment[SOURCES]:
+                mapping_id, mapping_value = source.split(concat_char, 1)
+                aws_principal, idp_principal, permission_set_name = mapping_value.split(
+                    concat_char
                 )
-            except PrincipalNotFound:
-                controller.clients.logger.info(
-                    f"Principal {idp_principal} missing, moving on to next record from DynamoDB"
+                # Root, account and tag mappings are not changed by a move
+                if aws_principal.split(":")[0].lower() not in ("o", "s"):
+                    continue
+                item = {
+                    controller.config.map_key_name: mapping_id,
+                    controller.config.map_sortkey_name: mapping_value,
+                }
+                mappings.setdefault((idp_principal, permission_set_name), []).append(item)
+        return mappings
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(account_ids), controller.config.mapping_processing_workers))
+    ) as executor:
+        return list(executor.map(read, account_ids))
+
+
+def matching_tag_mappings(controller, account_ids):
+    """Returns, per account, the tag mappings whose tag expression matches the account.
+
+    Tag mappings are stored under their expression, e.g. "env=prod AND team=x"
+    or "env=prod,dev", so they cannot be queried from the tags of an account.
+    They are scanned once and every expression is evaluated once for all accounts.
+    """
+    concat_char = controller.config.associationid_concat_char
+    expressions = {}
+    for item in scan_tag_mappings(
+        controller.clients.dynamodb,
+        controller.config.table_name,
+        controller.config.map_sortkey_name,
+    ):
+        aws_principal, idp_principal, permission_set_name = item[
+            controller.config.map_sortkey_name
+        ].split(concat_char)
+        expressions.setdefault(aws_principal.split(":", 1)[1], []).append(
+            ((idp_principal, permission_set_name), item)
+        )
+
+    account_mappings = [{} for _ in account_ids]
+    for expression, items in expressions.items():
+        try:
+            accounts = controller.clients.org.get_account_set_for_tag_expression(expression)
+        except TagExpressionError as exception:
+            controller.clients.logger.error(f"Tag mapping {expression} skipped: {exception}")
+            continue
+        for idx, account_id in enumerate(account_ids):
+            if account_id in accounts:
+                for key, item in items:
+                    account_mappings[idx].setdefault(key, []).append(item)
+    return account_mappings
+
+
+def find_effective_mappings(controller, *lookup_sets):
+    """Returns, per set of (query key, mapping types) lookups, the mappings which apply.
+
+    Mappings are grouped by principal and permission set, every partition is
+    queried once and all of them at the same time.
+    """
+    query_keys = {query_key for lookups in lookup_sets for query_key, _ in lookups}
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(query_keys), controller.config.mapping_processing_workers))
+    ) as executor:
+        found = {
+            query_key: executor.submit(
+                list,
+                query_mappings(
+                    controller.clients.dynamodb,
+                    controller.config.table_name,
+                    controller.config.map_key_name,
+                    query_key,
+                ),
+            )
+            for query_key in query_keys
+        }
+        effective_sets = []
+        for lookups in lookup_sets:
+            mappings = {}
+            for query_key, mapping_types in lookups:
+                for item in found[query_key].result():
+                    aws_principal, idp_principal, permission_set_name = item[
+                        controller.config.map_sortkey_name
+                    ].split(controller.config.associationid_concat_char)
+                    if mapping_types and aws_principal.split(":")[0].lower() not in mapping_types:
+                        continue
+                    mappings.setdefault((idp_principal, permission_set_name), []).append(item)
+            effective_sets.append(mappings)
+    return effective_sets
+
+
+def apply_account_mappings(controller, account_mappings):
+    """Queues only the difference between the mappings which applied before and after.
+
+    ``account_mappings`` holds the (old, new) effective mappings per account.
+    Accounts with the same change are processed together, so a change shared
+    by all accounts of a move is resolved and queued once.
+
+    With the effective index, every mapping which stopped or started to apply
+    is a change of its source, also when another mapping grants the same
+    assignment before and after. Sources are added before any is removed, so
+    an assignment granted after the move never drops to zero sources.
+    """
+    track_sources = controller.clients.effective_index is not None
+    changes = {}
+    for account_id, (old_mappings, new_mappings) in account_mappings.items():
+        account_changes = []
+        for key in old_mappings.keys() | new_mappings.keys():
+            old_items = old_mappings.get(key, [])
+            new_items = new_mappings.get(key, [])
+            if not track_sources:
+                if not old_items:
+                    account_changes.append(
+                        (controller.data.ACTION_TYPE_CREATE, new_items[0], False)
+                    )
+                elif not new_items:
+                    account_changes.append(
+                        (controller.data.ACTION_TYPE_DELETE, old_items[0], False)
+                    )
+                continue
+            old_sources = {mapping_source(controller, item): item for item in old_items}
+            new_sources = {mapping_source(controller, item): item for item in new_items}
+            # Sources of assignments granted before and after only update the index
+            account_changes += [
+                (controller.data.ACTION_TYPE_CREATE, item, bool(old_items))
+                for source, item in new_sources.items()
+                if source not in old_sources
+            ] + [
+                (controller.data.ACTION_TYPE_DELETE, item, bool(new_items))
+                for source, item in old_sources.items()
+                if source not in new_sources
+            ]
+        controller.clients.logger.info(
+            f"{len(old_mappings.keys() ^ new_mappings.keys())} assignment changes for account "
+            f"{account_id}, {len(old_mappings.keys() & new_mappings.keys())} unchanged"
+        )
+        for action, item, index_only in account_changes:
+            change = (
+                action,
+                item[controller.config.map_key_name],
+                item[controller.config.map_sortkey_name],
+                index_only,
+            )
+            changes.setdefault(change, (item, []))[1].append(account_id)
+
+    with ThreadPoolExecutor(max_workers=controller.config.mapping_processing_workers) as executor:
+        for phase in (controller.data.ACTION_TYPE_CREATE, controller.data.ACTION_TYPE_DELETE):
+            futures = [
+                executor.submit(
+                    process_account_mapping, controller, account_ids, action, item, index_only
                 )
+                for (action, _, _, index_only), (item, account_ids) in changes.items()
+                if action == phase
+            ]
+            # Errors other than missing principals fail the event
+            for future in futures:
+                future.result()
+
+
+def process_account_mapping(controller, account_ids, assignment_action, item, index_only=False):
+    aws_principal, idp_principal, permission_set_name = item[
+        controller.config.map_sortkey_name
+    ].split(controller.config.associationid_concat_char)
+    try:
+        process_mapdata(
+            controller,
+            aws_principal,
+            idp_principal,
+            permission_set_name,
+            assignment_action,
+            item,
+            target_accounts=account_ids,
+            index_only=index_only,
+        )
+    except PrincipalNotFound:
+        controller.clients.logger.info(
+            f"Principal {idp_principal} missing, moving on to next record from DynamoDB"
+        )
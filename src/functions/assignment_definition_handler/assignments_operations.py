@@ -4,6 +4,7 @@
 ################################################################################
 
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from processing import process_mapdata, PrincipalNotFound
 from common.encoder import PythonObjectEncoder
@@ -11,62 +12,110 @@ from config import Config_object
 import json
 
 
-def assignments_operations_handler(controller: Config_object, records: list):
+def assignments_operations_handler(controller: Config_object, records: list) -> list:
+    """Processes DynamoDB stream records and returns the records that failed.
+
+    Records of the same mapping are processed in order by one worker, records
+    of different mappings are processed concurrently. Once a record fails, the
+    following records of its mapping are skipped and reported as failed too.
+    """
+    prefetch_groups(controller, records)
+
+    mapping_records = {}
+    for record in records:
+        mapping_id = record["dynamodb"]["Keys"][controller.config.map_key_name]["S"]
+        mapping_records.setdefault(mapping_id, []).append(record)
+
+    failed_records = []
+    with ThreadPoolExecutor(max_workers=controller.config.stream_processing_workers) as executor:
+        for failed in executor.map(
+            lambda mapping: process_mapping_records(controller, mapping),
+            mapping_records.values(),
+        ):
+            failed_records += failed
+    return failed_records
+
+
+def process_mapping_records(controller: Config_object, records: list) -> list:
+    for idx, record in enumerate(records):
+        try:
+            process_record(controller, record)
+        except Exception as exception:
+            controller.clients.logger.error("Exception: " + str(exception))
+            controller.clients.error_handler.publish_error_message(record, str(exception))
+            return records[idx:]
+    return []
+
+
+def process_record(controller: Config_object, record: dict):
     assignment_action: str
     stream_key: str
     aws_principal: str
     idp_principal: str
     permission_set_name: str
 
-    for record in records:
-        # TODO switch to parallel processing.
-        controller.clients.logger.info(str(record["dynamodb"]))
-        controller.clients.logger.debug(
-            f"Stream record: {json.dumps(record, indent=2, cls=PythonObjectEncoder)}"
-        )
-        if "NewImage" in record["dynamodb"]:
-            assignment_action = controller.data.ACTION_TYPE_CREATE
-            stream_key = "NewImage"
-        elif "OldImage" in record["dynamodb"]:
-            assignment_action = controller.data.ACTION_TYPE_DELETE
-            stream_key = "OldImage"
-        else:
-            error_msg = f"OldImage nor NewImage key was not found in dynamodb string."
-            controller.clients.logger.error(error_msg)
-            controller.clients.error_handler.publish_error_message(record, error_msg)
-            raise AttributeError
+    controller.clients.logger.info(str(record["dynamodb"]))
+    controller.clients.logger.debug(
+        f"Stream record: {json.dumps(record, indent=2, cls=PythonObjectEncoder)}"
+    )
+    if "NewImage" in record["dynamodb"]:
+        assignment_action = controller.data.ACTION_TYPE_CREATE
+        stream_key = "NewImage"
+    elif "OldImage" in record["dynamodb"]:
+        assignment_action = controller.data.ACTION_TYPE_DELETE
+        stream_key = "OldImage"
+    else:
+        error_msg = f"OldImage nor NewImage key was not found in dynamodb string."
+        controller.clients.logger.error(error_msg)
+        raise AttributeError(error_msg)
 
-        aws_principal, idp_principal, permission_set_name = record["dynamodb"][stream_key][
-            controller.config.map_sortkey_name
-        ]["S"].split(controller.config.associationid_concat_char)
-        permission_set_state = (
-            record["dynamodb"][stream_key]
-            .get(controller.config.permission_set_status)
-            .get("S", "Enabled")
-        )
-        try:
-            if permission_set_state == "Enabled":
-                process_mapdata(
-                    controller,
-                    aws_principal,
-                    idp_principal,
-                    permission_set_name,
-                    assignment_action,
-                    record,
-                )
-            else:
-                controller.clients.logger.info(
-                    f"Permission set {permission_set_name} is disabled. Removing permissions from AWS SSO"
-                )
-                process_mapdata(
-                    controller,
-                    aws_principal,
-                    idp_principal,
-                    permission_set_name,
-                    controller.data.ACTION_TYPE_DELETE,
-                    record,
-                )
-        except PrincipalNotFound:
+    aws_principal, idp_principal, permission_set_name = record["dynamodb"][stream_key][
+        controller.config.map_sortkey_name
+    ]["S"].split(controller.config.associationid_concat_char)
+    permission_set_state = (
+        record["dynamodb"][stream_key]
+        .get(controller.config.permission_set_status)
+        .get("S", "Enabled")
+    )
+    try:
+        if permission_set_state == "Enabled":
+            process_mapdata(
+                controller,
+                aws_principal,
+                idp_principal,
+                permission_set_name,
+                assignment_action,
+                record,
+            )
+        else:
             controller.clients.logger.info(
-                f"Principal {idp_principal} missing, moving on to next record from DynamoDB"
+                f"Permission set {permission_set_name} is disabled. Removing permissions from AWS SSO"
+            )
+            process_mapdata(
+                controller,
+                aws_principal,
+                idp_principal,
+                permission_set_name,
+                controller.data.ACTION_TYPE_DELETE,
+                record,
             )
+    except PrincipalNotFound:
+        controller.clients.logger.info(
+            f"Principal {idp_principal} missing, moving on to next record from DynamoDB"
+        )
+
+
+def prefetch_groups(controller: Config_object, records: list):
+    """Loads all groups at once when a batch refers to many of them"""
+    group_names = set()
+    for record in records:
+        image = record["dynamodb"].get("NewImage") or record["dynamodb"].get("OldImage") or {}
+        mapping_value = image.get(controller.config.map_sortkey_name, {}).get("S", "")
+        mapping_parts = mapping_value.split(controller.config.associationid_concat_char)
+        if len(mapping_parts) == 3 and mapping_parts[1].lower().startswith("g:"):
+            group_names.add(mapping_parts[1])
+    if len(group_names) >= controller.config.group_prefetch_threshold:
+        controller.clients.logger.info(
+            f"Batch refers to {len(group_names)} groups, prefetching all groups from identity store"
+        )
+        controller.clients.principals.prefetch_groups()
@@ -0,0 +1,69 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import hashlib
+import itertools
+import threading
+
+
+class AssignmentCoalescer:
+    """Collects the assignment tasks of one invocation before they are published.
+
+    Tasks are keyed by (TargetId, PrincipalType, PrincipalId, PermissionSetArn).
+    Duplicates collapse into one task, and when opposite actions are queued for
+    the same key only the action of the latest record is kept. Records are
+    ordered by their stream sequence number, or by arrival for other events.
+
+    Each task keeps the origin of the record it was kept from, the stream
+    sequence number or else the id of the event, for its deduplication id.
+    """
+
+    def __init__(self, origin=None):
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self.received = 0
+        self.origin = origin
+
+    def add(
+        self,
+        accounts,
+        principal_type,
+        principal_id,
+        permission_set_arn,
+        action,
+        sequence_number=None,
+    ):
+        with self._lock:
+            if sequence_number is not None:
+                order = (int(sequence_number), 0)
+                origin = sequence_number
+            else:
+                order = (0, next(self._counter))
+                origin = self.origin
+            for account in accounts:
+                self.received += 1
+                key = (account, principal_type, principal_id, permission_set_arn)
+                current = self._tasks.get(key)
+                if current is None or current[0] < order:
+                    self._tasks[key] = (order, action, origin)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def grouped(self):
+        """Groups the remaining tasks by principal, permission set, action and origin"""
+        groups = {}
+        with self._lock:
+            for key, (_, action, origin) in self._tasks.items():
+                account, principal_type, principal_id, permission_set_arn = key
+                group = (principal_type, principal_id, permission_set_arn, action, origin)
+                groups.setdefault(group, []).append(account)
+        return groups
+
+
+def deduplication_id(*task):
+    """SQS FIFO deduplication or group id, a digest of the task content"""
+    return hashlib.sha256("|".join(task).encode()).hexdigest()
@@ -6,7 +6,11 @@
 from aws_assume_role_lib import assume_role
 from sso.handler import SsoService
 from orgz.handler import Organizations
+from botocore.config import Config
 from common.error import Error
+from common.publishing import SqsBatchPublisher
+from principals import PrincipalResolver
+from effective_index import EffectiveAssignmentIndex
 
 import boto3
 import os
@@ -34,7 +38,33 @@ def load_config():
     controller.config.table_name = os.environ.get(
         "ASSIGNMENTS_TABLE_NAME", "TEST_ASSIGNMENT_TABLE_NAME"
     )
+    controller.config.permission_set_name_index = os.getenv(
+        "PERMISSION_SET_NAME_INDEX", "permission-set-name-index"
+    )
+    controller.config.scan_segments = int(os.getenv("ASSIGNMENTS_SCAN_SEGMENTS", "4"))
+    controller.config.status_update_workers = int(os.getenv("STATUS_UPDATE_WORKERS", "8"))
+    controller.config.mapping_processing_workers = int(os.getenv("MAPPING_PROCESSING_WORKERS", "8"))
     controller.config.associationid_concat_char = os.getenv("ASSOCIATIONID_CONCAT_CHAR", "|")
+    controller.config.max_targets_per_task = int(os.getenv("ASSIGNMENT_TASK_MAX_TARGETS", "50"))
+    controller.config.org_snapshot_ttl = int(os.getenv("ORGANIZATION_SNAPSHOT_TTL_SECONDS", "300"))
+    controller.config.principal_cache_size = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+    controller.config.principal_cache_ttl = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+    controller.config.principal_negative_cache_ttl = int(
+        os.getenv("PRINCIPAL_NEGATIVE_CACHE_TTL_SECONDS", "30")
+    )
+    controller.config.permission_set_cache_ttl = int(
+        os.getenv("PERMISSION_SET_CACHE_TTL_SECONDS", "300")
+    )
+    controller.config.permission_set_describe_workers = int(
+        os.getenv("PERMISSION_SET_DESCRIBE_WORKERS", "8")
+    )
+    controller.config.stream_processing_workers = int(os.getenv("STREAM_PROCESSING_WORKERS", "8"))
+    controller.config.sqs_publish_workers = int(os.getenv("SQS_PUBLISH_WORKERS", "8"))
+    # The effective assignment index is maintained only when its table is configured
+    controller.config.effective_index_table_name = os.getenv("EFFECTIVE_ASSIGNMENTS_TABLE_NAME")
+    controller.config.effective_index_workers = int(os.getenv("EFFECTIVE_INDEX_WORKERS", "8"))
+    controller.config.reconciliation_workers = int(os.getenv("RECONCILIATION_WORKERS", "4"))
+    controller.config.group_prefetch_threshold = int(os.getenv("GROUP_PREFETCH_THRESHOLD", "10"))
 
     controller.config.permission_set_status = "PermissionSetStatus"
     controller.config.permission_set_name = "PermissionSetName"
@@ -46,13 +76,47 @@ def load_config():
     # Clients
     controller.clients = Config_object("Client configuration")
     controller.clients.sso = SsoService(assumed_role_session)
-    controller.clients.org = Organizations(role=assumed_role_session)
+    controller.clients.org = Organizations(
+        role=assumed_role_session, snapshot_ttl=controller.config.org_snapshot_ttl
+    )
     controller.clients.identity_store = assumed_role_session.client("identitystore")
-    controller.clients.dynamodb = session.client("dynamodb")
+    controller.clients.principals = PrincipalResolver(
+        controller.clients.identity_store,
+        controller.clients.sso.identity_store_id,
+        max_size=controller.config.principal_cache_size,
+        ttl=controller.config.principal_cache_ttl,
+        negative_ttl=controller.config.principal_negative_cache_ttl,
+    )
+    controller.clients.dynamodb = session.client(
+        "dynamodb",
+        config=Config(
+            max_pool_connections=max(
+                controller.config.scan_segments,
+                controller.config.status_update_workers,
+                controller.config.effective_index_workers,
+            )
+        ),
+    )
+    controller.clients.effective_index = (
+        EffectiveAssignmentIndex(
+            controller.clients.dynamodb,
+            controller.config.effective_index_table_name,
+            max_workers=controller.config.effective_index_workers,
+        )
+        if controller.config.effective_index_table_name
+        else None
+    )
     controller.clients.dynamodb_table = session.resource("dynamodb").Table(
         controller.config.table_name
     )
-    controller.clients.sqs = session.client("sqs")
+    controller.clients.sqs = session.client(
+        "sqs", config=Config(max_pool_connections=controller.config.sqs_publish_workers)
+    )
+    controller.clients.sqs_publisher = SqsBatchPublisher(
+        controller.clients.sqs,
+        controller.config.queue_url,
+        max_workers=controller.config.sqs_publish_workers,
+    )
     # Error handling
     controller.clients.error_handler = Error(
         sns_topic=sns_arn,
@@ -63,7 +127,10 @@ def load_config():
 
     # Datablocks
     controller.data = Config_object("Datablocks")
-    controller.data.permission_sets = controller.clients.sso.get_permission_sets()
+    controller.data.permission_sets = controller.clients.sso.get_permission_sets(
+        ttl=controller.config.permission_set_cache_ttl,
+        max_workers=controller.config.permission_set_describe_workers,
+    )
     controller.data.ACTION_TYPE_CREATE = "CREATE"
     controller.data.ACTION_TYPE_DELETE = "DELETE"
     controller.data.GROUP_PRINCIPAL_TYPE = "GROUP"
@@ -0,0 +1,154 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+_deserializer = TypeDeserializer()
+
+ACCOUNT_KEY = "AccountId"
+ASSIGNMENT_KEY = "Assignment"
+SOURCES = "Sources"
+# Item written once the index has been filled from all mappings
+BACKFILL_KEY = {ACCOUNT_KEY: {"S": "#backfill"}, ASSIGNMENT_KEY: {"S": "#backfill"}}
+
+
+def assignment_key(principal_type, principal_id, permission_set_arn):
+    return f"{principal_type}|{principal_id}|{permission_set_arn}"
+
+
+class EffectiveAssignmentIndex:
+    """Materialized effective assignments, one item per account and assignment.
+
+    Each item holds the set of mappings the assignment comes from, as
+    "mappingId|mappingValue" strings. Sources are added and removed with
+    atomic set updates, so the same stream record can be applied twice, and
+    an item is removed once its last source is gone.
+
+    Mappings created before the index only have sources once a
+    reconciliation run backfilled it. Until then ``is_backfilled`` is false
+    and source sets may be incomplete.
+    """
+
+    # A missing backfill marker is looked up again after this many seconds
+    backfill_check_interval = 300
+
+    def __init__(self, client, table_name, max_workers=8):
+        self.client = client
+        self.table_name = table_name
+        self.max_workers = max_workers
+        self._backfilled = False
+        self._backfill_checked_at = None
+
+    def is_backfilled(self):
+        if not self._backfilled and (
+            self._backfill_checked_at is None
+            or time.monotonic() - self._backfill_checked_at > self.backfill_check_interval
+        ):
+            response = self.client.get_item(TableName=self.table_name, Key=BACKFILL_KEY)
+            self._backfilled = "Item" in response
+            self._backfill_checked_at = time.monotonic()
+        return self._backfilled
+
+    def mark_backfilled(self):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={**BACKFILL_KEY, "BackfilledAt": {"N": str(int(time.time()))}},
+        )
+        self._backfilled = True
+
+    def add_source(self, accounts, principal_type, principal_id, permission_set_arn, source):
+        return self._update(
+            accounts, principal_type, principal_id, permission_set_arn, source, "ADD"
+        )
+
+    def remove_source(self, accounts, principal_type, principal_id, permission_set_arn, source):
+        return self._update(
+            accounts, principal_type, principal_id, permission_set_arn, source, "DELETE"
+        )
+
+    def get_assignment_sources(self, accounts, principal_type, principal_id, permission_set_arn):
+        """Returns the current sources of an assignment per account"""
+        sort_key = assignment_key(principal_type, principal_id, permission_set_arn)
+
+        def read(account_id):
+            response = self.client.get_item(
+                TableName=self.table_name,
+                Key={ACCOUNT_KEY: {"S": account_id}, ASSIGNMENT_KEY: {"S": sort_key}},
+                ProjectionExpression="#sources",
+                ExpressionAttributeNames={"#sources": SOURCES},
+                ConsistentRead=True,
+            )
+            return account_id, set(response.get("Item", {}).get(SOURCES, {}).get("SS", []))
+
+        accounts = list(accounts)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(accounts)))
+        ) as executor:
+            return dict(executor.map(read, accounts))
+
+    def get_account_assignments(self, account_id):
+        """Effective assignments of an account with the mappings they come from"""
+        assignments = []
+        for page in self.client.get_paginator("query").paginate(
+            TableName=self.table_name,
+            KeyConditionExpression="#account = :account",
+            ExpressionAttributeNames={"#account": ACCOUNT_KEY},
+            ExpressionAttributeValues={":account": {"S": account_id}},
+        ):
+            for item in page.get("Items", []):
+                assignment = {key: _deserializer.deserialize(value) for key, value in item.items()}
+                assignment[SOURCES] = assignment.get(SOURCES, set())
+                assignments.append(assignment)
+        return assignments
+
+    def _update(
+        self, accounts, principal_type, principal_id, permission_set_arn, source, operation
+    ):
+        """Returns the remaining sources per account after the update"""
+        sort_key = assignment_key(principal_type, principal_id, permission_set_arn)
+
+        def update(account_id):
+            key = {ACCOUNT_KEY: {"S": account_id}, ASSIGNMENT_KEY: {"S": sort_key}}
+            response = self.client.update_item(
+                TableName=self.table_name,
+                Key=key,
+                UpdateExpression=(
+                    f"{operation} #sources :source "
+                    "SET PrincipalType = :principal_type, PrincipalId = :principal_id, "
+                    "PermissionSetArn = :permission_set_arn"
+                ),
+                ExpressionAttributeNames={"#sources": SOURCES},
+                ExpressionAttributeValues={
+                    ":source": {"SS": [source]},
+                    ":principal_type": {"S": principal_type},
+                    ":principal_id": {"S": principal_id},
+                    ":permission_set_arn": {"S": permission_set_arn},
+                },
+                ReturnValues="ALL_NEW",
+            )
+            sources = set(response.get("Attributes", {}).get(SOURCES, {}).get("SS", []))
+            if not sources:
+                try:
+                    # A source added concurrently keeps the item
+                    self.client.delete_item(
+                        TableName=self.table_name,
+                        Key=key,
+                        ConditionExpression="attribute_not_exists(#sources)",
+                        ExpressionAttributeNames={"#sources": SOURCES},
+                    )
+                except ClientError as exception:
+                    if exception.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                        raise
+            return account_id, sources
+
+        accounts = list(accounts)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(accounts)))
+        ) as executor:
+            return dict(executor.map(update, accounts))
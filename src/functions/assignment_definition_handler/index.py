@@ -8,8 +8,11 @@ import json
 from account_operations import account_operations_handler
 from assignments_operations import assignments_operations_handler
 from permissionset_operations import permission_operations_handler
+from reconciliation import reconciliation_handler
 from aws_lambda_powertools import Logger
+from coalescing import AssignmentCoalescer
 from config import load_config
+from sqs import publish_assignment_tasks
 
 logger = Logger()
 
@@ -22,9 +25,9 @@ controller = None
 #   "DetailType": "AccountOperations",
 #   "Detail":
 #     {
-#       "Action": "tagged|created|moved",
-#       "TagKey": "",
-#       "TagValue": "",
+#       "Action": "tagged|untagged|created|moved",
+#       "Tags": {},
+#       "TagKeys": [],
 #       "AccountId": "",
 #       "AccountOuName": "",
 #       "AccountOldOuName": "If present if not have to look for a solution",
@@ -50,15 +53,34 @@ def handler(event: dict, context):
     if controller is None:
         controller = load_config()
 
+    # Assignment tasks of this invocation are collected and published at the end
+    controller.coalescer = AssignmentCoalescer(origin=event.get("id"))
+
     if event_source := event.get("source"):
+        report = None
         if event_source == "enterprise-aws-sso":
             detail_type = event.get("detail-type")
             if detail_type == "AccountOperation":
                 account_operations_handler(controller, event.get("detail"))
             if detail_type == "PermissionSetOperation":
                 permission_operations_handler(controller, event.get("detail"))
+            if detail_type == "Reconciliation":
+                report = reconciliation_handler(controller, event.get("detail"))
+        publish_assignment_tasks(controller, controller.coalescer)
+        if report is not None:
+            return {"statusCode": 200, "body": json.dumps(report)}
     elif records := event.get("Records"):
-        assignments_operations_handler(controller, records)
+        failed_records = assignments_operations_handler(controller, records)
+        publish_assignment_tasks(controller, controller.coalescer)
+        # Stream records after the first failed one are retried by Lambda
+        return {
+            "statusCode": 200,
+            "body": json.dumps(f"Event processed"),
+            "batchItemFailures": [
+                {"itemIdentifier": record["dynamodb"]["SequenceNumber"]}
+                for record in failed_records
+            ],
+        }
 
     return {
         "statusCode": 200,
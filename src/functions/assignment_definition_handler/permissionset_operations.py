@@ -5,7 +5,7 @@
 
 
 from config import Config_object
-from boto3.dynamodb.conditions import Attr
+from queries import query_permission_set_mappings, update_mapping_status
 import json
 
 
@@ -36,33 +36,31 @@ def permission_operations_handler(controller: Config_object, event_details: dict
         "PermissionSetArn"
     ]  # Probably will not need this for now, but let's keep it.
 
-    scan_kwargs = {
-        "FilterExpression": Attr(controller.config.permission_set_name).eq(permission_set_name),
-        "ProjectionExpression": f"{controller.config.map_key_name}, {controller.config.map_sortkey_name}",
-    }
+    # Pick up created and deleted permission sets without waiting for the cache to expire
+    controller.data.permission_sets.refresh()
 
-    done = False
-    start_key = None
-    found_items = []
-    while not done:
-        if start_key:
-            scan_kwargs["ExclusiveStartKey"] = start_key
-        response = controller.clients.dynamodb_table.scan(**scan_kwargs)
-        found_items = found_items + response.get("Items", [])
-        start_key = response.get("LastEvaluatedKey", None)
-        done = start_key is None
+    found_items = query_permission_set_mappings(
+        controller.clients.dynamodb,
+        controller.config.table_name,
+        controller.config.permission_set_name_index,
+        controller.config.permission_set_name,
+        permission_set_name,
+        segments=controller.config.scan_segments,
+    )
 
     permission_set_status = "Enabled"
     if sso_action == "deleted":
         permission_set_status = "Disabled"
 
-    for item in found_items:
-        controller.clients.logger.debug(item)
-        controller.clients.dynamodb_table.put_item(
-            Item={
-                controller.config.map_key_name: item[controller.config.map_key_name],
-                controller.config.map_sortkey_name: item[controller.config.map_sortkey_name],
-                controller.config.permission_set_name: permission_set_name,
-                controller.config.permission_set_status: permission_set_status,
-            }
-        )
+    summary = update_mapping_status(
+        controller.clients.dynamodb,
+        controller.config.table_name,
+        (controller.config.map_key_name, controller.config.map_sortkey_name),
+        found_items,
+        controller.config.permission_set_status,
+        permission_set_status,
+        max_workers=controller.config.status_update_workers,
+    )
+    controller.clients.logger.info(
+        f"Permission set {permission_set_name} mappings set to {permission_set_status}: {summary}"
+    )
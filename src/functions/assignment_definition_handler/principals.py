@@ -0,0 +1,101 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PrincipalResolver:
+    """Resolves Identity Store group and user names to principals.
+
+    Lookups are kept in a bounded LRU cache with a TTL. Principals that are
+    not found are remembered for a shorter negative TTL, so a missing group
+    referenced by many mappings is only looked up once in a while.
+    """
+
+    GROUP = "GROUP"
+    USER = "USER"
+
+    def __init__(self, identity_store, identity_store_id, max_size=1024, ttl=300, negative_ttl=30):
+        self.identity_store = identity_store
+        self.identity_store_id = identity_store_id
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._groups_swept_at = None
+
+    def get_group(self, display_name):
+        return self._resolve(self.GROUP, display_name)
+
+    def get_user(self, user_name):
+        return self._resolve(self.USER, user_name)
+
+    def prefetch_groups(self):
+        """Loads every group with a single paginated list_groups sweep.
+
+        Groups missing from the sweep are still looked up one by one, they may
+        have been created after it.
+        """
+        if self._swept_recently():
+            return 0
+        group_count = 0
+        for page in self.identity_store.get_paginator("list_groups").paginate(
+            IdentityStoreId=self.identity_store_id
+        ):
+            for group in page["Groups"]:
+                self._store(self.GROUP, group["DisplayName"], group, self.ttl)
+                group_count += 1
+        self._groups_swept_at = time.monotonic()
+        return group_count
+
+    def _swept_recently(self):
+        return (
+            self._groups_swept_at is not None
+            and time.monotonic() - self._groups_swept_at < self.ttl
+        )
+
+    def _resolve(self, principal_type, name):
+        key = (principal_type, name)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                expires_at, principal = entry
+                if expires_at > time.monotonic():
+                    self._cache.move_to_end(key)
+                    return dict(principal) if principal is not None else None
+                del self._cache[key]
+
+        principal = self._lookup(principal_type, name)
+        self._store(
+            principal_type,
+            name,
+            principal,
+            self.ttl if principal is not None else self.negative_ttl,
+        )
+        return dict(principal) if principal is not None else None
+
+    def _lookup(self, principal_type, name):
+        if principal_type == self.GROUP:
+            principals = self.identity_store.list_groups(
+                IdentityStoreId=self.identity_store_id,
+                Filters=[{"AttributePath": "DisplayName", "AttributeValue": name}],
+            )["Groups"]
+        else:
+            principals = self.identity_store.list_users(
+                IdentityStoreId=self.identity_store_id,
+                Filters=[{"AttributePath": "UserName", "AttributeValue": name}],
+            )["Users"]
+        return principals[0] if principals else None
+
+    def _store(self, principal_type, name, principal, ttl):
+        key = (principal_type, name)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, principal)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
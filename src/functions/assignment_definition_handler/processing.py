@@ -4,8 +4,8 @@
 ################################################################################
 
 
-from sqs import publish_sqs_task_for_execution
 from config import Config_object
+from orgz.tag_expression import TagExpressionError
 
 
 class PrincipalNotFound(Exception):
@@ -21,6 +21,8 @@ def process_mapdata(
     permission_set_name: str,
     assignment_action: str,
     record: str,
+    target_accounts: list = None,
+    index_only: bool = False,
 ):
     aws_principal_type: str
     aws_principal_name: str
@@ -30,30 +32,30 @@ def process_mapdata(
     idp_principal_name: str
     idp_principal_type, idp_principal_name = idp_principal.split(":")
 
-    if permission_set_name in controller.data.permission_sets:
-        permission_set: str = controller.data.permission_sets[permission_set_name]
+    permission_sets = controller.data.permission_sets
+    if permission_set_name in permission_sets:
+        permission_set: str = permission_sets[permission_set_name]
         controller.clients.logger.info(
             f"PS {permission_set_name} identified as: {permission_set['PermissionSetArn']}"
         )
+    elif (
+        assignment_action == controller.data.ACTION_TYPE_DELETE
+        and (permission_set := permission_sets.get_removed(permission_set_name)) is not None
+    ):
+        # Mappings of a deleted permission set are disabled after it left the catalogue
+        controller.clients.logger.info(
+            f"PS {permission_set_name} was deleted, removing assignments of: "
+            f"{permission_set['PermissionSetArn']}"
+        )
     else:
         error_msg = f"Permission Set {permission_set_name} was not found."
         controller.clients.logger.error(error_msg)
         controller.clients.error_handler.publish_error_message(record, error_msg)
-        pass
+        return
 
-    accounts = None
     if idp_principal_type.lower() == "g":
-        try:
-            idp_principal: dict = controller.clients.identity_store.list_groups(
-                IdentityStoreId=controller.clients.sso.identity_store_id,
-                Filters=[
-                    {
-                        "AttributePath": "DisplayName",
-                        "AttributeValue": idp_principal_name,
-                    }
-                ],
-            )["Groups"][0]
-        except IndexError as e:
+        idp_principal: dict = controller.clients.principals.get_group(idp_principal_name)
+        if idp_principal is None:
             controller.clients.logger.error(
                 f"Group {idp_principal_name} is not found in identity store {controller.clients.sso.identity_store_id}."
             )
@@ -64,10 +66,12 @@ def process_mapdata(
         idp_principal["Type"] = controller.data.GROUP_PRINCIPAL_TYPE
         idp_principal["Id"] = idp_principal["GroupId"]
     elif idp_principal_type.lower() == "u":
-        idp_principal: dict = controller.clients.identity_store.list_users(
-            IdentityStoreId=controller.clients.sso.identity_store_id,
-            Filters=[{"AttributePath": "UserName", "AttributeValue": idp_principal_name}],
-        )["Users"][0]
+        idp_principal: dict = controller.clients.principals.get_user(idp_principal_name)
+        if idp_principal is None:
+            controller.clients.logger.error(
+                f"User {idp_principal_name} is not found in identity store {controller.clients.sso.identity_store_id}."
+            )
+            raise PrincipalNotFound()
         controller.clients.logger.info(
             f"User {idp_principal['UserName']} identified as: {idp_principal['UserId']}."
         )
@@ -78,18 +82,161 @@ def process_mapdata(
         controller.clients.logger.error(error_msg)
         controller.clients.error_handler.publish_error_message(record, error_msg)
         pass
+    if target_accounts is None:
+        accounts = resolve_target_accounts(
+            controller, aws_principal_type, aws_principal_name, record
+        )
+    else:
+        # Accounts already resolved by the caller, e.g. the accounts of a move
+        accounts = list(target_accounts)
+    if accounts:
+        if controller.clients.effective_index is not None:
+            accounts = update_effective_index(
+                controller, accounts, idp_principal, permission_set, assignment_action, record
+            )
+        if index_only:
+            # The assignment is still granted by another mapping, e.g. after a move
+            return
+        # Tasks are published once the whole invocation has been coalesced
+        controller.coalescer.add(
+            accounts,
+            principal_type=idp_principal["Type"],
+            principal_id=idp_principal["Id"],
+            permission_set_arn=permission_set["PermissionSetArn"],
+            action=assignment_action,
+            sequence_number=record.get("dynamodb", {}).get("SequenceNumber"),
+        )
+    else:
+        error_msg = f"Root AWS Organization does not have active accounts"
+        controller.clients.logger.error(error_msg)
+        controller.clients.error_handler.publish_error_message(record, error_msg)
+
+
+def update_effective_index(
+    controller: Config_object, accounts, idp_principal, permission_set, assignment_action, record
+):
+    """Records which mapping the assignments come from, returns the accounts to act on.
+
+    Assignments are counted by their source mappings, so a deletion is only
+    queued for accounts where no other mapping still grants the assignment.
+    Until the index is backfilled, source sets may miss older mappings and
+    deletions are queued for all accounts.
+    """
+    source = mapping_source(controller, record)
+    if source is None:
+        return accounts
+    if assignment_action == controller.data.ACTION_TYPE_CREATE:
+        update = controller.clients.effective_index.add_source
+    else:
+        update = controller.clients.effective_index.remove_source
+    remaining_sources = update(
+        accounts,
+        principal_type=idp_principal["Type"],
+        principal_id=idp_principal["Id"],
+        permission_set_arn=permission_set["PermissionSetArn"],
+        source=source,
+    )
+    if (
+        assignment_action == controller.data.ACTION_TYPE_CREATE
+        or not controller.clients.effective_index.is_backfilled()
+    ):
+        return accounts
+    retained = [account for account in accounts if remaining_sources.get(account)]
+    if retained:
+        controller.clients.logger.info(
+            f"Assignment still granted by other mappings in {len(retained)} accounts, "
+            "not deleting it there"
+        )
+    return [account for account in accounts if not remaining_sources.get(account)]
+
+
+def keep_granted_assignments(controller: Config_object, groups):
+    """Turns deletions the effective index still lists sources for back into creations.
+
+    Records of different mappings are processed concurrently, a deletion can be
+    queued after its sources were checked and before another record of the same
+    invocation adds a source. The coalescer keeps the later of both tasks, so
+    the sources of deletions are read again once all records are processed.
+    """
+    effective_index = controller.clients.effective_index
+    if effective_index is None or not effective_index.is_backfilled():
+        return groups
+    checked = {}
+    for group, accounts in groups.items():
+        principal_type, principal_id, permission_set_arn, action, origin = group
+        if action == controller.data.ACTION_TYPE_DELETE:
+            sources = effective_index.get_assignment_sources(
+                accounts, principal_type, principal_id, permission_set_arn
+            )
+            granted = [account for account in accounts if sources.get(account)]
+            if granted:
+                controller.clients.logger.info(
+                    f"Assignment of {principal_id} gained a source in {len(granted)} accounts "
+                    "while its deletion was queued, creating it there instead"
+                )
+                create = (
+                    principal_type,
+                    principal_id,
+                    permission_set_arn,
+                    controller.data.ACTION_TYPE_CREATE,
+                    origin,
+                )
+                checked.setdefault(create, []).extend(granted)
+                accounts = [account for account in accounts if not sources.get(account)]
+        if accounts:
+            checked.setdefault(group, []).extend(accounts)
+    return checked
+
+
+def mapping_source(controller: Config_object, record):
+    """Returns "mappingId|mappingValue" of a stream record or a mapping item"""
+    keys = record.get("dynamodb", {}).get("Keys")
+    if keys is not None:
+        keys = {name: value["S"] for name, value in keys.items()}
+    else:
+        keys = record
+    if controller.config.map_key_name not in keys or controller.config.map_sortkey_name not in keys:
+        return None
+    return (
+        f"{keys[controller.config.map_key_name]}{controller.config.associationid_concat_char}"
+        f"{keys[controller.config.map_sortkey_name]}"
+    )
+
+
+def resolve_target_accounts(
+    controller: Config_object, aws_principal_type: str, aws_principal_name: str, record
+):
+    """Returns the active accounts targeted by the AWS side of a mapping"""
+    accounts = resolve_target_account_set(controller, aws_principal_type, aws_principal_name, record)
+    return None if accounts is None else list(accounts)
+
+
+def resolve_target_account_set(
+    controller: Config_object, aws_principal_type: str, aws_principal_name: str, record
+):
+    """Returns the AccountSet of the active accounts targeted by the AWS side of a mapping"""
+    accounts = None
     if aws_principal_type.lower() == "r":
         # Apply to all accounts that exist under root
         controller.clients.logger.info(
             "Root request received. Changes marked for all accounts in this Organization"
         )
-        accounts = controller.clients.org.get_accounts_ids()
+        accounts = controller.clients.org.get_active_account_set()
     elif aws_principal_type.lower() == "o":
         # Get accounts for OU
         controller.clients.logger.info(
             f"OU request received. Changes marked for accounts in {aws_principal_name} OU"
         )
-        accounts = controller.clients.org.get_active_accounts_for_path(f"/{aws_principal_name}")
+        accounts = controller.clients.org.get_account_set_for_path(f"/{aws_principal_name}")
+        controller.clients.logger.info(accounts)
+    elif aws_principal_type.lower() == "s":
+        # Get accounts for OU and all OUs nested below it
+        controller.clients.logger.info(
+            f"OU tree request received. Changes marked for accounts in and below {aws_principal_name} OU"
+        )
+        accounts = controller.clients.org.get_account_set_for_path(
+            f"/{aws_principal_name}", recursive=True
+        )
         controller.clients.logger.info(accounts)
     elif aws_principal_type.lower() == "a":
         # Validate account and proceed with it.
@@ -98,7 +245,7 @@ def process_mapdata(
             controller.clients.logger.info(
                 f"Account {aws_principal_name} is an active account and will be processed"
             )
-            accounts = [aws_principal_name]
+            accounts = controller.clients.org.get_account_set([aws_principal_name])
         else:
             error_msg = f"AWS Account {aws_principal_name} was not found or is not active"
             controller.clients.logger.error(error_msg)
@@ -108,23 +255,16 @@ def process_mapdata(
         controller.clients.logger.info(
             f"Tag request received. Changes marked for accounts with {aws_principal_name} tag"
         )
-        tag_key, tag_value = aws_principal_name.split("=")
-        accounts = controller.clients.org.get_account_ids_for_tags({tag_key: tag_value})
+        try:
+            accounts = controller.clients.org.get_account_set_for_tag_expression(
+                aws_principal_name
+            )
+        except TagExpressionError as exception:
+            controller.clients.logger.error(str(exception))
+            controller.clients.error_handler.publish_error_message(record, str(exception))
     else:
-        error_msg = f'AWS principal type {aws_principal_type} is not supported. Needs to be one of following: root ("r"), organization unit ("o"), account ("a") or tag ("r")'
+        error_msg = f'AWS principal type {aws_principal_type} is not supported. Needs to be one of following: root ("r"), organization unit ("o"), organization unit tree ("s"), account ("a") or tag ("t")'
         controller.clients.logger.error(error_msg)
         controller.clients.error_handler.publish_error_message(record, error_msg)
         pass
-    if accounts:
-        publish_sqs_task_for_execution(
-            controller,
-            accounts=accounts,
-            principal_type=idp_principal["Type"],
-            principal_id=idp_principal["Id"],
-            permission_set_arn=permission_set["PermissionSetArn"],
-            action=assignment_action,
-        )
-    else:
-        error_msg = f"Root AWS Organization does not have active accounts"
-        controller.clients.logger.error(error_msg)
-        controller.clients.error_handler.publish_error_message(record, error_msg)
+    return accounts
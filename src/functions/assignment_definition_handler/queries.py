@@ -0,0 +1,142 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+
+
+def deserialize(item):
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+def query_mappings(client, table_name, key_name, key_value):
+    """Yields the mappings of one partition, following pagination"""
+    pages = client.get_paginator("query").paginate(
+        TableName=table_name,
+        KeyConditionExpression="#key = :key",
+        ExpressionAttributeNames={"#key": key_name},
+        ExpressionAttributeValues={":key": {"S": key_value}},
+    )
+    for page in pages:
+        for item in page.get("Items", []):
+            yield deserialize(item)
+
+
+def scan_mappings(client, table_name):
+    """Yields every mapping of the table, following pagination"""
+    for page in client.get_paginator("scan").paginate(TableName=table_name):
+        for item in page.get("Items", []):
+            yield deserialize(item)
+
+
+def scan_tag_mappings(client, table_name, value_name):
+    """Yields the tag mappings of the table, following pagination"""
+    for page in client.get_paginator("scan").paginate(
+        TableName=table_name,
+        FilterExpression="begins_with(#value, :tag)",
+        ExpressionAttributeNames={"#value": value_name},
+        ExpressionAttributeValues={":tag": {"S": "t:"}},
+    ):
+        for item in page.get("Items", []):
+            yield deserialize(item)
+
+
+def query_permission_set_mappings(
+    client, table_name, index_name, attribute_name, permission_set_name, segments=4
+):
+    """Yields the mappings of a permission set, page by page, from the permission set name index.
+
+    Tables created before the index existed are read with a parallel scan instead.
+    A missing index fails the first request, the scan only replaces the query
+    before any of its mappings were yielded.
+    """
+    try:
+        pages = iter(
+            client.get_paginator("query").paginate(
+                TableName=table_name,
+                IndexName=index_name,
+                KeyConditionExpression="#name = :name",
+                ExpressionAttributeNames={"#name": attribute_name},
+                ExpressionAttributeValues={":name": {"S": permission_set_name}},
+            )
+        )
+        first_page = next(pages, {})
+    except ClientError as exception:
+        if exception.response["Error"]["Code"] != "ValidationException":
+            raise
+        yield from scan_permission_set_mappings(
+            client, table_name, attribute_name, permission_set_name, segments
+        )
+        return
+    for page in chain([first_page], pages):
+        for item in page.get("Items", []):
+            yield deserialize(item)
+
+
+def scan_permission_set_mappings(client, table_name, attribute_name, permission_set_name, segments):
+    """Scans the table in parallel segments, yields the mappings of each segment as it completes"""
+
+    def scan_segment(segment):
+        return [
+            deserialize(item)
+            for page in client.get_paginator("scan").paginate(
+                TableName=table_name,
+                Segment=segment,
+                TotalSegments=segments,
+                FilterExpression="#name = :name",
+                ExpressionAttributeNames={"#name": attribute_name},
+                ExpressionAttributeValues={":name": {"S": permission_set_name}},
+            )
+            for item in page.get("Items", [])
+        ]
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for future in as_completed([executor.submit(scan_segment, s) for s in range(segments)]):
+            yield from future.result()
+
+
+def update_mapping_status(
+    client, table_name, key_names, items, status_attribute, status, max_workers=8
+):
+    """Sets the status of mappings with concurrent conditional updates.
+
+    Items already at the status are skipped without a write, so they do not
+    produce stream records. Returns the number of updated and skipped items.
+    """
+    summary = {"Updated": 0, "Skipped": 0}
+
+    def update(item):
+        try:
+            client.update_item(
+                TableName=table_name,
+                Key={name: _serializer.serialize(item[name]) for name in key_names},
+                UpdateExpression="SET #status = :status",
+                # The mapping may have been removed since it was read
+                ConditionExpression="attribute_exists(#key) AND #status <> :status",
+                ExpressionAttributeNames={"#status": status_attribute, "#key": key_names[0]},
+                ExpressionAttributeValues={":status": {"S": status}},
+            )
+        except ClientError as exception:
+            if exception.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for item in items:
+            if item.get(status_attribute) == status:
+                summary["Skipped"] += 1
+                continue
+            futures.append(executor.submit(update, item))
+        for future in futures:
+            summary["Updated" if future.result() else "Skipped"] += 1
+    return summary
@@ -0,0 +1,254 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config_object
+from effective_index import ASSIGNMENT_KEY, SOURCES, assignment_key
+from processing import mapping_source, resolve_target_account_set
+from queries import scan_mappings
+
+# Number of tasks of each action listed in the report
+REPORT_SAMPLE_SIZE = 50
+TASK_FIELDS = ("AccountId", "PermissionSetArn", "PrincipalType", "PrincipalId")
+
+
+# {
+#     'source': 'enterprise-aws-sso',
+#     'detail-type': 'Reconciliation',
+#     'detail':
+#         {
+#             'DryRun': true
+#         }
+# }
+
+
+def reconciliation_handler(controller: Config_object, event_details: dict):
+    """Queues the tasks which bring Identity Center in line with the mappings table.
+
+    The desired assignments are expanded from all enabled mappings, the actual
+    ones are listed for every permission set referenced by a mapping. Only
+    assignments of those permission sets are ever deleted. In dry-run mode the
+    report is returned without queueing anything. Mappings which fail to
+    expand, e.g. of an OU that no longer exists, are listed as skipped, and
+    the assignments they may grant are not deleted.
+
+    With the effective assignment index, a run which is not a dry run also
+    rewrites the sources of the index and marks it as backfilled.
+    """
+    dry_run = bool((event_details or {}).get("DryRun", False))
+    desired, managed_permission_set_arns, mapping_accounts, skipped = collect_desired_assignments(
+        controller
+    )
+    # Assignments of skipped mappings, or all of their permission set when the principal is unknown
+    skipped_assignments = {assignment for _, assignment, _ in skipped}
+    actual = collect_actual_assignments(controller, managed_permission_set_arns)
+
+    # Per permission set and principal, the differences are bitset operations
+    empty = controller.clients.org.get_account_set([])
+    creates = {}
+    deletes = {}
+    for assignment in desired.keys() | actual.keys():
+        desired_accounts = desired.get(assignment, empty)
+        actual_accounts = actual.get(assignment, empty)
+        if desired_accounts - actual_accounts:
+            creates[assignment] = desired_accounts - actual_accounts
+        if actual_accounts - desired_accounts and not (
+            assignment in skipped_assignments or assignment[:1] in skipped_assignments
+        ):
+            deletes[assignment] = actual_accounts - desired_accounts
+    report = {
+        "DryRun": dry_run,
+        "ManagedPermissionSets": len(managed_permission_set_arns),
+        "Desired": sum(map(len, desired.values())),
+        "Actual": sum(map(len, actual.values())),
+        "Create": sum(map(len, creates.values())),
+        "Delete": sum(map(len, deletes.values())),
+        "Creates": report_sample(creates),
+        "Deletes": report_sample(deletes),
+        "Skipped": [{"Mapping": source, "Error": error} for source, _, error in skipped],
+    }
+    if not dry_run and controller.clients.effective_index is not None:
+        report.update(
+            backfill_effective_index(
+                controller, mapping_accounts, {source for source, _, _ in skipped}
+            )
+        )
+    controller.clients.logger.info({"message": "Reconciliation report", **report})
+
+    if not dry_run:
+        for action, tasks in (
+            (controller.data.ACTION_TYPE_DELETE, deletes),
+            (controller.data.ACTION_TYPE_CREATE, creates),
+        ):
+            for (permission_set_arn, principal_type, principal_id), accounts in tasks.items():
+                controller.coalescer.add(
+                    list(accounts),
+                    principal_type=principal_type,
+                    principal_id=principal_id,
+                    permission_set_arn=permission_set_arn,
+                    action=action,
+                )
+    return report
+
+
+def report_sample(tasks):
+    sample = sorted(
+        (account_id, *assignment)
+        for assignment, accounts in tasks.items()
+        for account_id in accounts
+    )
+    return [dict(zip(TASK_FIELDS, task)) for task in sample[:REPORT_SAMPLE_SIZE]]
+
+
+def collect_desired_assignments(controller):
+    """Returns the accounts of all mappings per (permission set, principal type, principal id).
+
+    Also returns the managed permission set arns, the (source mapping,
+    assignment, accounts) expansion of every enabled mapping and the (source
+    mapping, assignment, error) of mappings which failed to expand. The
+    assignment of a failed mapping is only its permission set arn when the
+    principal could not be resolved.
+    """
+    managed_permission_set_arns = set()
+    enabled = []
+    for item in scan_mappings(controller.clients.dynamodb, controller.config.table_name):
+        aws_principal, idp_principal, permission_set_name = item[
+            controller.config.map_sortkey_name
+        ].split(controller.config.associationid_concat_char)
+        if permission_set_name not in controller.data.permission_sets:
+            controller.clients.logger.warning(
+                f"Permission Set {permission_set_name} was not found, skipping {item}"
+            )
+            continue
+        permission_set_arn = controller.data.permission_sets[permission_set_name][
+            "PermissionSetArn"
+        ]
+        managed_permission_set_arns.add(permission_set_arn)
+        if item.get(controller.config.permission_set_status, "Enabled") == "Enabled":
+            enabled.append((item, aws_principal, idp_principal, permission_set_arn))
+
+    def expand(mapping):
+        item, aws_principal, idp_principal, permission_set_arn = mapping
+        source = mapping_source(controller, item)
+        assignment = (permission_set_arn,)
+        try:
+            principal = resolve_principal(controller, idp_principal)
+            if principal is None:
+                controller.clients.logger.warning(f"Principal {idp_principal} not found, skipping")
+                return source, None, None, None
+            assignment = (permission_set_arn, *principal)
+            aws_principal_type, aws_principal_name = aws_principal.split(":")
+            accounts = resolve_target_account_set(
+                controller, aws_principal_type, aws_principal_name, item
+            )
+        except Exception as exception:
+            # One stale mapping does not stop the run
+            controller.clients.logger.error(f"Mapping {source} skipped: {exception}")
+            return source, assignment, None, str(exception)
+        return source, assignment, accounts, None
+
+    desired = {}
+    mapping_accounts = []
+    skipped = []
+    with ThreadPoolExecutor(max_workers=controller.config.reconciliation_workers) as executor:
+        for source, assignment, accounts, error in executor.map(expand, enabled):
+            if error is not None:
+                skipped.append((source, assignment, error))
+            elif accounts:
+                desired[assignment] = (
+                    accounts | desired[assignment] if assignment in desired else accounts
+                )
+                mapping_accounts.append((source, assignment, accounts))
+    return desired, managed_permission_set_arns, mapping_accounts, skipped
+
+
+def resolve_principal(controller, idp_principal):
+    idp_principal_type, idp_principal_name = idp_principal.split(":")
+    if idp_principal_type.lower() == "g":
+        group = controller.clients.principals.get_group(idp_principal_name)
+        return (controller.data.GROUP_PRINCIPAL_TYPE, group["GroupId"]) if group else None
+    if idp_principal_type.lower() == "u":
+        user = controller.clients.principals.get_user(idp_principal_name)
+        return (controller.data.USER_PRINCIPAL_TYPE, user["UserId"]) if user else None
+    return None
+
+
+def collect_actual_assignments(controller, permission_set_arns):
+    """Lists the assignments of the permission sets, concurrently per permission set and account.
+
+    Returns the accounts per (permission set, principal type, principal id)
+    """
+    sso = controller.clients.sso
+    with ThreadPoolExecutor(max_workers=controller.config.reconciliation_workers) as executor:
+        provisioned = executor.map(
+            lambda arn: [
+                (account_id, arn)
+                for account_id in sso.list_accounts_for_provisioned_permission_set(arn)
+            ],
+            permission_set_arns,
+        )
+        pairs = [pair for accounts in provisioned for pair in accounts]
+        actual_ids = {}
+        for assignments in executor.map(
+            lambda pair: list(sso.list_account_assignments(*pair)), pairs
+        ):
+            for assignment in assignments:
+                actual_ids.setdefault(
+                    (
+                        assignment["PermissionSetArn"],
+                        assignment["PrincipalType"],
+                        assignment["PrincipalId"],
+                    ),
+                    [],
+                ).append(assignment["AccountId"])
+    return {
+        assignment: controller.clients.org.get_account_set(account_ids)
+        for assignment, account_ids in actual_ids.items()
+    }
+
+
+def backfill_effective_index(controller, mapping_accounts, skipped_sources=()):
+    """Brings the sources of the effective index in line with the expanded mappings.
+
+    The indexed assignments of every active account are read concurrently,
+    missing sources are added and stale ones removed. Sources of mappings
+    which were skipped are left as they are. The index is then marked as
+    backfilled, from then on its source sets are trusted.
+    """
+    index = controller.clients.effective_index
+    desired_sources = {}
+    for source, (permission_set_arn, principal_type, principal_id), accounts in mapping_accounts:
+        key = assignment_key(principal_type, principal_id, permission_set_arn)
+        for account_id in accounts:
+            desired_sources.setdefault((account_id, key), set()).add(source)
+
+    account_ids = list(controller.clients.org.get_active_account_set())
+    with ThreadPoolExecutor(max_workers=controller.config.reconciliation_workers) as executor:
+        indexed = executor.map(index.get_account_assignments, account_ids)
+        indexed_sources = {
+            (assignment["AccountId"], assignment[ASSIGNMENT_KEY]): assignment[SOURCES]
+            for assignments in indexed
+            for assignment in assignments
+        }
+
+    # Accounts sharing a source update are updated with one call
+    updates = {}
+    for account_key in desired_sources.keys() | indexed_sources.keys():
+        account_id, key = account_key
+        desired = desired_sources.get(account_key, set())
+        current = indexed_sources.get(account_key, set())
+        for source in desired - current:
+            updates.setdefault(("IndexSourcesAdded", key, source), []).append(account_id)
+        for source in current - desired - set(skipped_sources):
+            updates.setdefault(("IndexSourcesRemoved", key, source), []).append(account_id)
+    summary = {"IndexSourcesAdded": 0, "IndexSourcesRemoved": 0}
+    for (counter, key, source), accounts in updates.items():
+        principal_type, principal_id, permission_set_arn = key.split("|", 2)
+        update = index.add_source if counter == "IndexSourcesAdded" else index.remove_source
+        update(accounts, principal_type, principal_id, permission_set_arn, source)
+        summary[counter] += len(accounts)
+    index.mark_backfilled()
+    return summary
@@ -3,48 +3,75 @@
 # SPDX-License-Identifier: MIT-0
 ################################################################################
 
-import json
-from common.encoder import PythonObjectEncoder
+from coalescing import deduplication_id
+from common.tasks import pack_tasks
+from processing import keep_granted_assignments
 
 
-def publish_sqs_task_for_execution(
-    controller, accounts, principal_type, principal_id, permission_set_arn, action
-):
-    payload = []
-    results = []
-    for idx, account in enumerate(accounts):
-        entry = {
-            "Id": f"{idx}",
-            "MessageBody": json.dumps(
-                {
-                    "TargetId": account,
-                    "PrincipalType": principal_type,
-                    "PrincipalId": principal_id,
-                    "PermissionSetArn": permission_set_arn,
-                    "Action": action,
-                },
-                indent=2,
-                cls=PythonObjectEncoder,
-            ),
-        }
-        controller.clients.logger.info("Uppending entry to array")
-        controller.clients.logger.info(entry)
-        payload.append(entry)
+def publish_assignment_tasks(controller, coalescer):
+    controller.clients.logger.info(
+        f"Publishing {len(coalescer)} assignment tasks coalesced from {coalescer.received}"
+    )
+    entries = []
+    for (
+        principal_type,
+        principal_id,
+        permission_set_arn,
+        action,
+        origin,
+    ), accounts in keep_granted_assignments(controller, coalescer.grouped()).items():
+        entries += task_entries(
+            controller,
+            accounts=accounts,
+            principal_type=principal_type,
+            principal_id=principal_id,
+            permission_set_arn=permission_set_arn,
+            action=action,
+            origin=origin,
+        )
+    return publish_entries(controller, entries)
 
-        ## TODO refactor to look nice. Unfortunately we can send only in batches of 10.
-        if (idx + 1) % 10 == 0:
-            controller.clients.logger.info("Publishing array")
-            results.append(
-                controller.clients.sqs.send_message_batch(
-                    QueueUrl=controller.config.queue_url, Entries=payload
-                )
-            )
-            payload = []
-    if payload:
-        controller.clients.logger.info("Publishing array")
-        results.append(
-            controller.clients.sqs.send_message_batch(
-                QueueUrl=controller.config.queue_url, Entries=payload
-            )
+
+def publish_entries(controller, entries):
+    summary = controller.clients.sqs_publisher.publish(entries)
+    if summary["Failed"]:
+        # Dropped tasks would leave assignments unprovisioned, the event is retried instead
+        controller.clients.error_handler.publish_error_message(
+            summary["FailedEntries"], f"Failed to publish {summary['Failed']} assignment tasks."
         )
-    return results
+        raise Exception(f"Failed to publish {summary['Failed']} assignment tasks")
+    return summary
+
+
+def task_entries(
+    controller, accounts, principal_type, principal_id, permission_set_arn, action, origin=None
+):
+    fifo_queue = controller.config.queue_url.endswith(".fifo")
+    entries = []
+    for targets, body in pack_tasks(
+        accounts,
+        principal_type,
+        principal_id,
+        permission_set_arn,
+        action,
+        max_targets=controller.config.max_targets_per_task,
+    ):
+        entry = {"MessageBody": body}
+        if fifo_queue:
+            # A task spans many accounts, so opposite actions on an assignment
+            # can only be ordered by grouping on the principal and permission set
+            entry["MessageGroupId"] = deduplication_id(principal_id, permission_set_arn)
+            # A retried invocation publishes the same ids and SQS drops the duplicates.
+            # The record or event the task comes from is part of the id, so the
+            # same task queued again later, e.g. by a re-created mapping, is kept.
+            entry["MessageDeduplicationId"] = deduplication_id(
+                ",".join(targets),
+                principal_type,
+                principal_id,
+                permission_set_arn,
+                action,
+                origin or "",
+            )
+        controller.clients.logger.debug(entry)
+        entries.append(entry)
+    return entries
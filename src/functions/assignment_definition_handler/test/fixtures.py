@@ -0,0 +1,165 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import json
+from unittest.mock import Mock
+
+from coalescing import AssignmentCoalescer
+from config import Config_object
+from effective_index import assignment_key
+
+PERMISSION_SET_ARN = "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-504d6c2b57a3f2cb"
+
+
+class PermissionSets(dict):
+    """PermissionSetCatalogue with fixed permission sets, ``removed`` holds deleted ones"""
+
+    def __init__(self, permission_sets, removed=None):
+        super().__init__(permission_sets)
+        self.removed = removed or {}
+
+    def get_removed(self, name):
+        return self.removed.get(name)
+
+
+class InMemoryEffectiveIndex:
+    """EffectiveAssignmentIndex keeping the sources of each account and assignment in a dict"""
+
+    def __init__(self, backfilled=True):
+        self.sources = {}
+        self.backfilled = backfilled
+
+    def is_backfilled(self):
+        return self.backfilled
+
+    def mark_backfilled(self):
+        self.backfilled = True
+
+    def add_source(self, accounts, principal_type, principal_id, permission_set_arn, source):
+        key = assignment_key(principal_type, principal_id, permission_set_arn)
+        for account_id in accounts:
+            self.sources.setdefault((account_id, key), set()).add(source)
+        return {account_id: set(self.sources[(account_id, key)]) for account_id in accounts}
+
+    def remove_source(self, accounts, principal_type, principal_id, permission_set_arn, source):
+        key = assignment_key(principal_type, principal_id, permission_set_arn)
+        remaining = {}
+        for account_id in accounts:
+            sources = self.sources.get((account_id, key), set())
+            sources.discard(source)
+            if not sources:
+                self.sources.pop((account_id, key), None)
+            remaining[account_id] = set(sources)
+        return remaining
+
+    def get_assignment_sources(self, accounts, principal_type, principal_id, permission_set_arn):
+        key = assignment_key(principal_type, principal_id, permission_set_arn)
+        return {
+            account_id: set(self.sources.get((account_id, key), set())) for account_id in accounts
+        }
+
+    def get_account_assignments(self, account_id):
+        assignments = []
+        for (item_account_id, key), sources in self.sources.items():
+            if item_account_id == account_id:
+                principal_type, principal_id, permission_set_arn = key.split("|")
+                assignments.append(
+                    {
+                        "AccountId": account_id,
+                        "Assignment": key,
+                        "PrincipalType": principal_type,
+                        "PrincipalId": principal_id,
+                        "PermissionSetArn": permission_set_arn,
+                        "Sources": set(sources),
+                    }
+                )
+        return assignments
+
+    def get_sources(self, account_id, principal_id):
+        key = assignment_key("GROUP", principal_id, PERMISSION_SET_ARN)
+        return self.sources.get((account_id, key), set())
+
+
+def make_controller(effective_index=None):
+    """Controller with the configuration of a deployment and mocked clients"""
+    controller = Config_object("Test controller")
+
+    controller.config = Config_object("Test configuration")
+    controller.config.queue_url = "test_queue"
+    controller.config.table_name = "permission-assignments-table"
+    controller.config.map_key_name = "mappingId"
+    controller.config.map_sortkey_name = "mappingValue"
+    controller.config.associationid_concat_char = "|"
+    controller.config.permission_set_status = "PermissionSetStatus"
+    controller.config.permission_set_name = "PermissionSetName"
+    controller.config.max_targets_per_task = 50
+    controller.config.stream_processing_workers = 4
+    controller.config.mapping_processing_workers = 4
+    controller.config.reconciliation_workers = 2
+    controller.config.group_prefetch_threshold = 10
+
+    controller.clients = Config_object("Test clients")
+    controller.clients.logger = Mock()
+    controller.clients.error_handler = Mock()
+    controller.clients.org = Mock()
+    controller.clients.sso = Mock()
+    controller.clients.dynamodb = Mock()
+    controller.clients.effective_index = effective_index
+    controller.clients.principals = Mock()
+    controller.clients.principals.get_group.side_effect = lambda name: {
+        "GroupId": f"group-{name}",
+        "DisplayName": name,
+    }
+    controller.clients.principals.get_user.side_effect = lambda name: {
+        "UserId": f"user-{name}",
+        "UserName": name,
+    }
+    controller.clients.sqs_publisher = Mock()
+    controller.clients.sqs_publisher.publish.return_value = {
+        "Sent": 0,
+        "Retried": 0,
+        "Failed": 0,
+        "FailedEntries": [],
+    }
+
+    controller.data = Config_object("Test datablocks")
+    controller.data.permission_sets = PermissionSets(
+        {"ReadOnly": {"PermissionSetArn": PERMISSION_SET_ARN}}
+    )
+    controller.data.ACTION_TYPE_CREATE = "CREATE"
+    controller.data.ACTION_TYPE_DELETE = "DELETE"
+    controller.data.GROUP_PRINCIPAL_TYPE = "GROUP"
+    controller.data.USER_PRINCIPAL_TYPE = "USER"
+
+    controller.coalescer = AssignmentCoalescer()
+    return controller
+
+
+def mapping(mapping_id, mapping_value, status="Enabled"):
+    return {"mappingId": mapping_id, "mappingValue": mapping_value, "PermissionSetStatus": status}
+
+
+def stream_record(
+    sequence_number, mapping_id, mapping_value, event_name="INSERT", status="Enabled"
+):
+    image = {key: {"S": value} for key, value in mapping(mapping_id, mapping_value, status).items()}
+    return {
+        "eventName": event_name,
+        "dynamodb": {
+            "Keys": {"mappingId": image["mappingId"], "mappingValue": image["mappingValue"]},
+            "OldImage" if event_name == "REMOVE" else "NewImage": image,
+            "SequenceNumber": str(sequence_number),
+        },
+    }
+
+
+def published_tasks(controller):
+    """(action, principal id, target ids) of every task passed to the SQS publisher"""
+    tasks = []
+    for call in controller.clients.sqs_publisher.publish.call_args_list:
+        for entry in call.args[0]:
+            task = json.loads(entry["MessageBody"])
+            tasks.append((task["Action"], task["PrincipalId"], sorted(task["TargetIds"])))
+    return sorted(tasks)
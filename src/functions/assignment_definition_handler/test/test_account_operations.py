@@ -0,0 +1,243 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import patch
+
+import account_operations
+from assignments_operations import assignments_operations_handler
+from coalescing import AssignmentCoalescer
+from sqs import publish_assignment_tasks
+
+from .fixtures import (
+    PERMISSION_SET_ARN,
+    InMemoryEffectiveIndex,
+    make_controller,
+    mapping,
+    published_tasks,
+    stream_record,
+)
+
+ACCOUNT_ID = "111111111111"
+OTHER_ACCOUNT_ID = "222222222222"
+MOVE = {
+    "Action": "moved",
+    "AccountIds": [ACCOUNT_ID, OTHER_ACCOUNT_ID],
+    "AccountOuName": "ou-new",
+    "AccountOldOuName": "ou-old",
+}
+
+
+"""
+Account operations testing class
+"""
+
+
+class TestAccountOperations(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def setUp(self):
+        self.controller = make_controller()
+        self.controller.clients.org.describe_account.return_value = {
+            "Account": {"Id": ACCOUNT_ID, "Status": "ACTIVE"}
+        }
+        self.controller.clients.org.get_account_set_for_tag_expression.side_effect = (
+            lambda expression: self.tag_accounts.get(expression, [])
+        )
+        self.controller.clients.org.get_ancestor_ou_ids.return_value = []
+        self.controller.clients.org.get_ou_path.side_effect = {
+            "ou-old": "Old",
+            "ou-new": "New",
+        }.get
+        self.partitions = {}
+        self.queried = []
+        self.tag_mappings = []
+        self.tag_accounts = {}
+        for name, replacement in (
+            ("query_mappings", self.query_mappings),
+            ("scan_tag_mappings", lambda client, table_name, value_name: iter(self.tag_mappings)),
+        ):
+            patcher = patch.object(account_operations, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def query_mappings(self, client, table_name, key_name, key_value):
+        self.queried.append(key_value)
+        return iter(self.partitions.get(key_value, []))
+
+    def handle(self, payload):
+        account_operations.account_operations_handler(self.controller, payload)
+        publish_assignment_tasks(self.controller, self.controller.coalescer)
+        return published_tasks(self.controller)
+
+    def test_0_created_account_gets_root_mappings(self):
+        self.partitions["root"] = [mapping("root", "r:root|g:Auditors|ReadOnly")]
+        tasks = self.handle({"Action": "created", "AccountId": ACCOUNT_ID})
+        assert tasks == [("CREATE", "group-Auditors", [ACCOUNT_ID])]
+        # Account events do not reload the organization
+        self.controller.clients.org.topology.invalidate.assert_not_called()
+
+    def test_1_moved_into_nested_ou(self):
+        ou_paths = {"ou-old": "Old", "ou-parent": "Parent", "ou-child": "Parent/Child"}
+        self.controller.clients.org.get_ou_path.side_effect = ou_paths.get
+        self.controller.clients.org.get_ancestor_ou_ids.side_effect = lambda ou_id: (
+            ["ou-parent"] if ou_id == "ou-child" else []
+        )
+        # OU mappings are stored under the path of the OU
+        self.partitions["Old"] = [mapping("Old", "o:Old|g:Old|ReadOnly")]
+        self.partitions["Parent"] = [
+            mapping("Parent", "o:Parent|g:ParentOnly|ReadOnly"),
+            mapping("Parent", "s:Parent|g:Tree|ReadOnly"),
+        ]
+        self.partitions["Parent/Child"] = [
+            mapping("Parent/Child", "o:Parent/Child|g:Child|ReadOnly")
+        ]
+        tasks = self.handle(
+            {
+                "Action": "moved",
+                "AccountId": ACCOUNT_ID,
+                "AccountOuName": "ou-child",
+                "AccountOldOuName": "ou-old",
+            }
+        )
+        assert tasks == [
+            ("CREATE", "group-Child", [ACCOUNT_ID]),
+            ("CREATE", "group-Tree", [ACCOUNT_ID]),
+            ("DELETE", "group-Old", [ACCOUNT_ID]),
+        ]
+
+    def move_partitions(self):
+        self.partitions["root"] = [mapping("root", "r:root|g:Everyone|ReadOnly")]
+        self.partitions["Old"] = [
+            mapping("Old", "o:Old|g:OldOnly|ReadOnly"),
+            mapping("Old", "o:Old|g:Both|ReadOnly"),
+        ]
+        self.partitions["New"] = [
+            mapping("New", "o:New|g:NewOnly|ReadOnly"),
+            mapping("New", "o:New|g:Both|ReadOnly"),
+        ]
+
+    def test_2_move_queues_the_difference(self):
+        self.move_partitions()
+        tasks = self.handle(MOVE)
+        # Root and assignments granted by both OUs are left untouched
+        assert tasks == [
+            ("CREATE", "group-NewOnly", [ACCOUNT_ID, OTHER_ACCOUNT_ID]),
+            ("DELETE", "group-OldOnly", [ACCOUNT_ID, OTHER_ACCOUNT_ID]),
+        ]
+
+    def test_3_move_updates_the_effective_index(self):
+        self.move_partitions()
+        index = InMemoryEffectiveIndex()
+        self.controller.clients.effective_index = index
+        for group in ("OldOnly", "Both"):
+            index.add_source(
+                [ACCOUNT_ID, OTHER_ACCOUNT_ID],
+                "GROUP",
+                f"group-{group}",
+                PERMISSION_SET_ARN,
+                f"Old|o:Old|g:{group}|ReadOnly",
+            )
+        # An account mapping still grants the assignment in one of the accounts
+        self.partitions[OTHER_ACCOUNT_ID] = [
+            mapping(OTHER_ACCOUNT_ID, "a:222222222222|g:OldOnly|ReadOnly")
+        ]
+        index.add_source(
+            [OTHER_ACCOUNT_ID],
+            "GROUP",
+            "group-OldOnly",
+            PERMISSION_SET_ARN,
+            "222222222222|a:222222222222|g:OldOnly|ReadOnly",
+        )
+        tasks = self.handle(MOVE)
+        assert tasks == [
+            ("CREATE", "group-NewOnly", [ACCOUNT_ID, OTHER_ACCOUNT_ID]),
+            ("DELETE", "group-OldOnly", [ACCOUNT_ID]),
+        ]
+        assert index.get_sources(ACCOUNT_ID, "group-NewOnly") == {"New|o:New|g:NewOnly|ReadOnly"}
+        assert index.get_sources(ACCOUNT_ID, "group-OldOnly") == set()
+        assert index.get_sources(OTHER_ACCOUNT_ID, "group-OldOnly") == {
+            "222222222222|a:222222222222|g:OldOnly|ReadOnly"
+        }
+
+    def test_4_moved_sources_follow_the_mappings(self):
+        self.move_partitions()
+        index = InMemoryEffectiveIndex()
+        self.controller.clients.effective_index = index
+        for group in ("OldOnly", "Both"):
+            index.add_source(
+                [ACCOUNT_ID, OTHER_ACCOUNT_ID],
+                "GROUP",
+                f"group-{group}",
+                PERMISSION_SET_ARN,
+                f"Old|o:Old|g:{group}|ReadOnly",
+            )
+        tasks = self.handle(MOVE)
+        assert ("CREATE", "group-Both", [ACCOUNT_ID, OTHER_ACCOUNT_ID]) not in tasks
+        # The assignment kept through the move is now granted by the new OU only
+        assert index.get_sources(ACCOUNT_ID, "group-Both") == {"New|o:New|g:Both|ReadOnly"}
+
+        # Removing the mapping of the new OU revokes the assignment
+        self.controller.clients.sqs_publisher.publish.reset_mock()
+        self.controller.coalescer = AssignmentCoalescer()
+        self.controller.clients.org.get_account_set_for_path.return_value = [
+            ACCOUNT_ID,
+            OTHER_ACCOUNT_ID,
+        ]
+        assignments_operations_handler(
+            self.controller, [stream_record(1, "New", "o:New|g:Both|ReadOnly", "REMOVE")]
+        )
+        publish_assignment_tasks(self.controller, self.controller.coalescer)
+        assert published_tasks(self.controller) == [
+            ("DELETE", "group-Both", [ACCOUNT_ID, OTHER_ACCOUNT_ID])
+        ]
+        assert index.get_sources(ACCOUNT_ID, "group-Both") == set()
+
+    def test_5_sources_are_not_trusted_before_the_backfill(self):
+        self.move_partitions()
+        index = InMemoryEffectiveIndex(backfilled=False)
+        self.controller.clients.effective_index = index
+        index.add_source(
+            [ACCOUNT_ID],
+            "GROUP",
+            "group-OldOnly",
+            PERMISSION_SET_ARN,
+            "111111111111|a:111111111111|g:OldOnly|ReadOnly",
+        )
+        tasks = self.handle(MOVE)
+        assert ("DELETE", "group-OldOnly", [ACCOUNT_ID, OTHER_ACCOUNT_ID]) in tasks
+
+    def test_6_old_ou_mappings_are_read_from_the_index(self):
+        self.move_partitions()
+        index = InMemoryEffectiveIndex()
+        self.controller.clients.effective_index = index
+        index.add_source(
+            [ACCOUNT_ID], "GROUP", "group-Both", PERMISSION_SET_ARN, "Old|o:Old|g:Both|ReadOnly"
+        )
+        # Granted by a mapping of the old OU the partition no longer lists
+        index.add_source(
+            [ACCOUNT_ID], "GROUP", "group-Stale", PERMISSION_SET_ARN, "Old|o:Old|g:Stale|ReadOnly"
+        )
+        tasks = self.handle({**MOVE, "AccountIds": [ACCOUNT_ID]})
+        assert tasks == [
+            ("CREATE", "group-NewOnly", [ACCOUNT_ID]),
+            ("DELETE", "group-Stale", [ACCOUNT_ID]),
+        ]
+        assert "Old" not in self.queried
+        ancestor_calls = self.controller.clients.org.get_ancestor_ou_ids.call_args_list
+        assert [call.args[0] for call in ancestor_calls] == ["ou-new"]
+
+    def test_7_tag_expression_mappings_apply_before_and_after(self):
+        self.move_partitions()
+        expression = "env=prod AND team=x"
+        self.tag_mappings = [
+            mapping(expression, f"t:{expression}|g:OldOnly|ReadOnly"),
+            mapping("env=dev,test", "t:env=dev,test|g:Testers|ReadOnly"),
+        ]
+        self.tag_accounts = {expression: [ACCOUNT_ID], "env=dev,test": [OTHER_ACCOUNT_ID]}
+        tasks = self.handle(MOVE)
+        # The expression mapping still grants the assignment of the old OU
+        assert tasks == [
+            ("CREATE", "group-NewOnly", [ACCOUNT_ID, OTHER_ACCOUNT_ID]),
+            ("DELETE", "group-OldOnly", [OTHER_ACCOUNT_ID]),
+        ]
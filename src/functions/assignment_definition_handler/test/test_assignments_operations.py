@@ -0,0 +1,131 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import threading
+import unittest
+from unittest.mock import patch
+
+import assignments_operations
+import index
+
+from sqs import publish_assignment_tasks
+
+from .fixtures import (
+    PERMISSION_SET_ARN,
+    InMemoryEffectiveIndex,
+    make_controller,
+    published_tasks,
+    stream_record,
+)
+
+ACCOUNTS = ["111111111111", "222222222222"]
+
+"""
+DynamoDB stream record processing testing class
+"""
+
+
+class TestAssignmentsOperations(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def setUp(self):
+        self.controller = make_controller()
+        self.controller.clients.org.get_account_set_for_path.return_value = ACCOUNTS
+        self.records = [
+            stream_record(1, "OU-A", "o:OU-A|g:Admins|ReadOnly"),
+            stream_record(2, "OU-B", "o:OU-B|g:Admins|ReadOnly"),
+            stream_record(3, "OU-A", "o:OU-A|g:Broken|ReadOnly"),
+            stream_record(4, "OU-B", "o:OU-B|g:Auditors|ReadOnly"),
+            stream_record(5, "OU-A", "o:OU-A|g:Auditors|ReadOnly"),
+        ]
+
+    def test_0_records_are_grouped_by_mapping(self):
+        processed = []
+        lock = threading.Lock()
+
+        def process_record(controller, record):
+            with lock:
+                processed.append(
+                    (
+                        record["dynamodb"]["Keys"]["mappingId"]["S"],
+                        record["dynamodb"]["SequenceNumber"],
+                    )
+                )
+
+        with patch.object(assignments_operations, "process_record", process_record):
+            failed = assignments_operations.assignments_operations_handler(
+                self.controller, self.records
+            )
+        assert failed == []
+        # Records of one mapping keep their stream order
+        assert [seq for mapping_id, seq in processed if mapping_id == "OU-A"] == ["1", "3", "5"]
+        assert [seq for mapping_id, seq in processed if mapping_id == "OU-B"] == ["2", "4"]
+
+    def test_1_records_after_a_failure_are_returned(self):
+        self.controller.clients.principals.get_group.side_effect = self.fail_lookup
+        mapping_records = [record for record in self.records if "OU-A" in str(record)]
+        failed = assignments_operations.process_mapping_records(self.controller, mapping_records)
+        assert failed == mapping_records[1:]
+        # The records after the failed one are not processed
+        looked_up = [
+            call.args[0] for call in self.controller.clients.principals.get_group.call_args_list
+        ]
+        assert looked_up == ["Admins", "Broken"]
+        self.controller.clients.error_handler.publish_error_message.assert_called_once()
+
+    def test_2_handler_reports_failed_sequence_numbers(self):
+        self.controller.clients.principals.get_group.side_effect = self.fail_lookup
+        with patch.object(index, "controller", self.controller):
+            response = index.handler({"Records": self.records}, None)
+        assert response["batchItemFailures"] == [
+            {"itemIdentifier": "3"},
+            {"itemIdentifier": "5"},
+        ]
+        # Tasks of the records processed before the failure are still published
+        assert published_tasks(self.controller) == [
+            ("CREATE", "group-Admins", ACCOUNTS),
+            ("CREATE", "group-Auditors", ACCOUNTS),
+        ]
+
+    def test_3_deletion_racing_a_new_source_is_not_published(self):
+        index = InMemoryEffectiveIndex()
+        index.add_source(
+            ACCOUNTS, "GROUP", "group-Ops", PERMISSION_SET_ARN, "root|r:root|g:Ops|ReadOnly"
+        )
+        self.controller.clients.effective_index = index
+        org = self.controller.clients.org
+        org.get_active_account_set.return_value = ACCOUNTS
+        org.get_account_set_for_path.return_value = ACCOUNTS[:1]
+        ou_record = stream_record(1, "Dev", "o:Dev|g:Ops|ReadOnly")
+        root_record = stream_record(2, "root", "r:root|g:Ops|ReadOnly", event_name="REMOVE")
+        # The root worker checks the sources before the OU worker adds its source
+        assert assignments_operations.process_mapping_records(self.controller, [root_record]) == []
+        assert assignments_operations.process_mapping_records(self.controller, [ou_record]) == []
+        publish_assignment_tasks(self.controller, self.controller.coalescer)
+        assert index.get_sources(ACCOUNTS[0], "group-Ops") == {"Dev|o:Dev|g:Ops|ReadOnly"}
+        assert published_tasks(self.controller) == [
+            ("CREATE", "group-Ops", ACCOUNTS[:1]),
+            ("DELETE", "group-Ops", ACCOUNTS[1:]),
+        ]
+
+    def test_4_deleted_permission_set_mappings_are_removed(self):
+        self.controller.data.permission_sets.removed["Deleted"] = {
+            "PermissionSetArn": PERMISSION_SET_ARN
+        }
+        records = [
+            stream_record(1, "OU-A", "o:OU-A|g:Admins|Deleted", "MODIFY", status="Disabled"),
+            stream_record(2, "OU-A", "o:OU-A|g:Admins|Unknown"),
+        ]
+        with patch.object(index, "controller", self.controller):
+            response = index.handler({"Records": records}, None)
+        assert response["batchItemFailures"] == []
+        assert published_tasks(self.controller) == [("DELETE", "group-Admins", ACCOUNTS)]
+        # Unknown permission sets are reported and skipped
+        (call,) = self.controller.clients.error_handler.publish_error_message.call_args_list
+        assert call.args == (records[1], "Permission Set Unknown was not found.")
+
+    @staticmethod
+    def fail_lookup(name):
+        if name == "Broken":
+            raise Exception("Identity Store is not available")
+        return {"GroupId": f"group-{name}", "DisplayName": name}
@@ -0,0 +1,48 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+
+from .. import coalescing
+
+PERMISSION_SET_ARN = "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-504d6c2b57a3f2cb"
+
+"""
+Assignment coalescer testing class
+"""
+
+
+class TestAssignmentCoalescer(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def test_0_duplicates_collapse(self):
+        coalescer = coalescing.AssignmentCoalescer()
+        # Same group granted through a root and an OU mapping
+        coalescer.add(["111", "222", "333"], "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE")
+        coalescer.add(["222"], "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE")
+        assert coalescer.received == 4
+        assert len(coalescer) == 3
+        groups = coalescer.grouped()
+        assert list(groups) == [("GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", None)]
+        assert groups[list(groups)[0]] == ["111", "222", "333"]
+
+    def test_1_latest_record_wins(self):
+        coalescer = coalescing.AssignmentCoalescer()
+        # Records may be added out of order by concurrent workers
+        coalescer.add(["111", "222"], "GROUP", "group-1", PERMISSION_SET_ARN, "DELETE", "200")
+        coalescer.add(["111"], "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", "100")
+        coalescer.add(["222"], "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", "300")
+        assert coalescer.grouped() == {
+            ("GROUP", "group-1", PERMISSION_SET_ARN, "DELETE", "200"): ["111"],
+            ("GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", "300"): ["222"],
+        }
+
+    def test_2_deduplication_id(self):
+        task = ("111", "GROUP", "group-1", PERMISSION_SET_ARN)
+        assert coalescing.deduplication_id(*task, "CREATE") == coalescing.deduplication_id(
+            *task, "CREATE"
+        )
+        assert coalescing.deduplication_id(*task, "CREATE") != coalescing.deduplication_id(
+            *task, "DELETE"
+        )
+        assert len(coalescing.deduplication_id(*task, "CREATE")) <= 128
@@ -0,0 +1,74 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import Mock
+
+from .. import effective_index
+
+PERMISSION_SET_ARN = "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-504d6c2b57a3f2cb"
+
+"""
+Effective assignment index testing class
+"""
+
+
+class TestEffectiveAssignmentIndex(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def test_0_add_and_remove_sources(self):
+        client = Mock()
+        client.update_item.side_effect = lambda **kwargs: {
+            "Attributes": (
+                {"Sources": {"SS": ["root|r:root|g:Ops|ReadOnly"]}}
+                if kwargs["Key"]["AccountId"]["S"] == "111"
+                else {}
+            )
+        }
+        index = effective_index.EffectiveAssignmentIndex(client, "table")
+        remaining = index.remove_source(
+            ["111", "222"], "GROUP", "group-1", PERMISSION_SET_ARN, "Dev|o:Dev|g:Ops|ReadOnly"
+        )
+        assert remaining == {"111": {"root|r:root|g:Ops|ReadOnly"}, "222": set()}
+        kwargs = client.update_item.call_args_list[0].kwargs
+        assert kwargs["UpdateExpression"].startswith("DELETE #sources :source")
+        assert kwargs["ExpressionAttributeValues"][":source"] == {
+            "SS": ["Dev|o:Dev|g:Ops|ReadOnly"]
+        }
+        assert kwargs["Key"]["Assignment"] == {"S": f"GROUP|group-1|{PERMISSION_SET_ARN}"}
+        # Only the item without sources left is removed
+        client.delete_item.assert_called_once()
+        assert client.delete_item.call_args.kwargs["Key"]["AccountId"] == {"S": "222"}
+
+    def test_1_get_account_assignments(self):
+        client = Mock()
+        client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Items": [
+                    {
+                        "AccountId": {"S": "111"},
+                        "Assignment": {"S": f"GROUP|group-1|{PERMISSION_SET_ARN}"},
+                        "PrincipalType": {"S": "GROUP"},
+                        "PrincipalId": {"S": "group-1"},
+                        "PermissionSetArn": {"S": PERMISSION_SET_ARN},
+                        "Sources": {"SS": ["root|r:root|g:Ops|ReadOnly"]},
+                    }
+                ]
+            }
+        ]
+        index = effective_index.EffectiveAssignmentIndex(client, "table")
+        assignments = index.get_account_assignments("111")
+        assert assignments[0]["PrincipalId"] == "group-1"
+        assert assignments[0]["Sources"] == {"root|r:root|g:Ops|ReadOnly"}
+
+    def test_2_backfill_marker(self):
+        client = Mock()
+        client.get_item.return_value = {}
+        index = effective_index.EffectiveAssignmentIndex(client, "table")
+        assert not index.is_backfilled()
+        # A missing marker is not looked up again on every record
+        assert not index.is_backfilled()
+        client.get_item.assert_called_once()
+        index.mark_backfilled()
+        assert index.is_backfilled()
+        assert client.put_item.call_args.kwargs["Item"]["AccountId"] == {"S": "#backfill"}
@@ -0,0 +1,79 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+
+from unittest.mock import Mock
+
+from .. import principals
+
+IDENTITY_STORE_ID = "d-2b57a3f2cb"
+
+"""
+Principal resolver testing class
+"""
+
+
+def group(group_id, display_name):
+    return {"GroupId": group_id, "DisplayName": display_name, "IdentityStoreId": IDENTITY_STORE_ID}
+
+
+class TestPrincipalResolver(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def setUp(self):
+        self.identity_store = Mock()
+        self.resolver = principals.PrincipalResolver(
+            self.identity_store, IDENTITY_STORE_ID, max_size=2
+        )
+
+    def test_0_group_lookup_is_cached(self):
+        self.identity_store.list_groups.return_value = {"Groups": [group("group-1", "Admins")]}
+        resolved = self.resolver.get_group("Admins")
+        resolved["Id"] = resolved["GroupId"]
+        assert self.resolver.get_group("Admins") == group("group-1", "Admins")
+        self.identity_store.list_groups.assert_called_once_with(
+            IdentityStoreId=IDENTITY_STORE_ID,
+            Filters=[{"AttributePath": "DisplayName", "AttributeValue": "Admins"}],
+        )
+
+    def test_1_missing_user_is_negatively_cached(self):
+        self.identity_store.list_users.return_value = {"Users": []}
+        assert self.resolver.get_user("nobody") is None
+        assert self.resolver.get_user("nobody") is None
+        self.identity_store.list_users.assert_called_once()
+
+    def test_2_prefetch_groups(self):
+        self.identity_store.get_paginator.return_value.paginate.return_value = [
+            {"Groups": [group("group-1", "Admins"), group("group-2", "Readers")]},
+            {"Groups": [group("group-3", "Writers")]},
+        ]
+        self.identity_store.list_groups.return_value = {"Groups": [group("group-1", "Admins")]}
+        assert self.resolver.prefetch_groups() == 3
+        # Served from the sweep without further calls
+        assert self.resolver.get_group("Writers")["GroupId"] == "group-3"
+        self.identity_store.list_groups.assert_not_called()
+        # Evicted from the bounded cache, looked up again
+        assert self.resolver.get_group("Admins")["GroupId"] == "group-1"
+        self.identity_store.list_groups.assert_called_once()
+
+    def test_3_group_created_after_the_sweep(self):
+        self.identity_store.get_paginator.return_value.paginate.return_value = [
+            {"Groups": [group("group-1", "Admins")]}
+        ]
+        self.resolver.prefetch_groups()
+        self.identity_store.list_groups.return_value = {"Groups": [group("group-2", "Created")]}
+        # Missing from the sweep, found by a live lookup
+        assert self.resolver.get_group("Created")["GroupId"] == "group-2"
+
+    def test_4_missing_group_is_only_cached_for_the_negative_ttl(self):
+        resolver = principals.PrincipalResolver(
+            self.identity_store, IDENTITY_STORE_ID, ttl=300, negative_ttl=0
+        )
+        self.identity_store.get_paginator.return_value.paginate.return_value = [{"Groups": []}]
+        resolver.prefetch_groups()
+        self.identity_store.list_groups.return_value = {"Groups": []}
+        assert resolver.get_group("Later") is None
+        self.identity_store.list_groups.return_value = {"Groups": [group("group-3", "Later")]}
+        assert resolver.get_group("Later")["GroupId"] == "group-3"
+        assert self.identity_store.list_groups.call_count == 2
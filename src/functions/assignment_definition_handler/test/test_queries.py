@@ -0,0 +1,134 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import Mock
+
+from botocore.exceptions import ClientError
+
+from .. import queries
+
+
+def mapping(mapping_id, mapping_value):
+    return {
+        "mappingId": {"S": mapping_id},
+        "mappingValue": {"S": mapping_value},
+        "PermissionSetName": {"S": "ReadOnly"},
+    }
+
+
+"""
+Assignment table queries testing class
+"""
+
+
+class TestQueries(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def test_0_query_index(self):
+        client = Mock()
+        client.get_paginator.return_value.paginate.return_value = [
+            {"Items": [mapping("root", "r:root|g:Ops|ReadOnly")]},
+            {"Items": [mapping("Dev", "o:Dev|g:Dev|ReadOnly")]},
+        ]
+        items = list(
+            queries.query_permission_set_mappings(
+                client, "table", "index", "PermissionSetName", "ReadOnly"
+            )
+        )
+        assert [item["mappingId"] for item in items] == ["root", "Dev"]
+        client.get_paginator.assert_called_once_with("query")
+        kwargs = client.get_paginator.return_value.paginate.call_args.kwargs
+        assert kwargs["IndexName"] == "index"
+        assert kwargs["ExpressionAttributeValues"] == {":name": {"S": "ReadOnly"}}
+
+    def test_1_scan_without_index(self):
+        query = Mock()
+        query.paginate.side_effect = ClientError(
+            {"Error": {"Code": "ValidationException", "Message": "no index"}}, "Query"
+        )
+        scan = Mock()
+        scan.paginate.side_effect = lambda **kwargs: [
+            {"Items": [mapping(f"segment-{kwargs['Segment']}", "a:1|u:user|ReadOnly")]}
+        ]
+        client = Mock()
+        client.get_paginator.side_effect = lambda name: query if name == "query" else scan
+        items = list(
+            queries.query_permission_set_mappings(
+                client, "table", "index", "PermissionSetName", "ReadOnly", segments=3
+            )
+        )
+        assert sorted(item["mappingId"] for item in items) == [
+            "segment-0",
+            "segment-1",
+            "segment-2",
+        ]
+        assert {call.kwargs["TotalSegments"] for call in scan.paginate.call_args_list} == {3}
+
+    def test_2_update_mapping_status(self):
+        client = Mock()
+
+        def update_item(**kwargs):
+            if kwargs["Key"]["mappingId"] == {"S": "removed"}:
+                raise ClientError(
+                    {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+                    "UpdateItem",
+                )
+
+        client.update_item.side_effect = update_item
+        items = [
+            {"mappingId": "root", "mappingValue": "r:root|g:Ops|ReadOnly"},
+            {"mappingId": "Dev", "mappingValue": "o:Dev|g:Dev|ReadOnly"},
+            {"mappingId": "removed", "mappingValue": "a:1|u:user|ReadOnly"},
+            {
+                "mappingId": "Prod",
+                "mappingValue": "o:Prod|g:Ops|ReadOnly",
+                "PermissionSetStatus": "Disabled",
+            },
+        ]
+        summary = queries.update_mapping_status(
+            client,
+            "table",
+            ("mappingId", "mappingValue"),
+            items,
+            "PermissionSetStatus",
+            "Disabled",
+            max_workers=2,
+        )
+        assert summary == {"Updated": 2, "Skipped": 2}
+        assert client.update_item.call_count == 3
+        kwargs = client.update_item.call_args_list[0].kwargs
+        assert kwargs["ExpressionAttributeValues"] == {":status": {"S": "Disabled"}}
+        assert set(kwargs["Key"]) == {"mappingId", "mappingValue"}
+
+    def test_3_query_mappings_follows_pages(self):
+        client = Mock()
+        client.get_paginator.return_value.paginate.return_value = iter(
+            [
+                {"Items": [mapping("Dev", "o:Dev|g:Dev|ReadOnly")], "LastEvaluatedKey": {}},
+                {"Items": [mapping("Dev", "s:Dev|g:Ops|ReadOnly")]},
+            ]
+        )
+        items = queries.query_mappings(client, "table", "mappingId", "Dev")
+        assert [item["mappingValue"] for item in items] == [
+            "o:Dev|g:Dev|ReadOnly",
+            "s:Dev|g:Ops|ReadOnly",
+        ]
+        kwargs = client.get_paginator.return_value.paginate.call_args.kwargs
+        assert kwargs["ExpressionAttributeNames"] == {"#key": "mappingId"}
+
+    def test_4_no_scan_after_index_pages(self):
+        def pages():
+            yield {"Items": [mapping("root", "r:root|g:Ops|ReadOnly")]}
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": ""}}, "Query")
+
+        client = Mock()
+        client.get_paginator.return_value.paginate.return_value = pages()
+        items = queries.query_permission_set_mappings(
+            client, "table", "index", "PermissionSetName", "ReadOnly"
+        )
+        assert next(items)["mappingId"] == "root"
+        # Falling back to a scan would yield the mapping a second time
+        with self.assertRaises(ClientError):
+            next(items)
+        client.get_paginator.assert_called_once_with("query")
@@ -0,0 +1,197 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import json
+import unittest
+from unittest.mock import patch
+
+import index
+import reconciliation
+from orgz.account_set import AccountOrdinals
+
+from .fixtures import (
+    PERMISSION_SET_ARN,
+    InMemoryEffectiveIndex,
+    make_controller,
+    mapping,
+    published_tasks,
+)
+
+ACCOUNTS = ["111111111111", "222222222222", "333333333333"]
+OU_ACCOUNTS = ACCOUNTS[:2]
+UNMANAGED_PERMISSION_SET_ARN = "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-unmanaged"
+
+"""
+Reconciliation testing class
+"""
+
+
+class TestReconciliation(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def setUp(self):
+        self.controller = make_controller()
+        org = self.controller.clients.org
+        ordinals = AccountOrdinals(ACCOUNTS)
+        org.get_account_set.side_effect = ordinals.set_of
+        org.get_active_account_set.return_value = ordinals.set_of(ACCOUNTS)
+        org.get_account_set_for_path.side_effect = lambda path, recursive=False: (
+            ordinals.set_of(OU_ACCOUNTS if path == "/Dev" else [])
+        )
+        self.mappings = [
+            mapping("root", "r:root|g:Everyone|ReadOnly"),
+            mapping("Dev", "o:Dev|g:Developers|ReadOnly"),
+            mapping("Dev", "o:Dev|g:Retired|ReadOnly", status="Disabled"),
+        ]
+        patcher = patch.object(reconciliation, "scan_mappings", lambda client, table: self.mappings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Everyone is missing in one account, Retired and a removed user are still assigned
+        self.assignments = [
+            *(
+                self.assignment(account_id, "GROUP", "group-Everyone")
+                for account_id in ACCOUNTS[1:]
+            ),
+            *(
+                self.assignment(account_id, "GROUP", "group-Developers")
+                for account_id in OU_ACCOUNTS
+            ),
+            self.assignment(ACCOUNTS[0], "GROUP", "group-Retired"),
+            self.assignment(ACCOUNTS[2], "USER", "user-removed"),
+            self.assignment(ACCOUNTS[2], "GROUP", "group-Other", UNMANAGED_PERMISSION_SET_ARN),
+        ]
+        sso = self.controller.clients.sso
+        sso.list_accounts_for_provisioned_permission_set.side_effect = lambda arn: sorted(
+            {item["AccountId"] for item in self.assignments if item["PermissionSetArn"] == arn}
+        )
+        sso.list_account_assignments.side_effect = lambda account_id, arn: [
+            item
+            for item in self.assignments
+            if item["AccountId"] == account_id and item["PermissionSetArn"] == arn
+        ]
+
+    @staticmethod
+    def assignment(account_id, principal_type, principal_id, arn=PERMISSION_SET_ARN):
+        return {
+            "AccountId": account_id,
+            "PermissionSetArn": arn,
+            "PrincipalType": principal_type,
+            "PrincipalId": principal_id,
+        }
+
+    def test_0_collect_desired_assignments(self):
+        desired, managed, mapping_accounts, skipped = reconciliation.collect_desired_assignments(
+            self.controller
+        )
+        assert skipped == []
+        assert managed == {PERMISSION_SET_ARN}
+        assert {assignment: list(accounts) for assignment, accounts in desired.items()} == {
+            (PERMISSION_SET_ARN, "GROUP", "group-Everyone"): ACCOUNTS,
+            (PERMISSION_SET_ARN, "GROUP", "group-Developers"): OU_ACCOUNTS,
+        }
+        assert sorted(source for source, _, _ in mapping_accounts) == [
+            "Dev|o:Dev|g:Developers|ReadOnly",
+            "root|r:root|g:Everyone|ReadOnly",
+        ]
+
+    def test_1_collect_actual_assignments(self):
+        actual = reconciliation.collect_actual_assignments(self.controller, {PERMISSION_SET_ARN})
+        assert {assignment: list(accounts) for assignment, accounts in actual.items()} == {
+            (PERMISSION_SET_ARN, "GROUP", "group-Everyone"): ACCOUNTS[1:],
+            (PERMISSION_SET_ARN, "GROUP", "group-Developers"): OU_ACCOUNTS,
+            (PERMISSION_SET_ARN, "GROUP", "group-Retired"): ACCOUNTS[:1],
+            (PERMISSION_SET_ARN, "USER", "user-removed"): ACCOUNTS[2:],
+        }
+        # Permission sets without mappings are never listed
+        sso = self.controller.clients.sso
+        sso.list_accounts_for_provisioned_permission_set.assert_called_once_with(PERMISSION_SET_ARN)
+
+    def test_2_drift_is_queued(self):
+        with patch.object(index, "controller", self.controller):
+            response = index.handler(
+                {"source": "enterprise-aws-sso", "detail-type": "Reconciliation", "detail": {}},
+                None,
+            )
+        report = json.loads(response["body"])
+        assert [report[key] for key in ("Desired", "Actual", "Create", "Delete")] == [5, 6, 1, 2]
+        assert published_tasks(self.controller) == [
+            ("CREATE", "group-Everyone", ACCOUNTS[:1]),
+            ("DELETE", "group-Retired", ACCOUNTS[:1]),
+            ("DELETE", "user-removed", ACCOUNTS[2:]),
+        ]
+
+    def test_3_dry_run_queues_nothing(self):
+        with patch.object(index, "controller", self.controller):
+            response = index.handler(
+                {
+                    "source": "enterprise-aws-sso",
+                    "detail-type": "Reconciliation",
+                    "detail": {"DryRun": True},
+                },
+                None,
+            )
+        report = json.loads(response["body"])
+        assert report["DryRun"] is True
+        assert (report["Create"], report["Delete"]) == (1, 2)
+        assert report["Deletes"] == [
+            {
+                "AccountId": ACCOUNTS[0],
+                "PermissionSetArn": PERMISSION_SET_ARN,
+                "PrincipalType": "GROUP",
+                "PrincipalId": "group-Retired",
+            },
+            {
+                "AccountId": ACCOUNTS[2],
+                "PermissionSetArn": PERMISSION_SET_ARN,
+                "PrincipalType": "USER",
+                "PrincipalId": "user-removed",
+            },
+        ]
+        assert len(self.controller.coalescer) == 0
+        assert published_tasks(self.controller) == []
+
+    def test_4_effective_index_is_backfilled(self):
+        index = InMemoryEffectiveIndex(backfilled=False)
+        self.controller.clients.effective_index = index
+        # A source left behind by a removed mapping
+        index.add_source(
+            ACCOUNTS[:1],
+            "GROUP",
+            "group-Retired",
+            PERMISSION_SET_ARN,
+            "Dev|o:Dev|g:Retired|ReadOnly",
+        )
+        report = reconciliation.reconciliation_handler(self.controller, {"DryRun": True})
+        assert "IndexSourcesAdded" not in report
+        assert not index.is_backfilled()
+
+        report = reconciliation.reconciliation_handler(self.controller, {})
+        assert (report["IndexSourcesAdded"], report["IndexSourcesRemoved"]) == (5, 1)
+        assert index.is_backfilled()
+        assert index.get_sources(ACCOUNTS[0], "group-Retired") == set()
+        assert index.get_sources(ACCOUNTS[0], "group-Developers") == {
+            "Dev|o:Dev|g:Developers|ReadOnly"
+        }
+        assert index.get_sources(ACCOUNTS[2], "group-Everyone") == {
+            "root|r:root|g:Everyone|ReadOnly"
+        }
+
+    def test_5_mappings_failing_to_expand_are_skipped(self):
+        org = self.controller.clients.org
+        resolve_path = org.get_account_set_for_path.side_effect
+
+        def get_account_set_for_path(path, recursive=False):
+            if path == "/Gone":
+                raise Exception("OU Gone does not exist")
+            return resolve_path(path, recursive)
+
+        org.get_account_set_for_path.side_effect = get_account_set_for_path
+        # The Retired group is still granted by the mapping of a removed OU
+        self.mappings.append(mapping("Gone", "o:Gone|g:Retired|ReadOnly"))
+        report = reconciliation.reconciliation_handler(self.controller, {"DryRun": True})
+        assert report["Skipped"] == [
+            {"Mapping": "Gone|o:Gone|g:Retired|ReadOnly", "Error": "OU Gone does not exist"}
+        ]
+        assert (report["Create"], report["Delete"]) == (1, 1)
+        assert [task["PrincipalId"] for task in report["Deletes"]] == ["user-removed"]
@@ -0,0 +1,50 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+
+from coalescing import AssignmentCoalescer
+from sqs import publish_assignment_tasks
+
+from .fixtures import PERMISSION_SET_ARN, make_controller
+
+"""
+Assignment task publishing testing class
+"""
+
+
+class TestPublishAssignmentTasks(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def publish(self, tasks, origin):
+        controller = make_controller()
+        controller.config.queue_url = "test_queue.fifo"
+        controller.coalescer = AssignmentCoalescer(origin=origin)
+        for accounts, principal_id, action in tasks:
+            controller.coalescer.add(accounts, "GROUP", principal_id, PERMISSION_SET_ARN, action)
+        publish_assignment_tasks(controller, controller.coalescer)
+        (entries,), _ = controller.clients.sqs_publisher.publish.call_args
+        return {
+            entry["MessageBody"]: (entry["MessageGroupId"], entry["MessageDeduplicationId"])
+            for entry in entries
+        }
+
+    def test_0_retries_publish_the_same_ids(self):
+        tasks = [
+            (["111", "222"], "group-1", "CREATE"),
+            (["333"], "group-2", "DELETE"),
+        ]
+        first = self.publish(tasks, "event-1")
+        # A retry adds the same tasks in another order
+        retried = self.publish(list(reversed(tasks)), "event-1")
+        assert first == retried
+        assert len({group_id for group_id, _ in first.values()}) == 2
+        assert len({dedup_id for _, dedup_id in first.values()}) == 2
+
+    def test_1_later_events_are_not_deduplicated(self):
+        tasks = [(["111"], "group-1", "CREATE")]
+        # The same task queued again, e.g. by a mapping re-created after its removal
+        ((first_group, first_dedup),) = self.publish(tasks, "event-1").values()
+        ((later_group, later_dedup),) = self.publish(tasks, "event-2").values()
+        assert first_group == later_group
+        assert first_dedup != later_dedup
@@ -4,14 +4,20 @@
 ################################################################################
 
 
-import backoff
 import boto3
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from aws_assume_role_lib import assume_role
 from botocore import exceptions
+from botocore.config import Config
 from common.error import Error
+from common.tasks import decode_task, encode_task
+from common.throttling import TokenBucket
 from sso.handler import SsoService
+from sso.provisioning import ProvisioningTracker
 
 
 class ServerUnavailableException(Exception):
@@ -26,6 +32,7 @@ class UnknownException(Exception):
 ACTION_TYPE_CREATE = "CREATE"
 ACTION_TYPE_DELETE = "DELETE"
 LAMBDA_FUNC_NAME = "Assignment execution handler"
+MAX_ATTEMPTS = 10
 
 
 # TODO Set log level as a parameter
@@ -47,6 +54,11 @@ error_handler = Error(
 logger = error_handler.get_logger()
 
 
+# Failed targets of a multi-target task are requeued to the assignment queue
+queue_url = os.getenv("ASSIGNMENTS_QUEUE_URL", "ASSIGNMENTS_QUEUE_URL")
+sqs_client = session.client("sqs")
+
+
 # Is Identity Center delegated admin?
 use_delegated_admin = None
 
@@ -61,20 +73,32 @@ sso_admin_role_arn = os.getenv(
 )
 assumed_admin_role_session = assume_role(session, sso_admin_role_arn)
 sso_admin = None
+sso_service_lock = threading.Lock()
+
+# Messages of a batch are executed concurrently, sharing one rate limiter
+# sized to the SSO Admin API quota available to this execution environment.
+execution_workers = int(os.getenv("ASSIGNMENT_EXECUTION_WORKERS", "10"))
+rate_limiter = TokenBucket(
+    rate=float(os.getenv("SSO_ADMIN_REQUESTS_PER_SECOND", "5")),
+    capacity=float(os.getenv("SSO_ADMIN_BURST", "5")),
+)
+# Assignment requests are followed until they complete or the handler runs out of time
+provisioning_poll_interval = float(os.getenv("PROVISIONING_POLL_INTERVAL_SECONDS", "2"))
+provisioning_timeout = float(os.getenv("PROVISIONING_TIMEOUT_SECONDS", "60"))
+# Retries are driven by the rate limiter instead of the botocore retry handler
+sso_client_config = Config(
+    retries={"total_max_attempts": 1}, max_pool_connections=execution_workers
+)
 
 
 def handler(event, context):
     # TODO make proper call outside handler work with tests
-    global sso_admin
-    global sso_delegated_admin
     global use_delegated_admin
 
     # check if delegated admin is enabled
     if use_delegated_admin is None:
         try:
-            org_client = assumed_admin_role_session.client(
-                "organizations"
-            )
+            org_client = assumed_admin_role_session.client("organizations")
             response = org_client.list_delegated_administrators(
                 ServicePrincipal="sso.amazonaws.com",
             )
@@ -95,103 +119,180 @@ def handler(event, context):
 
     logger.info("use_delegated_admin is set to " + str(use_delegated_admin))
 
-    for record in event["Records"]:
-        message = record["body"]
-        logger.info(message)
-        messageDict = json.loads(message)
-        principal_type = messageDict["PrincipalType"]
-        principal_id = messageDict["PrincipalId"]
-        permission_set_arn = messageDict["PermissionSetArn"]
-        target_id = messageDict["TargetId"]
-        action = messageDict["Action"]
-
-        # For management account and none delegated admin, we use the management account
-        if target_id == management_account_id or not use_delegated_admin:
-            if sso_admin is None:
-                sso_admin = SsoService(assumed_admin_role_session)
-            sso = sso_admin
-        else:
-            if sso_delegated_admin is None:
-                sso_delegated_admin = SsoService(session)
-            sso = sso_delegated_admin
-
-        if action == ACTION_TYPE_CREATE:
-
-            @backoff.on_exception(
-                backoff.expo,
-                (
-                    sso.client.exceptions.ConflictException,
-                    sso.client.exceptions.ThrottlingException,
-                ),
-                max_tries=10,
-            )
-            def create_account_assignment(
-                message, principal_type, principal_id, permission_set_arn, target_id, sso
-            ):
-                response = sso.client.create_account_assignment(
-                    InstanceArn=sso.instance_arn,
-                    TargetId=target_id,
-                    TargetType="AWS_ACCOUNT",
-                    PermissionSetArn=permission_set_arn,
-                    PrincipalType=principal_type,
-                    PrincipalId=principal_id,
-                )
-                logger.info(response)
-
-            # Create Account/PermissionSet Assignment
+    batch_item_failures = []
+    # Target accounts which failed per message id
+    failed_targets = {}
+    tasks = {}
+    tracker = ProvisioningTracker(rate_limiter, poll_interval=provisioning_poll_interval)
+    with ThreadPoolExecutor(max_workers=execution_workers) as executor:
+        futures = {}
+        for record in event["Records"]:
             try:
-                create_account_assignment(
-                    message, principal_type, principal_id, permission_set_arn, target_id, sso
-                )
-            except Exception as exception:
-                # If Exception occurs, parse Response and write it to Error Topic.
-                # Then, raise exception to not delete the message from queue.
-                logger.error("Exception: " + str(exception))
-                error_handler.publish_error_message(message, str(exception))
-                raise (exception)
-
-        elif action == ACTION_TYPE_DELETE:
-
-            @backoff.on_exception(
-                backoff.expo,
-                (
-                    sso.client.exceptions.ConflictException,
-                    sso.client.exceptions.ThrottlingException,
-                ),
-                max_tries=10,
+                target_ids, task = decode_task(record["body"])
+            except (ValueError, KeyError) as exception:
+                logger.error(f"Message {record['messageId']} is not a valid task: {exception}")
+                error_handler.publish_error_message(record["body"], str(exception))
+                batch_item_failures.append({"itemIdentifier": record["messageId"]})
+                continue
+            tasks[record["messageId"]] = (record, target_ids, task)
+            failed_targets[record["messageId"]] = set()
+            for target_id in target_ids:
+                future = executor.submit(process_target, record, target_id, task, tracker)
+                futures[future] = (record, target_id)
+
+        for future, (record, target_id) in futures.items():
+            if (exception := future.exception()) is not None:
+                logger.error(f"Message {record['messageId']} failed for {target_id}: {exception}")
+                failed_targets[record["messageId"]].add(target_id)
+
+        deadline = time.monotonic() + provisioning_timeout
+        if hasattr(context, "get_remaining_time_in_millis"):
+            # Leave some time to return the batch item failures
+            deadline = min(
+                deadline, time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 10
             )
-            def delete_account_assignment(
-                principal_type, principal_id, permission_set_arn, target_id, sso
-            ):
-                response = sso.client.delete_account_assignment(
-                    InstanceArn=sso.instance_arn,
-                    TargetId=target_id,
-                    TargetType="AWS_ACCOUNT",
-                    PermissionSetArn=permission_set_arn,
-                    PrincipalType=principal_type,
-                    PrincipalId=principal_id,
-                )
-                logger.info(response)
-
-            # Delete Account/PermissionSet Assignment
-            try:
-                delete_account_assignment(
-                    principal_type, principal_id, permission_set_arn, target_id, sso
-                )
-            except Exception as exception:
-                # If Exception occurs, parse Response and write it to Error Topic.
-                # Then, raise exception to not delete the message from queue.
-                logger.error("Exception: " + str(exception))
-                error_handler.publish_error_message(message, str(exception))
-                raise (exception)
+        # Failed provisioning requests are requeued to be executed again
+        for request in tracker.wait(executor, deadline):
+            error_handler.publish_error_message(
+                request.status, str(request.status.get("FailureReason"))
+            )
+            failed_targets[request.message_id].add(request.target_id)
 
-        else:
-            # Not supported action
-            logger.info("Not supported action: " + str(message))
-            error_handler.publish_error_message(message, "Not supported action.")
-            raise AttributeError
+    for message_id, (record, target_ids, task) in tasks.items():
+        if failed_targets[message_id] and not requeue_failed_targets(
+            record, target_ids, task, failed_targets[message_id]
+        ):
+            # Only failed messages are returned to the queue, the rest of the batch is deleted
+            batch_item_failures.append({"itemIdentifier": message_id})
+
+    batch_item_failures = with_fifo_successors(event["Records"], batch_item_failures)
 
     return {
         "statusCode": 200,
         "body": json.dumps("Event was handled properly by Assignment Execution Handler."),
+        "batchItemFailures": batch_item_failures,
     }
+
+
+def with_fifo_successors(records, batch_item_failures):
+    """On FIFO queues, messages following a failed one in its group are retried as well"""
+    failed_ids = {failure["itemIdentifier"] for failure in batch_item_failures}
+    failed_groups = set()
+    for record in records:
+        group_id = record.get("attributes", {}).get("MessageGroupId")
+        if group_id is None:
+            continue
+        if record["messageId"] in failed_ids:
+            failed_groups.add(group_id)
+        elif group_id in failed_groups:
+            failed_ids.add(record["messageId"])
+            batch_item_failures.append({"itemIdentifier": record["messageId"]})
+    return batch_item_failures
+
+
+def requeue_failed_targets(record, target_ids, task, failed):
+    """Sends the failed targets of a partially failed message as a new message.
+
+    Returns False when the whole message has to be returned to the queue
+    instead: every target failed, the queue is FIFO, or sending failed.
+    """
+    if len(failed) == len(target_ids) or "MessageGroupId" in record.get("attributes", {}):
+        return False
+    try:
+        sqs_client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=encode_task(
+                [target_id for target_id in target_ids if target_id in failed],
+                task["PrincipalType"],
+                task["PrincipalId"],
+                task["PermissionSetArn"],
+                task["Action"],
+            ),
+        )
+    except exceptions.ClientError as exception:
+        logger.error(f"Failed to requeue targets of message {record['messageId']}: {exception}")
+        return False
+    logger.info(f"Requeued {len(failed)} of {len(target_ids)} targets of {record['messageId']}")
+    return True
+
+
+def get_sso_service(target_id):
+    global sso_admin
+    global sso_delegated_admin
+
+    with sso_service_lock:
+        # For management account and none delegated admin, we use the management account
+        if target_id == management_account_id or not use_delegated_admin:
+            if sso_admin is None:
+                sso_admin = SsoService(assumed_admin_role_session, config=sso_client_config)
+            return sso_admin
+        if sso_delegated_admin is None:
+            sso_delegated_admin = SsoService(session, config=sso_client_config)
+        return sso_delegated_admin
+
+
+def call_with_rate_limit(sso, operation, **kwargs):
+    for attempt in range(MAX_ATTEMPTS):
+        rate_limiter.acquire()
+        try:
+            response = operation(**kwargs)
+        except sso.client.exceptions.ThrottlingException as exception:
+            last_exception = exception
+            rate_limiter.throttled()
+        except sso.client.exceptions.ConflictException as exception:
+            # Another operation on the same permission set is still in progress
+            last_exception = exception
+            time.sleep(rate_limiter.retry_delay(attempt))
+        else:
+            rate_limiter.succeeded()
+            return response
+    raise last_exception
+
+
+def process_target(record, target_id, task, tracker):
+    message = json.dumps({**task, "TargetId": target_id})
+    logger.debug(message)
+    principal_type = task["PrincipalType"]
+    principal_id = task["PrincipalId"]
+    permission_set_arn = task["PermissionSetArn"]
+    action = task["Action"]
+
+    sso = get_sso_service(target_id)
+
+    if action == ACTION_TYPE_CREATE:
+        operation = sso.client.create_account_assignment
+    elif action == ACTION_TYPE_DELETE:
+        operation = sso.client.delete_account_assignment
+    else:
+        # Not supported action
+        logger.info("Not supported action: " + str(message))
+        error_handler.publish_error_message(message, "Not supported action.")
+        raise AttributeError
+
+    # Create or delete Account/PermissionSet Assignment
+    try:
+        response = call_with_rate_limit(
+            sso,
+            operation,
+            InstanceArn=sso.instance_arn,
+            TargetId=target_id,
+            TargetType="AWS_ACCOUNT",
+            PermissionSetArn=permission_set_arn,
+            PrincipalType=principal_type,
+            PrincipalId=principal_id,
+        )
+        logger.info(response)
+        tracker.track(
+            record["messageId"],
+            target_id,
+            action,
+            sso,
+            response.get("AccountAssignmentCreationStatus")
+            or response.get("AccountAssignmentDeletionStatus"),
+        )
+    except Exception as exception:
+        # If Exception occurs, parse Response and write it to Error Topic.
+        # Then, raise exception to report the target as failed.
+        logger.error("Exception: " + str(exception))
+        error_handler.publish_error_message(message, str(exception))
+        raise (exception)
@@ -9,13 +9,16 @@ import unittest
 
 from aws_lambda_powertools import Logger
 from botocore.stub import Stubber
+from unittest.mock import Mock, patch
 
 from .. import index
+from common import tasks
 from sso.test.test_sso_handler import TestSsoLayer
 
 from assignment_execution_handler.test.payloads import (
     event_input_data_create,
     event_input_data_delete,
+    event_input_data_notsupportedaction,
 )
 
 
@@ -40,6 +43,7 @@ class TestApp(unittest.TestCase):  # pylint: disable=R0904,C0116
     index.sso_admin.client = sso_admin
 
     index.use_delegated_admin = False
+    index.provisioning_poll_interval = 0
     """
     Assignment execution create event test
     """
@@ -112,3 +116,168 @@ class TestApp(unittest.TestCase):  # pylint: disable=R0904,C0116
         self.sso_admin_stubber.activate()
         res = index.handler(event_input_data_delete, {})
         assert res is not None
+        assert res["batchItemFailures"] == []
+
+    """
+    Assignment execution partial batch failure test
+    """
+
+    def test_2_handler_assignment_execution_handler_reports_failed_messages(self):
+        event = {
+            "Records": event_input_data_create["Records"]
+            + [
+                {
+                    **event_input_data_notsupportedaction["Records"][0],
+                    "messageId": "5f1a9a9e-1b9e-4f57-9d36-6d1c9b1c0e2a",
+                }
+            ]
+        }
+        self.sso_admin_stubber.add_response(
+            "create_account_assignment",
+            service_response={
+                "AccountAssignmentCreationStatus": {
+                    "RequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+                    "Status": "IN_PROGRESS",
+                }
+            },
+        )
+        self.sso_admin_stubber.add_response(
+            "describe_account_assignment_creation_status",
+            service_response={
+                "AccountAssignmentCreationStatus": {
+                    "RequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+                    "Status": "SUCCEEDED",
+                }
+            },
+            expected_params={
+                "InstanceArn": "arn:aws:iam::112223334444:ssoinstance",
+                "AccountAssignmentCreationRequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+            },
+        )
+        self.sso_admin_stubber.activate()
+
+        with patch.object(index.error_handler, "publish_error_message") as publish_error_message:
+            res = index.handler(event, {})
+        assert res["batchItemFailures"] == [
+            {"itemIdentifier": "5f1a9a9e-1b9e-4f57-9d36-6d1c9b1c0e2a"}
+        ]
+        publish_error_message.assert_called_once()
+        self.sso_admin_stubber.assert_no_pending_responses()
+
+    """
+    Assignment execution failed provisioning test
+    """
+
+    def test_3_handler_assignment_execution_handler_requeues_failed_provisioning(self):
+        self.sso_admin_stubber.add_response(
+            "delete_account_assignment",
+            service_response={
+                "AccountAssignmentDeletionStatus": {
+                    "RequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+                    "Status": "IN_PROGRESS",
+                }
+            },
+        )
+        self.sso_admin_stubber.add_response(
+            "describe_account_assignment_deletion_status",
+            service_response={
+                "AccountAssignmentDeletionStatus": {
+                    "RequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+                    "Status": "FAILED",
+                    "FailureReason": "Received a 404 status error: Not supported policy.",
+                }
+            },
+            expected_params={
+                "InstanceArn": "arn:aws:iam::112223334444:ssoinstance",
+                "AccountAssignmentDeletionRequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+            },
+        )
+        self.sso_admin_stubber.activate()
+
+        with patch.object(index.error_handler, "publish_error_message") as publish_error_message:
+            res = index.handler(event_input_data_delete, {})
+        assert res["batchItemFailures"] == [
+            {"itemIdentifier": event_input_data_delete["Records"][0]["messageId"]}
+        ]
+        publish_error_message.assert_called_once()
+        self.sso_admin_stubber.assert_no_pending_responses()
+
+    """
+    Assignment execution multi-target message test
+    """
+
+    def test_4_handler_assignment_execution_handler_requeues_failed_targets(self):
+        record = {
+            **event_input_data_create["Records"][0],
+            "body": tasks.encode_task(
+                ["111111111111", "222222222222"],
+                "GROUP",
+                "string",
+                "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-504d6c2b57a3f2cb",
+                "CREATE",
+            ),
+        }
+        for target_id, status in (("111111111111", "SUCCEEDED"), ("222222222222", "FAILED")):
+            self.sso_admin_stubber.add_response(
+                "create_account_assignment",
+                service_response={
+                    "AccountAssignmentCreationStatus": {
+                        "RequestId": "h47hd9w5i0tv4x1q55f664arbe4ab2otges4",
+                        "Status": status,
+                        "TargetId": target_id,
+                    }
+                },
+            )
+        self.sso_admin_stubber.activate()
+
+        # A single worker keeps the stubbed responses in order
+        with patch.object(index, "execution_workers", 1), patch.object(
+            index.error_handler, "publish_error_message"
+        ), patch.object(index, "sqs_client") as sqs_client:
+            res = index.handler({"Records": [record]}, {})
+        assert res["batchItemFailures"] == []
+        target_ids, task = tasks.decode_task(
+            sqs_client.send_message.call_args.kwargs["MessageBody"]
+        )
+        assert target_ids == ["222222222222"]
+        assert task["Action"] == "CREATE"
+        self.sso_admin_stubber.assert_no_pending_responses()
+
+    """
+    Assignment execution rate limited call tests
+    """
+
+    def client_error(self, name):
+        return getattr(self.sso_admin.exceptions, name)(
+            {"Error": {"Code": name, "Message": name}}, "CreateAccountAssignment"
+        )
+
+    def test_5_rate_limited_calls_retry_throttling_and_conflicts(self):
+        operation = Mock(
+            side_effect=[
+                self.client_error("ThrottlingException"),
+                self.client_error("ConflictException"),
+                {"AccountAssignmentCreationStatus": {}},
+            ]
+        )
+        with patch.object(index, "rate_limiter") as rate_limiter, patch.object(
+            index.time, "sleep"
+        ) as sleep:
+            response = index.call_with_rate_limit(index.sso_admin, operation, TargetId="1")
+        assert response == {"AccountAssignmentCreationStatus": {}}
+        assert operation.call_count == 3
+        assert rate_limiter.acquire.call_count == 3
+        # Throttling pauses all workers, a conflict only delays this call
+        rate_limiter.throttled.assert_called_once()
+        rate_limiter.retry_delay.assert_called_once_with(1)
+        sleep.assert_called_once_with(rate_limiter.retry_delay.return_value)
+        rate_limiter.succeeded.assert_called_once()
+
+    def test_6_rate_limited_calls_give_up_after_max_attempts(self):
+        operation = Mock(side_effect=self.client_error("ThrottlingException"))
+        with patch.object(index, "rate_limiter") as rate_limiter:
+            with self.assertRaises(self.sso_admin.exceptions.ThrottlingException):
+                index.call_with_rate_limit(index.sso_admin, operation, TargetId="1")
+        assert operation.call_count == index.MAX_ATTEMPTS
+        assert rate_limiter.throttled.call_count == index.MAX_ATTEMPTS
+        rate_limiter.succeeded.assert_not_called()
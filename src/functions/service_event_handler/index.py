@@ -10,10 +10,10 @@ import json
 import os
 
 import boto3
-from aws_lambda_powertools.utilities.data_classes import EventBridgeEvent, event_source
 from common.error import Error
 from common.encoder import PythonObjectEncoder
-from organizations_events import process_organizations_event
+from common.publishing import EventBridgeBatchPublisher
+from organizations_events import aggregate_account_operations, process_organizations_event
 from awssso_events import process_awssso_event
 
 LAMBDA_FUNCTION_NAME = "service_event_handler"
@@ -38,34 +38,80 @@ event_processors = {
 }
 
 
-def send_event(event_type: str, payload: dict) -> None:
-    event_payload = [
-        {
-            "Time": datetime.datetime.now().isoformat(),
-            "Source": "enterprise-aws-sso",
-            "Resources": [],
-            "DetailType": event_type,
-            "Detail": json.dumps(payload, cls=PythonObjectEncoder),
-            "EventBusName": iam_event_bus_arn,
-        },
-    ]
-    event_bridge_client.put_events(Entries=event_payload)
-
-
-@event_source(data_class=EventBridgeEvent)
-def handler(event: EventBridgeEvent, context):
-    logger.debug(event.raw_event)
-    if event.source not in event_processors.keys():
+def build_event_entry(event_type: str, payload: dict) -> dict:
+    return {
+        "Time": datetime.datetime.now().isoformat(),
+        "Source": "enterprise-aws-sso",
+        "Resources": [],
+        "DetailType": event_type,
+        "Detail": json.dumps(payload, cls=PythonObjectEncoder),
+        "EventBusName": iam_event_bus_arn,
+    }
+
+
+def process_service_event(event: dict):
+    """Returns the application event type and payload of a service event"""
+    if event.get("source") not in event_processors.keys():
         logger.error("Event source is not supported")
         raise UnsupportedEvent()
 
-    event_type, processed_service_event = event_processors[event.source](event.raw_event)
-
-    if processed_service_event:
-        send_event(event_type, processed_service_event)
+    return event_processors[event["source"]](event)
+
+
+def process_queued_events(publisher: EventBridgeBatchPublisher, records: list) -> dict:
+    """Handles the service events buffered by the service event queue.
+
+    Account creations, and account moves between the same two OUs, received
+    in the same batch are aggregated into one application event. Events which
+    can not be processed are reported to the error topic, only messages whose
+    application event could not be published are returned as batch item
+    failures to be received again.
+    """
+    operations = []
+    for record in records:
+        try:
+            event_type, payload = process_service_event(json.loads(record["body"]))
+        except Exception as exception:
+            logger.exception(f"Failed to process message {record['messageId']}")
+            error_handler.publish_error_message(record["body"], str(exception))
+            continue
+        if payload:
+            operations.append((event_type, payload, [record["messageId"]]))
+
+    entry_messages = {}
+    for event_type, payload, message_ids in aggregate_account_operations(operations):
+        entry_messages[publisher.add(build_event_entry(event_type, payload))] = message_ids
+
+    summary = publisher.flush()
+    failed_message_ids = {
+        message_id
+        for failed in summary["FailedEntries"]
+        for message_id in entry_messages[failed["Index"]]
+    }
+    return {"batchItemFailures": [{"itemIdentifier": item} for item in sorted(failed_message_ids)]}
+
+
+def handler(event: dict, context):
+    logger.debug(event)
+    publisher = EventBridgeBatchPublisher(event_bridge_client)
+    if "Records" in event:
+        return process_queued_events(publisher, event["Records"])
+
+    event_type, payload = process_service_event(event)
+    if payload:
+        publisher.add(build_event_entry(event_type, payload))
+    summary = publisher.flush()
+    if summary["Failed"]:
+        raise EventPublishingError(f"Failed to publish events: {summary['FailedEntries']}")
 
 
 class UnsupportedEvent(Exception):
     """Event source is not supported"""
 
     pass
+
+
+class EventPublishingError(Exception):
+    """Application events could not be published to the event bus"""
+
+    pass
@@ -11,6 +11,9 @@ from typing import Tuple
 
 logger = Logger(child=True)
 
+# Accounts carried by one aggregated account operation
+MAX_AGGREGATED_ACCOUNTS = 100
+
 
 def process_organizations_event(event: dict) -> Tuple[str, dict]:
     operation_name = "AccountOperation"
@@ -30,6 +33,20 @@ def process_organizations_event(event: dict) -> Tuple[str, dict]:
             operation_event["AccountId"] = request_parameters["accountId"]
             operation_event["AccountOuName"] = request_parameters["destinationParentId"]
             operation_event["AccountOldOuName"] = request_parameters["sourceParentId"]
+        elif event_name in ("TagResource", "UntagResource"):
+            request_parameters: dict = event["detail"].get("requestParameters")
+            # Only account tags are indexed, OUs, roots and policies are tagged as well
+            if not request_parameters["resourceId"].isdigit():
+                return operation_name, {}
+            operation_event["AccountId"] = request_parameters["resourceId"]
+            if event_name == "TagResource":
+                operation_event["Action"] = "tagged"
+                operation_event["Tags"] = {
+                    tag["key"]: tag["value"] for tag in request_parameters["tags"]
+                }
+            else:
+                operation_event["Action"] = "untagged"
+                operation_event["TagKeys"] = request_parameters["tagKeys"]
         else:
             logger.error(f"Action for Lifecycle Event {event_name} not defined")
             raise OrganizationsEventError("Action for Lifecycle Event not defined")
@@ -43,6 +60,43 @@ def process_organizations_event(event: dict) -> Tuple[str, dict]:
         ) from e
 
 
+def aggregate_account_operations(operations: list) -> list:
+    """Merges account creations, and account moves between the same two OUs, into one operation.
+
+    Takes and returns (operation name, operation event, message ids) tuples.
+    Merged operations list their accounts in "AccountIds", other operations
+    are returned unchanged and in order. An account seen again starts new
+    groups, so its operations keep their order.
+    """
+    aggregated = []
+    groups = {}
+    grouped_accounts = set()
+    for operation_name, operation_event, message_ids in operations:
+        action = operation_event.get("Action")
+        if operation_name != "AccountOperation" or action not in ("created", "moved"):
+            aggregated.append((operation_name, operation_event, message_ids))
+            continue
+        if operation_event["AccountId"] in grouped_accounts:
+            groups = {}
+            grouped_accounts = set()
+        group_key = (
+            action,
+            operation_event.get("AccountOldOuName"),
+            operation_event.get("AccountOuName"),
+        )
+        group = groups.get(group_key)
+        if group is None or len(group[1]["AccountIds"]) >= MAX_AGGREGATED_ACCOUNTS:
+            group_event = {
+                key: value for key, value in operation_event.items() if key != "AccountId"
+            }
+            group = groups[group_key] = (operation_name, {**group_event, "AccountIds": []}, [])
+            aggregated.append(group)
+        group[1]["AccountIds"].append(operation_event["AccountId"])
+        grouped_accounts.add(operation_event["AccountId"])
+        group[2].extend(message_ids)
+    return aggregated
+
+
 class OrganizationsEventError(Exception):
     """Error while processing AWS Control Tower Lifecycle Event"""
 
@@ -0,0 +1,80 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import patch
+
+from .. import organizations_events
+
+"""
+Organizations event aggregation testing class
+"""
+
+
+def moved(account_id, source, destination):
+    return {
+        "Action": "moved",
+        "AccountId": account_id,
+        "AccountOldOuName": source,
+        "AccountOuName": destination,
+    }
+
+
+class TestAccountOperationAggregation(unittest.TestCase):  # pylint: disable=C0116
+    def test_0_group_by_parents(self):
+        operations = [
+            ("AccountOperation", moved("1", "ou-a", "ou-b"), ["m1"]),
+            ("AccountOperation", {"Action": "created", "AccountId": "2"}, ["m2"]),
+            ("AccountOperation", moved("3", "ou-a", "ou-c"), ["m3"]),
+            ("AccountOperation", {"Action": "tagged", "AccountId": "4", "Tags": {}}, ["m4"]),
+            ("AccountOperation", moved("5", "ou-a", "ou-b"), ["m5"]),
+            ("AccountOperation", {"Action": "created", "AccountId": "6"}, ["m6"]),
+        ]
+        aggregated = organizations_events.aggregate_account_operations(operations)
+        assert aggregated == [
+            (
+                "AccountOperation",
+                {
+                    "Action": "moved",
+                    "AccountOldOuName": "ou-a",
+                    "AccountOuName": "ou-b",
+                    "AccountIds": ["1", "5"],
+                },
+                ["m1", "m5"],
+            ),
+            ("AccountOperation", {"Action": "created", "AccountIds": ["2", "6"]}, ["m2", "m6"]),
+            (
+                "AccountOperation",
+                {
+                    "Action": "moved",
+                    "AccountOldOuName": "ou-a",
+                    "AccountOuName": "ou-c",
+                    "AccountIds": ["3"],
+                },
+                ["m3"],
+            ),
+            operations[3],
+        ]
+
+    def test_1_keep_order_of_an_account(self):
+        operations = [
+            ("AccountOperation", moved("1", "ou-b", "ou-c"), ["m1"]),
+            ("AccountOperation", moved("2", "ou-a", "ou-b"), ["m2"]),
+            ("AccountOperation", moved("2", "ou-b", "ou-c"), ["m3"]),
+        ]
+        aggregated = organizations_events.aggregate_account_operations(operations)
+        assert [operation[2] for operation in aggregated] == [["m1"], ["m2"], ["m3"]]
+
+    def test_2_limit_accounts_per_operation(self):
+        operations = [
+            ("AccountOperation", moved(str(idx), "ou-a", "ou-b"), [f"m{idx}"]) for idx in range(5)
+        ]
+        with patch.object(organizations_events, "MAX_AGGREGATED_ACCOUNTS", 2):
+            aggregated = organizations_events.aggregate_account_operations(operations)
+        assert [operation[1]["AccountIds"] for operation in aggregated] == [
+            ["0", "1"],
+            ["2", "3"],
+            ["4"],
+        ]
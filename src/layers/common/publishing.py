@@ -0,0 +1,243 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from common.tasks import MAX_MESSAGE_BYTES
+
+logger = Logger(child=True)
+
+MAX_BATCH_ENTRIES = 10
+# Size counted by EventBridge for the Time field of an entry
+EVENT_TIME_BYTES = 14
+
+
+def pack_batches(entries, entry_size, max_entries=MAX_BATCH_ENTRIES, max_bytes=MAX_MESSAGE_BYTES):
+    """Packs entries in order into batches of at most max_entries entries and max_bytes"""
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        size = entry_size(entry)
+        if len(batch) == max_entries or (batch and batch_bytes + size > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def event_entry_size(entry):
+    """Size of a put_events entry as calculated by EventBridge"""
+    size = EVENT_TIME_BYTES if entry.get("Time") else 0
+    for field in ("Source", "DetailType", "Detail"):
+        size += len(entry.get(field, "").encode())
+    return size + sum(len(resource.encode()) for resource in entry.get("Resources", []))
+
+
+class SqsBatchPublisher:
+    """Sends messages to one queue in concurrent send_message_batch calls.
+
+    Entries are packed into batches of at most 10 entries and 256 KB. Entries
+    reported in the ``Failed`` list of a response are retried with a jittered
+    exponential delay, unless SQS reports them as a sender fault. The client
+    should allow at least ``max_workers`` pooled connections.
+
+    Entries of a FIFO message group are always sent in order from one worker,
+    only different groups are sent concurrently. Once an entry of a group
+    failed, the later entries of the group are reported as failed unsent.
+    """
+
+    def __init__(self, client, queue_url, max_workers=8, max_attempts=5, base_delay=0.1):
+        self.client = client
+        self.queue_url = queue_url
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+    def publish(self, entries):
+        """Publishes entries without an Id, returns a summary of the sent, retried and failed ones"""
+        summary = {"Sent": 0, "Retried": 0, "Failed": 0, "FailedEntries": []}
+        lock = threading.Lock()
+        lanes = self._lanes(entries)
+        if not lanes:
+            return summary
+
+        def send(batches):
+            failed_groups = set()
+            for batch in batches:
+                skipped = [
+                    {"Id": entry["Id"], "Code": "MessageGroupFailed", "Entry": entry}
+                    for entry in batch
+                    if entry.get("MessageGroupId") in failed_groups
+                ]
+                batch = [
+                    entry for entry in batch if entry.get("MessageGroupId") not in failed_groups
+                ]
+                sent, retried, failed = self._send_batch(batch) if batch else (0, 0, [])
+                failed += skipped
+                failed_groups.update(
+                    failure["Entry"]["MessageGroupId"]
+                    for failure in failed
+                    if "MessageGroupId" in failure["Entry"]
+                )
+                with lock:
+                    summary["Sent"] += sent
+                    summary["Retried"] += retried
+                    summary["Failed"] += len(failed)
+                    summary["FailedEntries"] += failed
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(lanes))) as executor:
+            list(executor.map(send, lanes))
+        logger.info(
+            {
+                "message": "SQS batch publishing summary",
+                "Batches": sum(len(batches) for batches in lanes),
+                **{key: value for key, value in summary.items() if key != "FailedEntries"},
+            }
+        )
+        return summary
+
+    def _lanes(self, entries):
+        """Splits the entries into lists of batches, each list is sent by one worker"""
+        entries = [{**entry, "Id": str(idx)} for idx, entry in enumerate(entries)]
+        groups = {}
+        for entry in entries:
+            if "MessageGroupId" in entry:
+                groups.setdefault(entry["MessageGroupId"], len(groups))
+        if not groups:
+            # Messages of a standard queue are unordered, every batch is sent on its own
+            return [[batch] for batch in self._batches(entries)]
+        lanes = [[] for _ in range(min(self.max_workers, len(groups)))]
+        for entry in entries:
+            lanes[groups[entry["MessageGroupId"]] % len(lanes)].append(entry)
+        return [list(self._batches(lane)) for lane in lanes]
+
+    @staticmethod
+    def _batches(entries):
+        return pack_batches(entries, lambda entry: len(entry["MessageBody"].encode()))
+
+    def _send_batch(self, batch):
+        pending = {entry["Id"]: entry for entry in batch}
+        sent = 0
+        retried = 0
+        failed = []
+        for attempt in range(self.max_attempts):
+            if attempt:
+                retried += len(pending)
+                delay = self.base_delay * 2**attempt
+                time.sleep(random.uniform(delay / 2, delay))
+            try:
+                response = self.client.send_message_batch(
+                    QueueUrl=self.queue_url, Entries=list(pending.values())
+                )
+            except ClientError as exception:
+                logger.warning(f"Failed to send a batch of {len(pending)} messages: {exception}")
+                last_failures = [
+                    {"Id": entry_id, "Code": exception.response["Error"].get("Code")}
+                    for entry_id in pending
+                ]
+                continue
+            sent += len(response.get("Successful", []))
+            last_failures = response.get("Failed", [])
+            retryable = {}
+            for failure in last_failures:
+                if failure.get("SenderFault"):
+                    failed.append({**failure, "Entry": pending[failure["Id"]]})
+                else:
+                    retryable[failure["Id"]] = pending[failure["Id"]]
+            pending = retryable
+            if not pending:
+                break
+        else:
+            codes = {failure["Id"]: failure.get("Code") for failure in last_failures}
+            failed += [
+                {"Id": entry_id, "Code": codes.get(entry_id), "Entry": entry}
+                for entry_id, entry in pending.items()
+            ]
+        return sent, retried, failed
+
+
+class EventBridgeBatchPublisher:
+    """Buffers EventBridge entries and sends them with as few put_events calls as possible.
+
+    Entries are packed into calls of at most 10 entries and 256 KB. Entries
+    returned with an ErrorCode are retried with a jittered exponential delay.
+    """
+
+    def __init__(self, client, max_attempts=5, base_delay=0.1):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._buffer = []
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, entry):
+        """Buffers an entry, returns its index in the summary of the next flush"""
+        self._buffer.append(entry)
+        return len(self._buffer) - 1
+
+    def flush(self):
+        """Publishes the buffered entries, returns a summary of the sent, retried and failed ones"""
+        entries, self._buffer = self._buffer, []
+        summary = {"Sent": 0, "Retried": 0, "Failed": 0, "FailedEntries": []}
+        batches = 0
+        for batch in pack_batches(enumerate(entries), lambda item: event_entry_size(item[1])):
+            batches += 1
+            sent, retried, failed = self._send_batch(batch)
+            summary["Sent"] += sent
+            summary["Retried"] += retried
+            summary["Failed"] += len(failed)
+            summary["FailedEntries"] += failed
+        if batches:
+            logger.info(
+                {
+                    "message": "EventBridge batch publishing summary",
+                    "Batches": batches,
+                    **{key: value for key, value in summary.items() if key != "FailedEntries"},
+                }
+            )
+        return summary
+
+    def _send_batch(self, batch):
+        pending = batch
+        sent = 0
+        retried = 0
+        for attempt in range(self.max_attempts):
+            if attempt:
+                retried += len(pending)
+                delay = self.base_delay * 2**attempt
+                time.sleep(random.uniform(delay / 2, delay))
+            try:
+                response = self.client.put_events(Entries=[entry for _, entry in pending])
+            except ClientError as exception:
+                logger.warning(f"Failed to put a batch of {len(pending)} events: {exception}")
+                codes = [exception.response["Error"].get("Code")] * len(pending)
+                continue
+            retryable = []
+            codes = []
+            for item, result in zip(pending, response["Entries"]):
+                if result.get("ErrorCode"):
+                    retryable.append(item)
+                    codes.append(result["ErrorCode"])
+                else:
+                    sent += 1
+            pending = retryable
+            if not pending:
+                break
+        failed = [
+            {"Index": index, "ErrorCode": code, "Entry": entry}
+            for (index, entry), code in zip(pending, codes)
+        ]
+        return sent, retried, failed
@@ -0,0 +1,75 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+"""
+Assignment task messages exchanged through the assignment processing queue.
+
+A compact message carries one principal, permission set and action for a list
+of target accounts:
+    {"PrincipalType": "", "PrincipalId": "", "PermissionSetArn": "", "Action": "", "TargetIds": []}
+Messages in the original format with a single "TargetId" are still accepted.
+"""
+
+import json
+
+# Maximum size of an SQS message body, and of all bodies in one send_message_batch call
+MAX_MESSAGE_BYTES = 262144
+
+
+def encode_task(target_ids, principal_type, principal_id, permission_set_arn, action):
+    return json.dumps(
+        {
+            "PrincipalType": principal_type,
+            "PrincipalId": principal_id,
+            "PermissionSetArn": permission_set_arn,
+            "Action": action,
+            "TargetIds": list(target_ids),
+        },
+        separators=(",", ":"),
+    )
+
+
+def pack_tasks(
+    target_ids,
+    principal_type,
+    principal_id,
+    permission_set_arn,
+    action,
+    max_bytes=MAX_MESSAGE_BYTES,
+    max_targets=None,
+):
+    """Packs targets into as few messages as possible, yields (target ids, message body)"""
+    base_size = len(
+        encode_task([], principal_type, principal_id, permission_set_arn, action).encode()
+    )
+    targets = []
+    size = base_size
+    for target_id in target_ids:
+        target_size = len(json.dumps(target_id).encode()) + (1 if targets else 0)
+        if targets and (
+            size + target_size > max_bytes or (max_targets and len(targets) >= max_targets)
+        ):
+            yield targets, encode_task(
+                targets, principal_type, principal_id, permission_set_arn, action
+            )
+            targets = []
+            size = base_size
+            target_size -= 1
+        targets.append(target_id)
+        size += target_size
+    if targets:
+        yield targets, encode_task(
+            targets, principal_type, principal_id, permission_set_arn, action
+        )
+
+
+def decode_task(body):
+    """Returns the target ids and the task of a message in either format"""
+    task = json.loads(body)
+    if "TargetIds" in task:
+        target_ids = task.pop("TargetIds")
+    else:
+        target_ids = [task.pop("TargetId")]
+    return target_ids, task
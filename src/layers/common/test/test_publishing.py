@@ -0,0 +1,185 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from .. import publishing
+
+"""
+SQS batch publisher testing class
+"""
+
+
+class TestSqsBatchPublisher(unittest.TestCase):  # pylint: disable=R0904,C0116
+    entries = [{"MessageBody": f"message-{idx}"} for idx in range(25)]
+
+    def test_0_publish_in_batches(self):
+        client = Mock()
+        client.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+            "Successful": [{"Id": entry["Id"]} for entry in Entries],
+            "Failed": [],
+        }
+        publisher = publishing.SqsBatchPublisher(client, "queue-url", max_workers=3)
+        summary = publisher.publish(self.entries)
+        assert summary == {"Sent": 25, "Retried": 0, "Failed": 0, "FailedEntries": []}
+        batch_sizes = sorted(
+            len(call.kwargs["Entries"]) for call in client.send_message_batch.call_args_list
+        )
+        assert batch_sizes == [5, 10, 10]
+
+    def test_1_retry_failed_entries(self):
+        client = Mock()
+        client.send_message_batch.side_effect = [
+            {
+                "Successful": [{"Id": str(idx)} for idx in range(8)],
+                "Failed": [
+                    {"Id": "8", "SenderFault": False, "Code": "InternalError"},
+                    {"Id": "9", "SenderFault": True, "Code": "InvalidMessageContents"},
+                ],
+            },
+            {"Successful": [{"Id": "8"}], "Failed": []},
+        ]
+        publisher = publishing.SqsBatchPublisher(client, "queue-url", base_delay=0)
+        summary = publisher.publish(self.entries[:10])
+        assert summary["Sent"] == 9
+        assert summary["Retried"] == 1
+        assert summary["Failed"] == 1
+        assert summary["FailedEntries"][0]["Entry"]["MessageBody"] == "message-9"
+        retry = client.send_message_batch.call_args_list[1].kwargs["Entries"]
+        assert retry == [{"MessageBody": "message-8", "Id": "8"}]
+
+    def test_2_give_up_after_max_attempts(self):
+        client = Mock()
+        client.send_message_batch.return_value = {
+            "Successful": [],
+            "Failed": [{"Id": "0", "SenderFault": False, "Code": "InternalError"}],
+        }
+        publisher = publishing.SqsBatchPublisher(client, "queue-url", max_attempts=3, base_delay=0)
+        summary = publisher.publish(self.entries[:1])
+        assert client.send_message_batch.call_count == 3
+        assert summary["Retried"] == 2
+        assert summary["FailedEntries"] == [
+            {"Id": "0", "Code": "InternalError", "Entry": {"MessageBody": "message-0", "Id": "0"}}
+        ]
+
+    def test_3_fifo_groups_are_sent_in_order(self):
+        entries = [
+            {"MessageBody": f"message-{idx}", "MessageGroupId": f"group-{idx % 3}"}
+            for idx in range(60)
+        ]
+        sending = []
+        sent = []
+        lock = threading.Lock()
+
+        def send_message_batch(QueueUrl, Entries):
+            groups = {entry["MessageGroupId"] for entry in Entries}
+            with lock:
+                # No other batch of the same group is in flight
+                assert not groups & set().union(*sending)
+                sending.append(groups)
+            time.sleep(0.01)
+            with lock:
+                sending.remove(groups)
+                sent.extend(Entries)
+            return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+        client = Mock()
+        client.send_message_batch.side_effect = send_message_batch
+        publisher = publishing.SqsBatchPublisher(client, "queue-url", max_workers=8)
+        summary = publisher.publish(entries)
+        assert summary["Sent"] == 60
+
+        def bodies(group, entries):
+            return [entry["MessageBody"] for entry in entries if entry["MessageGroupId"] == group]
+
+        for group in ("group-0", "group-1", "group-2"):
+            assert bodies(group, sent) == bodies(group, entries)
+
+    def test_4_fifo_group_stops_after_a_failure(self):
+        entries = [
+            {
+                "MessageBody": f"message-{idx}",
+                "MessageGroupId": "group-a" if idx < 15 else "group-b",
+            }
+            for idx in range(25)
+        ]
+        client = Mock()
+        client.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+            "Successful": [{"Id": entry["Id"]} for entry in Entries if entry["Id"] != "3"],
+            "Failed": [
+                {"Id": entry["Id"], "SenderFault": True, "Code": "InvalidMessageContents"}
+                for entry in Entries
+                if entry["Id"] == "3"
+            ],
+        }
+        publisher = publishing.SqsBatchPublisher(client, "queue-url", max_workers=1)
+        summary = publisher.publish(entries)
+        # The entries of group-a after the failed one are not sent
+        assert summary["Sent"] == 9 + 10
+        assert [failure["Id"] for failure in summary["FailedEntries"]] == ["3"] + [
+            str(idx) for idx in range(10, 15)
+        ]
+
+
+class TestEventBridgeBatchPublisher(unittest.TestCase):  # pylint: disable=R0904,C0116
+    @staticmethod
+    def entry(idx, detail_bytes=10):
+        return {
+            "Time": "2024-01-01T00:00:00",
+            "Source": "enterprise-aws-sso",
+            "DetailType": "AccountOperation",
+            "Detail": str(idx).ljust(detail_bytes),
+            "Resources": [],
+        }
+
+    def test_0_flush_in_batches(self):
+        client = Mock()
+        client.put_events.side_effect = lambda Entries: {
+            "FailedEntryCount": 0,
+            "Entries": [{"EventId": "id"} for _ in Entries],
+        }
+        publisher = publishing.EventBridgeBatchPublisher(client)
+        for idx in range(23):
+            publisher.add(self.entry(idx))
+        # Three large entries do not fit in one 256 KB call
+        for idx in range(3):
+            publisher.add(self.entry(idx, detail_bytes=100000))
+        summary = publisher.flush()
+        assert summary == {"Sent": 26, "Retried": 0, "Failed": 0, "FailedEntries": []}
+        batch_sizes = [len(call.kwargs["Entries"]) for call in client.put_events.call_args_list]
+        assert batch_sizes == [10, 10, 5, 1]
+        assert len(publisher) == 0
+
+    def test_1_retry_failed_entries(self):
+        client = Mock()
+        client.put_events.side_effect = [
+            {
+                "FailedEntryCount": 2,
+                "Entries": [
+                    {"EventId": "id"},
+                    {"ErrorCode": "InternalFailure"},
+                    {"ErrorCode": "ThrottlingException"},
+                ],
+            },
+            {
+                "FailedEntryCount": 1,
+                "Entries": [{"EventId": "id"}, {"ErrorCode": "InternalFailure"}],
+            },
+            {"FailedEntryCount": 1, "Entries": [{"ErrorCode": "InternalFailure"}]},
+        ]
+        publisher = publishing.EventBridgeBatchPublisher(client, max_attempts=3, base_delay=0)
+        for idx in range(3):
+            publisher.add(self.entry(idx))
+        summary = publisher.flush()
+        assert summary["Sent"] == 2
+        assert summary["Retried"] == 3
+        assert summary["FailedEntries"] == [
+            {"Index": 2, "ErrorCode": "InternalFailure", "Entry": self.entry(2)}
+        ]
+        retry = client.put_events.call_args_list[1].kwargs["Entries"]
+        assert retry == [self.entry(1), self.entry(2)]
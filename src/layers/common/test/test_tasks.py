@@ -0,0 +1,60 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import json
+import unittest
+
+from .. import tasks
+
+PERMISSION_SET_ARN = "arn:aws:sso:::permissionSet/ssoins-7223ac639f55e492/ps-504d6c2b57a3f2cb"
+
+"""
+Assignment task message testing class
+"""
+
+
+class TestTasks(unittest.TestCase):  # pylint: disable=R0904,C0116
+    accounts = [f"{idx:012d}" for idx in range(1000)]
+
+    def test_0_pack_by_size(self):
+        messages = list(
+            tasks.pack_tasks(self.accounts, "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", 4096)
+        )
+        assert len(messages) > 1
+        assert [target for targets, _ in messages for target in targets] == self.accounts
+        for targets, body in messages:
+            assert len(body.encode()) <= 4096
+            assert tasks.decode_task(body) == (
+                targets,
+                {
+                    "PrincipalType": "GROUP",
+                    "PrincipalId": "group-1",
+                    "PermissionSetArn": PERMISSION_SET_ARN,
+                    "Action": "CREATE",
+                },
+            )
+
+    def test_1_pack_by_targets(self):
+        messages = list(
+            tasks.pack_tasks(
+                self.accounts, "GROUP", "group-1", PERMISSION_SET_ARN, "CREATE", max_targets=300
+            )
+        )
+        assert [len(targets) for targets, _ in messages] == [300, 300, 300, 100]
+
+    def test_2_decode_single_target(self):
+        body = json.dumps(
+            {
+                "PrincipalType": "USER",
+                "PrincipalId": "user-1",
+                "PermissionSetArn": PERMISSION_SET_ARN,
+                "TargetId": "111111111111",
+                "Action": "DELETE",
+            },
+            indent=2,
+        )
+        target_ids, task = tasks.decode_task(body)
+        assert target_ids == ["111111111111"]
+        assert task["Action"] == "DELETE"
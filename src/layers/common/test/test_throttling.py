@@ -0,0 +1,55 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+from unittest.mock import Mock, patch
+
+from .. import throttling
+
+"""
+Token bucket testing class
+"""
+
+
+class TestTokenBucket(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def setUp(self):
+        # Time only advances when a worker sleeps
+        self.now = 0.0
+        self.sleeps = []
+        clock = Mock(monotonic=lambda: self.now, sleep=self.sleep)
+        # The longest delay of each jitter range
+        jitter = Mock(uniform=lambda low, high: high)
+        for name, replacement in (("time", clock), ("random", jitter)):
+            patcher = patch.object(throttling, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def test_0_acquire_paces_calls(self):
+        bucket = throttling.TokenBucket(rate=2, capacity=2)
+        for _ in range(4):
+            bucket.acquire()
+        # The burst is served from the full bucket, then one token per half second
+        assert self.sleeps == [0.5, 0.5]
+        assert self.now == 1.0
+
+    def test_1_throttled_drains_and_pauses(self):
+        bucket = throttling.TokenBucket(rate=4, capacity=4, base_delay=1)
+        bucket.throttled()
+        bucket.acquire()
+        # Waits out the pause, then for the first token to accumulate
+        assert self.sleeps == [1.0, 0.25]
+        self.sleeps.clear()
+        bucket.throttled()
+        bucket.throttled()
+        bucket.acquire()
+        # Consecutive throttles double the pause, the longer one wins
+        assert self.sleeps == [4.0, 0.25]
+        bucket.succeeded()
+        assert bucket.retry_delay(0) == 1.0
+        assert bucket.retry_delay(10) == bucket.max_delay
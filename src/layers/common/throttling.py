@@ -0,0 +1,64 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all workers calling one API.
+
+    Tokens are added at ``rate`` per second up to ``capacity``; ``acquire``
+    blocks until a token is available. When the service still throttles,
+    ``throttled`` drains the bucket and pauses every worker for an
+    exponentially growing, jittered delay until a call succeeds again.
+    """
+
+    def __init__(self, rate, capacity=None, base_delay=0.5, max_delay=20.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                    )
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def retry_delay(self, attempt):
+        """Jittered exponential delay for the given retry attempt"""
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    def throttled(self):
+        with self._lock:
+            delay = self.retry_delay(self._consecutive_throttles)
+            self._consecutive_throttles += 1
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            # Tokens only start to accumulate again once the pause is over
+            self._updated_at = self._paused_until
+
+    def succeeded(self):
+        with self._lock:
+            self._consecutive_throttles = 0
@@ -0,0 +1,106 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import threading
+
+
+class AccountOrdinals:
+    """Dense ordinals of account ids, the bit positions of an AccountSet.
+
+    Ids of the snapshot are numbered in order. Ids not seen before, for
+    example accounts reported by Identity Center which left the organization,
+    get the next free ordinal.
+    """
+
+    def __init__(self, account_ids=()):
+        self._lock = threading.Lock()
+        self.ids = []
+        self.ordinals = {}
+        for account_id in account_ids:
+            self.ordinal(account_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ordinal(self, account_id):
+        ordinal = self.ordinals.get(account_id)
+        if ordinal is None:
+            with self._lock:
+                ordinal = self.ordinals.setdefault(account_id, len(self.ids))
+                if ordinal == len(self.ids):
+                    self.ids.append(account_id)
+        return ordinal
+
+    def set_of(self, account_ids):
+        bitmap = bytearray()
+        for ordinal in map(self.ordinal, account_ids):
+            if ordinal >> 3 >= len(bitmap):
+                bitmap.extend(bytes((ordinal >> 3) - len(bitmap) + 1))
+            bitmap[ordinal >> 3] |= 1 << (ordinal & 7)
+        return AccountSet(self, int.from_bytes(bitmap, "little"))
+
+    def range(self, start, end):
+        """Accounts with ordinals start to end, a subtree of the snapshot"""
+        return AccountSet(self, ((1 << (end - start)) - 1) << start if end > start else 0)
+
+    def empty(self):
+        return AccountSet(self, 0)
+
+
+class AccountSet:
+    """Immutable set of account ids stored as a bitset over AccountOrdinals.
+
+    Union, intersection and difference are single integer operations. Ids
+    are only materialized when the set is iterated, in ordinal order.
+    """
+
+    __slots__ = ("ordinals", "bits")
+
+    def __init__(self, ordinals, bits=0):
+        self.ordinals = ordinals
+        self.bits = bits
+
+    def _bits_of(self, other):
+        if other.ordinals is self.ordinals:
+            return other.bits
+        # Sets of different snapshots are renumbered into this one
+        return self.ordinals.set_of(other).bits
+
+    def __or__(self, other):
+        return AccountSet(self.ordinals, self.bits | self._bits_of(other))
+
+    def __and__(self, other):
+        return AccountSet(self.ordinals, self.bits & self._bits_of(other))
+
+    def __sub__(self, other):
+        return AccountSet(self.ordinals, self.bits & ~self._bits_of(other))
+
+    def __eq__(self, other):
+        return isinstance(other, AccountSet) and self.bits == self._bits_of(other)
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, account_id):
+        ordinal = self.ordinals.ordinals.get(account_id)
+        return ordinal is not None and (self.bits >> ordinal) & 1 == 1
+
+    def __iter__(self):
+        ids = self.ordinals.ids
+        bitmap = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        for index, byte in enumerate(bitmap):
+            while byte:
+                low = byte & -byte
+                yield ids[(index << 3) + low.bit_length() - 1]
+                byte ^= low
+
+    def __repr__(self):
+        return f"AccountSet({list(self)})"
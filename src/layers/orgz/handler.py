@@ -3,10 +3,16 @@
 # SPDX-License-Identifier: MIT-0
 ################################################################################
 
+import threading
+import time
+from dataclasses import dataclass
 
 from botocore.config import Config
 from aws_lambda_powertools import Logger
 
+from orgz import tag_expression
+from orgz.account_set import AccountOrdinals, AccountSet
+
 
 """
 Paginator used with certain boto3 calls
@@ -23,6 +29,267 @@ def paginator(method, **kwargs):
             yield result
 
 
+@dataclass(frozen=True)
+class TopologySnapshot:  # pylint: disable=R0902
+    """One load of the Organization tree, indexed by OU id, OU path and account id.
+
+    Accounts are kept in depth-first order of the tree, so the accounts of an
+    OU and all of its descendant OUs form one contiguous slice. Their
+    positions are the ordinals of the AccountSet bitsets built from the
+    snapshot, where a subtree is a contiguous range of bits. The dicts are
+    never changed once the snapshot is built.
+    """
+
+    root_id: str
+    ous: dict
+    ou_paths: dict
+    accounts: dict
+    parent_accounts: dict
+    subtree_ranges: dict
+    active_account_ids: tuple
+    ordinals: AccountOrdinals
+    active_set: AccountSet
+
+    @classmethod
+    def build(cls, root_id, ous, accounts, parent_accounts, ou_children):
+        subtree_accounts, subtree_ranges = cls._index_subtrees(
+            root_id, ou_children, parent_accounts
+        )
+        active_account_ids = tuple(Organizations.filter_active_accounts(accounts.values()))
+        ordinals = AccountOrdinals(subtree_accounts)
+        return cls(
+            root_id=root_id,
+            ous=ous,
+            ou_paths={ou["Path"]: ou_id for ou_id, ou in ous.items()},
+            accounts=accounts,
+            parent_accounts=parent_accounts,
+            subtree_ranges=subtree_ranges,
+            active_account_ids=active_account_ids,
+            ordinals=ordinals,
+            active_set=ordinals.set_of(active_account_ids),
+        )
+
+    @staticmethod
+    def _index_subtrees(root_id, ou_children, parent_accounts):
+        """Orders accounts depth-first and records the slice of each subtree"""
+        order = []
+        ranges = {}
+        stack = [(root_id, False)]
+        while stack:
+            node_id, visited = stack.pop()
+            if visited:
+                ranges[node_id] = (ranges[node_id], len(order))
+                continue
+            ranges[node_id] = len(order)
+            order.extend(parent_accounts.get(node_id, []))
+            stack.append((node_id, True))
+            stack.extend((child_id, False) for child_id in reversed(ou_children.get(node_id, [])))
+        return order, ranges
+
+    def get_ou_id_for_path(self, path):
+        path = path.strip("/")
+        if not path:
+            return self.root_id
+        return self.ou_paths.get(path)
+
+    def get_accounts_for_parent(self, parent_id):
+        return [self.accounts[account_id] for account_id in self.parent_accounts.get(parent_id, [])]
+
+    def get_parent_set(self, parent_id):
+        """Accounts directly under the parent, the first bits of its subtree range"""
+        start, _ = self.subtree_ranges.get(parent_id, (0, 0))
+        return self.ordinals.range(start, start + len(self.parent_accounts.get(parent_id, [])))
+
+    def get_subtree_set(self, parent_id):
+        return self.ordinals.range(*self.subtree_ranges.get(parent_id, (0, 0)))
+
+    def get_ancestor_ids(self, ou_id):
+        """OU ids above the OU, nearest first, excluding the root"""
+        ancestor_ids = []
+        parent_id = self.ous[ou_id]["ParentId"]
+        while parent_id in self.ous:
+            ancestor_ids.append(parent_id)
+            parent_id = self.ous[parent_id]["ParentId"]
+        return ancestor_ids
+
+
+class OrganizationTopology:
+    """Lazily loaded snapshot of the Organization tree.
+
+    The OU tree, the accounts and their parents are loaded once with paginated
+    bulk calls into a TopologySnapshot, which is reloaded once it is older than
+    ``ttl`` seconds. A load publishes the new snapshot with one assignment to
+    ``snapshot``; readers take that reference once per call, so they never see
+    parts of two loads.
+    """
+
+    # Lookups for unknown paths force a reload, but not more often than this.
+    min_refresh_interval = 30
+
+    def __init__(self, client, ttl=300):
+        self.client = client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.snapshot = TopologySnapshot.build(None, {}, {}, {}, {})
+
+    def age(self):
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def is_expired(self):
+        age = self.age()
+        return age is None or age > self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def ensure_fresh(self):
+        """Returns the current snapshot, loaded first if it expired"""
+        if self.is_expired():
+            with self._lock:
+                if self.is_expired():
+                    self._load()
+        return self.snapshot
+
+    def refresh(self, force=False):
+        """Reloads the snapshot, unless it was loaded less than min_refresh_interval ago"""
+        with self._lock:
+            age = self.age()
+            if force or age is None or age > self.min_refresh_interval:
+                self._load()
+                return True
+        return False
+
+    def _load(self):
+        root_id = self.client.list_roots().get("Roots")[0].get("Id")
+        ous = {}
+        accounts = {}
+        parent_accounts = {}
+        ou_children = {}
+
+        parents = [(root_id, "")]
+        while parents:
+            parent_id, parent_path = parents.pop(0)
+            parent_accounts[parent_id] = []
+            for account in paginator(self.client.list_accounts_for_parent, ParentId=parent_id):
+                accounts[account["Id"]] = account
+                parent_accounts[parent_id].append(account["Id"])
+            for ou in paginator(
+                self.client.list_organizational_units_for_parent, ParentId=parent_id
+            ):
+                path = Organizations.determine_ou_path(parent_path, ou["Name"])
+                ous[ou["Id"]] = {**ou, "ParentId": parent_id, "Path": path}
+                ou_children.setdefault(parent_id, []).append(ou["Id"])
+                parents.append((ou["Id"], path))
+
+        self.snapshot = TopologySnapshot.build(root_id, ous, accounts, parent_accounts, ou_children)
+        self._loaded_at = time.monotonic()
+        logger.info(
+            "Loaded organization snapshot with %s OUs and %s accounts", len(ous), len(accounts)
+        )
+
+
+@dataclass(frozen=True)
+class TagSnapshot:
+    """Tags of the accounts, account id -> tags and tag key -> tag value -> account ids"""
+
+    account_tags: dict
+    tag_accounts: dict
+
+    def get_account_ids(self, tags):
+        """Accounts having all tag keys, each with one of the given values"""
+        matches = None
+        for key, values in tags.items():
+            values = values if isinstance(values, list) else [values]
+            accounts = set()
+            for value in values:
+                accounts |= self.tag_accounts.get(key, {}).get(value, set())
+            matches = accounts if matches is None else matches & accounts
+        return matches or set()
+
+
+class AccountTagIndex:
+    """Inverted index of account tags, tag key -> tag value -> account ids.
+
+    The index is built with one paginated get_resources sweep over the tagged
+    accounts and rebuilt once it is older than ``ttl`` seconds. Tag changes
+    seen in the meantime are applied with ``apply_tags`` and ``remove_tags``.
+
+    Dicts of a snapshot are never changed once it is published. Loads and tag
+    changes build a new snapshot and swap it in with one assignment, readers
+    take the ``snapshot`` reference once and need no lock.
+    """
+
+    def __init__(self, tags_client, ttl=300):
+        self.tags_client = tags_client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.snapshot = TagSnapshot({}, {})
+
+    def is_expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def ensure_fresh(self):
+        if self.is_expired():
+            with self._lock:
+                if self.is_expired():
+                    self._load()
+        return self
+
+    def _load(self):
+        account_tags = {}
+        tag_accounts = {}
+        for resource in paginator(
+            self.tags_client.get_resources, ResourceTypeFilters=["organizations:account"]
+        ):
+            account_id = resource["ResourceARN"].split("/")[-1]
+            account_tags[account_id] = {tag["Key"]: tag["Value"] for tag in resource["Tags"]}
+            for key, value in account_tags[account_id].items():
+                tag_accounts.setdefault(key, {}).setdefault(value, set()).add(account_id)
+        self.snapshot = TagSnapshot(account_tags, tag_accounts)
+        self._loaded_at = time.monotonic()
+        logger.info("Loaded tags of %s accounts", len(account_tags))
+
+    def apply_tags(self, account_id, tags):
+        """Adds or overwrites tags of an account"""
+        self._update(account_id, tags.keys(), tags)
+
+    def remove_tags(self, account_id, keys):
+        self._update(account_id, keys, {})
+
+    def _update(self, account_id, removed_keys, added_tags):
+        """Swaps in a copy of the snapshot where only the changed entries are rebuilt"""
+        with self._lock:
+            account_tags = dict(self.snapshot.account_tags)
+            tag_accounts = dict(self.snapshot.tag_accounts)
+            current = dict(account_tags.get(account_id, {}))
+            for key in removed_keys:
+                if key not in current:
+                    continue
+                values = dict(tag_accounts.get(key, {}))
+                remaining = values.get(current[key], set()) - {account_id}
+                if remaining:
+                    values[current[key]] = remaining
+                else:
+                    values.pop(current[key], None)
+                tag_accounts[key] = values
+                del current[key]
+            for key, value in added_tags.items():
+                values = dict(tag_accounts.get(key, {}))
+                values[value] = values.get(value, set()) | {account_id}
+                tag_accounts[key] = values
+                current[key] = value
+            account_tags[account_id] = current
+            self.snapshot = TagSnapshot(account_tags, tag_accounts)
+
+    def get_account_ids(self, tags):
+        return self.snapshot.get_account_ids(tags)
+
+
 class Organizations:  # pylint: disable=R0904,C0116
     """Class used for modeling Organizations"""
 
@@ -30,7 +297,7 @@ class Organizations:  # pylint: disable=R0904,C0116
 
     # As per configuration of ADF and actual deployments of organisation, defaulting org region to us-east-1.
     # To accomodate future developments, leaving this as a parameter which can be overwritten from the labmda.
-    def __init__(self, role, account_id=None, region="us-east-1"):
+    def __init__(self, role, account_id=None, region="us-east-1", snapshot_ttl=300):
         self.client = role.client("organizations", config=Organizations._config)
         self.tags_client = role.client(
             "resourcegroupstaggingapi",
@@ -38,8 +305,9 @@ class Organizations:  # pylint: disable=R0904,C0116
             region_name=region,
         )
         self.account_id = account_id
-        self.account_ids = []
         self.root_id = None
+        self.topology = OrganizationTopology(self.client, ttl=snapshot_ttl)
+        self.tag_index = AccountTagIndex(self.tags_client, ttl=snapshot_ttl)
 
     def get_parent_info(self):
         response = self.list_parents(self.account_id)
@@ -77,6 +345,9 @@ class Organizations:  # pylint: disable=R0904,C0116
         return org_structure if counter > 4 else self.get_organization_map(org_structure, counter)
 
     def describe_ou_name(self, ou_id):
+        ou = self.topology.ensure_fresh().ous.get(ou_id)
+        if ou is not None:
+            return ou["Name"]
         try:
             response = self.client.describe_organizational_unit(OrganizationalUnitId=ou_id)
             return response["OrganizationalUnit"]["Name"]
@@ -87,24 +358,71 @@ class Organizations:  # pylint: disable=R0904,C0116
             logger.error("Exception: " + str(exception))
             raise (exception)
 
-    def get_accounts_ids(self):
-        for account in paginator(self.client.list_accounts):
-            if not account.get("Status") == "ACTIVE":
-                logger.warning("Account %s is not an Active AWS Account", account["Id"])
-                continue
-            self.account_ids.append(account["Id"])
-        return self.account_ids
-
-    def get_active_accounts_for_path(self, path):
+    @staticmethod
+    def filter_active_accounts(accounts):
         account_ids = []
-        for account in self.dir_to_ou(path):
+        for account in accounts:
             if not account.get("Status") == "ACTIVE":
                 logger.warning("Account %s is not an Active AWS Account", account["Id"])
                 continue
             account_ids.append(account["Id"])
         return account_ids
 
+    def get_accounts_ids(self):
+        """Active account ids of the snapshot, an immutable tuple shared until it expires"""
+        return self.topology.ensure_fresh().active_account_ids
+
+    def get_active_accounts_for_path(self, path, recursive=False):
+        """Active accounts directly under the OU, or in its whole subtree when recursive"""
+        return list(self.get_account_set_for_path(path, recursive))
+
+    def get_account_set_for_path(self, path, recursive=False):
+        """AccountSet of the active accounts directly under the OU, or in its whole subtree"""
+        snapshot = self.topology.ensure_fresh()
+        ou_id = snapshot.get_ou_id_for_path(path)
+        # The OU may have been created after the snapshot was taken
+        if ou_id is None and self.topology.refresh():
+            snapshot = self.topology.snapshot
+            ou_id = snapshot.get_ou_id_for_path(path)
+        if ou_id is None:
+            raise Exception("Path {0} failed to return a child OU".format(path))
+        if recursive:
+            accounts = snapshot.get_subtree_set(ou_id)
+        else:
+            accounts = snapshot.get_parent_set(ou_id)
+        active = accounts & snapshot.active_set
+        if len(active) < len(accounts):
+            logger.warning(
+                "%s accounts under %s are not Active AWS Accounts", len(accounts - active), path
+            )
+        return active
+
+    def get_active_account_set(self):
+        return self.topology.ensure_fresh().active_set
+
+    def get_account_set(self, account_ids):
+        return self.topology.ensure_fresh().ordinals.set_of(account_ids)
+
+    def get_ancestor_ou_ids(self, ou_id):
+        return self._snapshot_with_ou(ou_id).get_ancestor_ids(ou_id)
+
+    def get_ou_path(self, ou_id):
+        """Path of the OU below the root, the OrganizationalUnitName of OU mappings"""
+        return self._snapshot_with_ou(ou_id).ous[ou_id]["Path"]
+
+    def _snapshot_with_ou(self, ou_id):
+        snapshot = self.topology.ensure_fresh()
+        # The OU may have been created after the snapshot was taken
+        if ou_id not in snapshot.ous and self.topology.refresh():
+            snapshot = self.topology.snapshot
+        if ou_id not in snapshot.ous:
+            raise Exception("OU {0} was not found in the Organization".format(ou_id))
+        return snapshot
+
     def describe_account(self, account_id):
+        account = self.topology.ensure_fresh().accounts.get(account_id)
+        if account is not None:
+            return {"Account": account}
         return self.client.describe_account(AccountId=account_id)
 
     @staticmethod
@@ -157,23 +475,18 @@ class Organizations:  # pylint: disable=R0904,C0116
         )
 
     def get_account_ids_for_tags(self, tags):
-        tag_filter = []
-        for key, value in tags.items():
-            if isinstance(value, list):
-                values = value
-            else:
-                values = [value]
-            tag_filter.append({"Key": key, "Values": values})
-        account_ids = []
-        for resource in paginator(
-            self.tags_client.get_resources,
-            TagFilters=tag_filter,
-            ResourceTypeFilters=["organizations"],
-        ):
-            arn = resource["ResourceARN"]
-            account_id = arn.split("/")[::-1][0]
-            account_ids.append(account_id)
-        return account_ids
+        return sorted(self.tag_index.ensure_fresh().get_account_ids(tags))
+
+    def get_account_set_for_tag_expression(self, expression):
+        """AccountSet of the active accounts matching a boolean tag expression"""
+        tags = self.tag_index.ensure_fresh().snapshot
+        snapshot = self.topology.ensure_fresh()
+        account_set = tag_expression.evaluate(
+            tag_expression.parse(expression),
+            lambda key, values: snapshot.ordinals.set_of(tags.get_account_ids({key: values})),
+            snapshot.active_set,
+        )
+        return account_set & snapshot.active_set
 
     def list_organizational_units_for_parent(self, parent_ou):
         organizational_units = [
@@ -0,0 +1,104 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+"""
+Boolean expressions over account tags used by tag ("t:") mappings.
+
+    expression := term | NOT expression | expression AND expression
+                | expression OR expression | ( expression )
+    term       := key=value[,value...]
+
+NOT binds tighter than AND, and AND tighter than OR. Operators are upper case
+words, a term matches accounts with the tag key set to any of the listed
+values. A single "key=value" term is the original tag mapping format.
+"""
+
+import operator
+import re
+from functools import reduce
+
+OPERATORS = ("AND", "OR", "NOT")
+_TOKENS = re.compile(r"(\(|\)|\bAND\b|\bOR\b|\bNOT\b)")
+
+
+class TagExpressionError(ValueError):
+    pass
+
+
+def tokenize(expression):
+    return [token.strip() for token in _TOKENS.split(expression) if token.strip()]
+
+
+def parse(expression):
+    """Parses an expression into nested tuples:
+    ("TAG", key, values), ("NOT", node), ("AND", node, ...) or ("OR", node, ...)
+    """
+    tokens = tokenize(expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise TagExpressionError(f"Unexpected end of tag expression '{expression}'")
+        position += 1
+        return token
+
+    def parse_operation(op_token, parse_operand):
+        operands = [parse_operand()]
+        while peek() == op_token:
+            take()
+            operands.append(parse_operand())
+        return operands[0] if len(operands) == 1 else (op_token, *operands)
+
+    def parse_or():
+        return parse_operation("OR", parse_and)
+
+    def parse_and():
+        return parse_operation("AND", parse_not)
+
+    def parse_not():
+        if peek() == "NOT":
+            take()
+            return ("NOT", parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        token = take()
+        if token == "(":
+            node = parse_or()
+            if take() != ")":
+                raise TagExpressionError(f"Missing ')' in tag expression '{expression}'")
+            return node
+        if token in OPERATORS or token == ")" or "=" not in token:
+            raise TagExpressionError(f"Unexpected '{token}' in tag expression '{expression}'")
+        key, values = token.split("=", 1)
+        values = [value.strip() for value in values.split(",")]
+        if not key.strip() or not all(values):
+            raise TagExpressionError(f"Invalid tag term '{token}' in '{expression}'")
+        return ("TAG", key.strip(), values)
+
+    node = parse_or()
+    if peek() is not None:
+        raise TagExpressionError(f"Unexpected '{peek()}' in tag expression '{expression}'")
+    return node
+
+
+def evaluate(node, lookup, universe):
+    """Evaluates a parsed expression with set algebra.
+
+    ``lookup(key, values)`` returns the accounts with one of the tag values and
+    ``universe`` the accounts NOT is taken against, as sets or AccountSets.
+    """
+    node_type, *operands = node
+    if node_type == "TAG":
+        return lookup(*operands)
+    if node_type == "NOT":
+        return universe - evaluate(operands[0], lookup, universe)
+    results = [evaluate(operand, lookup, universe) for operand in operands]
+    return reduce(operator.and_ if node_type == "AND" else operator.or_, results)
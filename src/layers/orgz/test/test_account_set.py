@@ -0,0 +1,42 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+
+from ..account_set import AccountOrdinals
+
+ACCOUNT_IDS = [f"1234567890{idx:02}" for idx in range(20)]
+
+
+class TestAccountSet(unittest.TestCase):  # pylint: disable=C0116
+    """Class used for testing account bitsets"""
+
+    ordinals = AccountOrdinals(ACCOUNT_IDS)
+
+    def test_0_set_algebra(self):
+        first = self.ordinals.set_of(ACCOUNT_IDS[:12])
+        second = self.ordinals.set_of(ACCOUNT_IDS[8:])
+        assert list(first | second) == ACCOUNT_IDS
+        assert list(first & second) == ACCOUNT_IDS[8:12]
+        assert list(first - second) == ACCOUNT_IDS[:8]
+        assert len(first) == 12
+        assert ACCOUNT_IDS[0] in first and ACCOUNT_IDS[0] not in second
+        assert "unknown" not in first
+        assert not self.ordinals.empty()
+        assert first - first == self.ordinals.empty()
+
+    def test_1_ranges(self):
+        assert list(self.ordinals.range(3, 11)) == ACCOUNT_IDS[3:11]
+        assert list(self.ordinals.range(5, 5)) == []
+
+    def test_2_unknown_and_foreign_ids(self):
+        ordinals = AccountOrdinals(ACCOUNT_IDS[:4])
+        accounts = ordinals.set_of([ACCOUNT_IDS[1], "999999999999"])
+        assert list(accounts) == [ACCOUNT_IDS[1], "999999999999"]
+        assert len(ordinals) == 5
+        # Sets of another snapshot are renumbered
+        foreign = self.ordinals.set_of([ACCOUNT_IDS[1], ACCOUNT_IDS[10]])
+        assert list(accounts - foreign) == ["999999999999"]
+        assert list(accounts | foreign) == [ACCOUNT_IDS[1], "999999999999", ACCOUNT_IDS[10]]
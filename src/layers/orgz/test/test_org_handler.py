@@ -17,6 +17,18 @@ from .. import handler
 logger = Logger()
 
 
+def account(account_id, status="ACTIVE"):
+    return {
+        "Id": account_id,
+        "Arn": "string",
+        "Email": "string",
+        "Name": "string",
+        "Status": status,
+        "JoinedMethod": "CREATED",
+        "JoinedTimestamp": datetime.datetime.now().isoformat(),
+    }
+
+
 class TestOrgLayer(unittest.TestCase):  # pylint: disable=R0904,C0116
     """Class used for testing Organizations layer"""
 
@@ -36,7 +48,7 @@ class TestOrgLayer(unittest.TestCase):  # pylint: disable=R0904,C0116
     with patch.object(handler.Organizations, "__init__", empty_class_init):
         organizations = handler.Organizations({})
         organizations.client = org_client
-        organizations.account_ids = []
+        organizations.topology = handler.OrganizationTopology(org_client)
 
     def test_0_get_ou_root_id(self):
         self.org_client_stubber.add_response(
@@ -135,54 +147,59 @@ class TestOrgLayer(unittest.TestCase):  # pylint: disable=R0904,C0116
         assert responce[2]["Id"] == "12345678993"
 
     def test_4_get_account_ids(self):
+        self.organizations.topology.invalidate()
+        self.org_client_stubber.add_response(
+            "list_roots",
+            {"Roots": [{"Id": "r-12id", "Arn": "string", "Name": "Root"}]},
+            {},
+        )
         self.org_client_stubber.add_response(
-            "list_accounts",
+            "list_accounts_for_parent",
+            {"Accounts": [account("12345678900"), account("12345678901", "SUSPENDED")]},
+            {"ParentId": "r-12id"},
+        )
+        self.org_client_stubber.add_response(
+            "list_organizational_units_for_parent",
+            {"OrganizationalUnits": [{"Id": "pathid", "Arn": "string", "Name": "path"}]},
+            {"ParentId": "r-12id"},
+        )
+        self.org_client_stubber.add_response(
+            "list_accounts_for_parent",
             {
                 "Accounts": [
-                    {
-                        "Id": "12345678990",
-                        "Arn": "string",
-                        "Email": "string",
-                        "Name": "string",
-                        "Status": "ACTIVE",
-                        "JoinedMethod": "CREATED",
-                        "JoinedTimestamp": datetime.datetime.now().isoformat(),
-                    },
-                    {
-                        "Id": "12345678992",
-                        "Arn": "string",
-                        "Email": "string",
-                        "Name": "string",
-                        "Status": "ACTIVE",
-                        "JoinedMethod": "CREATED",
-                        "JoinedTimestamp": datetime.datetime.now().isoformat(),
-                    },
-                    {
-                        "Id": "12345678993",
-                        "Arn": "string",
-                        "Email": "string",
-                        "Name": "string",
-                        "Status": "ACTIVE",
-                        "JoinedMethod": "CREATED",
-                        "JoinedTimestamp": datetime.datetime.now().isoformat(),
-                    },
-                ],
+                    account("12345678990"),
+                    account("12345678992"),
+                    account("12345678993"),
+                ]
             },
-            {},
+            {"ParentId": "pathid"},
+        )
+        self.org_client_stubber.add_response(
+            "list_organizational_units_for_parent",
+            {"OrganizationalUnits": []},
+            {"ParentId": "pathid"},
         )
         self.org_client_stubber.activate()
         responce = self.organizations.get_accounts_ids()
-        assert responce[0] == "12345678990"
-        assert responce[1] == "12345678992"
-        assert responce[2] == "12345678993"
-        self.organizations.get_accounts_ids = Mock()
-        self.organizations.get_accounts_ids.return_value = responce
+        assert responce == ("12345678900", "12345678990", "12345678992", "12345678993")
+        # Answered from the snapshot, the same ids on subsequent calls
+        assert self.organizations.get_accounts_ids() is responce
+        self.org_client_stubber.assert_no_pending_responses()
 
     def test_5_get_active_accounts_for_path(self):
         responce = list(self.organizations.get_active_accounts_for_path("/path"))
         assert responce[0] == "12345678990"
         assert responce[1] == "12345678992"
         assert responce[2] == "12345678993"
+        assert self.organizations.get_active_accounts_for_path("/") == ["12345678900"]
+        assert self.organizations.get_active_accounts_for_path("/", recursive=True) == [
+            "12345678900",
+            "12345678990",
+            "12345678992",
+            "12345678993",
+        ]
+        assert self.organizations.describe_ou_name("pathid") == "path"
+        assert self.organizations.describe_account("12345678992")["Account"]["Status"] == "ACTIVE"
 
     def test_6_list_parents(self):
         self.org_client_stubber.add_response(
@@ -221,6 +238,96 @@ class TestOrgLayer(unittest.TestCase):  # pylint: disable=R0904,C0116
         self.organizations.describe_account = Mock()
         self.organizations.describe_account.return_value = response
 
+    def test_9_subtree_index(self):
+        ou_children = {"r-12id": ["ou-a", "ou-b"], "ou-a": ["ou-a1"]}
+        parent_accounts = {"r-12id": ["1"], "ou-a": ["2"], "ou-a1": ["3", "4"], "ou-b": ["5"]}
+        order, ranges = handler.TopologySnapshot._index_subtrees(
+            "r-12id", ou_children, parent_accounts
+        )
+        assert order == ["1", "2", "3", "4", "5"]
+        assert ranges == {"r-12id": (0, 5), "ou-a": (1, 4), "ou-a1": (2, 4), "ou-b": (4, 5)}
+
+        ous = {
+            "ou-a": {"ParentId": "r-12id", "Path": "a"},
+            "ou-a1": {"ParentId": "ou-a", "Path": "a/a1"},
+            "ou-b": {"ParentId": "r-12id", "Path": "b"},
+        }
+        accounts = {account_id: account(account_id) for account_id in order}
+        snapshot = handler.TopologySnapshot.build(
+            "r-12id", ous, accounts, parent_accounts, ou_children
+        )
+        assert snapshot.get_ou_id_for_path("/a/a1") == "ou-a1"
+        assert snapshot.get_ou_id_for_path("/") == "r-12id"
+        assert list(snapshot.get_subtree_set("ou-a")) == ["2", "3", "4"]
+        assert list(snapshot.get_parent_set("ou-a")) == ["2"]
+        assert list(snapshot.get_parent_set("ou-a1")) == ["3", "4"]
+        assert list(snapshot.get_subtree_set("unknown")) == []
+        assert snapshot.get_ancestor_ids("ou-a1") == ["ou-a"]
+        assert snapshot.get_ancestor_ids("ou-b") == []
+
+    def test_10_account_tag_index(self):
+        tags_client = self.session.create_client("resourcegroupstaggingapi")
+        with Stubber(tags_client) as stubber:
+            stubber.add_response(
+                "get_resources",
+                {
+                    "ResourceTagMappingList": [
+                        {
+                            "ResourceARN": "arn:aws:organizations::1:account/o-1/12345678900",
+                            "Tags": [{"Key": "env", "Value": "prod"}],
+                        },
+                        {
+                            "ResourceARN": "arn:aws:organizations::1:account/o-1/12345678901",
+                            "Tags": [{"Key": "env", "Value": "dev"}, {"Key": "team", "Value": "a"}],
+                        },
+                    ]
+                },
+                {"ResourceTypeFilters": ["organizations:account"]},
+            )
+            tag_index = handler.AccountTagIndex(tags_client).ensure_fresh()
+            # Served from the index until the ttl expires
+            tag_index.ensure_fresh()
+        assert tag_index.get_account_ids({"env": "prod"}) == {"12345678900"}
+        assert tag_index.get_account_ids({"env": ["prod", "dev"]}) == {
+            "12345678900",
+            "12345678901",
+        }
+        assert tag_index.get_account_ids({"env": "dev", "team": "a"}) == {"12345678901"}
+        tag_index.apply_tags("12345678900", {"env": "dev", "team": "a"})
+        assert tag_index.get_account_ids({"env": "prod"}) == set()
+        assert tag_index.get_account_ids({"team": "a"}) == {"12345678900", "12345678901"}
+        snapshot = tag_index.snapshot
+        tag_index.remove_tags("12345678901", ["team"])
+        assert tag_index.get_account_ids({"team": "a"}) == {"12345678900"}
+        assert tag_index.snapshot.account_tags["12345678901"] == {"env": "dev"}
+        # Tag changes swap in a new snapshot, the previous one is left untouched
+        assert snapshot.tag_accounts["team"]["a"] == {"12345678900", "12345678901"}
+        assert snapshot.account_tags["12345678901"] == {"env": "dev", "team": "a"}
+
+    def test_11_reload_swaps_the_snapshot(self):
+        org_client = self.session.create_client("organizations")
+        topology = handler.OrganizationTopology(org_client)
+        with Stubber(org_client) as stubber:
+            for accounts in ([account("12345678900")], []):
+                stubber.add_response(
+                    "list_roots", {"Roots": [{"Id": "r-12id", "Arn": "string", "Name": "Root"}]}, {}
+                )
+                stubber.add_response(
+                    "list_accounts_for_parent", {"Accounts": accounts}, {"ParentId": "r-12id"}
+                )
+                stubber.add_response(
+                    "list_organizational_units_for_parent",
+                    {"OrganizationalUnits": []},
+                    {"ParentId": "r-12id"},
+                )
+            snapshot = topology.ensure_fresh()
+            assert topology.refresh(force=True)
+        # Readers holding the previous snapshot keep a consistent view of it
+        assert snapshot.active_account_ids == ("12345678900",)
+        assert list(snapshot.active_set) == ["12345678900"]
+        assert topology.ensure_fresh() is not snapshot
+        assert topology.ensure_fresh().active_account_ids == ()
+
     def get_mocked_org(self):
         self.test_0_get_ou_root_id()
         self.test_1_get_child_ous()
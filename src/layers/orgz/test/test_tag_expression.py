@@ -0,0 +1,54 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import unittest
+
+from .. import tag_expression
+
+ACCOUNT_TAGS = {
+    "1": {"env": "prod", "team": "payments"},
+    "2": {"env": "prod", "team": "search"},
+    "3": {"env": "dev", "team": "payments"},
+    "4": {"env": "staging"},
+}
+
+
+def lookup(key, values):
+    return {account for account, tags in ACCOUNT_TAGS.items() if tags.get(key) in values}
+
+
+def matches(expression):
+    return tag_expression.evaluate(tag_expression.parse(expression), lookup, set(ACCOUNT_TAGS))
+
+
+class TestTagExpression(unittest.TestCase):  # pylint: disable=C0116
+    """Class used for testing tag expressions"""
+
+    def test_0_parse(self):
+        assert tag_expression.parse("env=prod") == ("TAG", "env", ["prod"])
+        assert tag_expression.parse("NOT a=1 AND b=2, 3 OR c=x y") == (
+            "OR",
+            ("AND", ("NOT", ("TAG", "a", ["1"])), ("TAG", "b", ["2", "3"])),
+            ("TAG", "c", ["x y"]),
+        )
+        assert tag_expression.parse("a=1 AND (b=2 OR c=3)") == (
+            "AND",
+            ("TAG", "a", ["1"]),
+            ("OR", ("TAG", "b", ["2"]), ("TAG", "c", ["3"])),
+        )
+
+    def test_1_evaluate(self):
+        assert matches("env=prod") == {"1", "2"}
+        assert matches("env=prod AND team=payments") == {"1"}
+        assert matches("env=dev OR team=search") == {"2", "3"}
+        assert matches("env=prod,staging") == {"1", "2", "4"}
+        assert matches("NOT team=payments") == {"2", "4"}
+        assert matches("NOT (env=prod OR env=dev)") == {"4"}
+        assert matches("env=prod AND NOT team=search") == {"1"}
+
+    def test_2_invalid(self):
+        for expression in ["", "env", "env=prod AND", "(env=prod", "env=prod)", "env=", "=prod"]:
+            with self.assertRaises(tag_expression.TagExpressionError):
+                tag_expression.parse(expression)
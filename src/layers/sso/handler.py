@@ -3,6 +3,11 @@
 # SPDX-License-Identifier: MIT-0
 ################################################################################
 
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
 from aws_lambda_powertools import Logger
 import boto3
 
@@ -16,11 +21,11 @@ class SsoService:  # pylint: disable=R0904
     client: boto3.session.Session.client
     instance_arn: str
     identity_store_id: str
-    permission_sets: dict
+    permission_sets: "PermissionSetCatalogue"
 
-    def __init__(self, boto_session):
+    def __init__(self, boto_session, config=None):
         try:
-            self.client = boto_session.client("sso-admin")
+            self.client = boto_session.client("sso-admin", config=config)
             self.get_sso_data()
         except Exception as exception:
             # If Exception occurs, parse Response and write it to Error Topic.
@@ -33,24 +38,166 @@ class SsoService:  # pylint: disable=R0904
         self.instance_arn = response["InstanceArn"]
         self.identity_store_id = response["IdentityStoreId"]
 
-    def get_permission_sets(self):
-        ps_arns = []
-        responces = list(
-            self.client.get_paginator("list_permission_sets").paginate(
-                InstanceArn=self.instance_arn
-            )
+    def list_accounts_for_provisioned_permission_set(self, permission_set_arn):
+        for page in self.client.get_paginator(
+            "list_accounts_for_provisioned_permission_set"
+        ).paginate(InstanceArn=self.instance_arn, PermissionSetArn=permission_set_arn):
+            yield from page["AccountIds"]
+
+    def list_account_assignments(self, account_id, permission_set_arn):
+        for page in self.client.get_paginator("list_account_assignments").paginate(
+            InstanceArn=self.instance_arn,
+            AccountId=account_id,
+            PermissionSetArn=permission_set_arn,
+        ):
+            yield from page["AccountAssignments"]
+
+    def get_permission_sets(self, ttl=300, max_workers=8):
+        """Returns a lazy catalogue of permission sets keyed by name"""
+        self.permission_sets = PermissionSetCatalogue(
+            self.client, self.instance_arn, ttl=ttl, max_workers=max_workers
         )
-        for responce in responces:
-            ps_arns += responce["PermissionSets"]
-
-        self.permission_sets = {
-            ps["PermissionSet"]["Name"]: ps["PermissionSet"]
-            for ps_arn in ps_arns
-            if (
-                ps := self.client.describe_permission_set(
-                    InstanceArn=self.instance_arn, PermissionSetArn=ps_arn
-                )
-            )
-            is not None
-        }
         return self.permission_sets
+
+
+class PermissionSetCatalogue(Mapping):
+    """Permission sets of an instance keyed by name, described on first use.
+
+    The ARN list is re-read once it is older than ``ttl`` seconds or when
+    ``refresh`` is called. Only ARNs that were not seen before are described,
+    concurrently in a thread pool, and only when a name cannot be found among
+    the permission sets described so far.
+
+    The lock only guards the dictionaries, API calls are made without it. A
+    refresh or description already in flight is waited for, not repeated.
+
+    Permission sets dropped by a refresh stay available from ``get_removed``,
+    their assignments are deleted after the permission set is gone.
+    """
+
+    # Lookups for unknown names re-read the ARN list, but not more often than this.
+    min_refresh_interval = 30
+
+    def __init__(self, client, instance_arn, ttl=300, max_workers=8):
+        self.client = client
+        self.instance_arn = instance_arn
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._listed_at = None
+        self._arns = []
+        self._by_arn = {}
+        self._by_name = {}
+        self._removed = {}
+        self._refreshing = None
+        self._describing = {}
+
+    def __getitem__(self, name):
+        self._refresh(max_age=self.ttl)
+        permission_set = self._get(name)
+        if permission_set is None and self._describe_pending():
+            permission_set = self._get(name)
+        # The permission set may have been created after the ARN list was read
+        if permission_set is None and self._refresh(max_age=self.min_refresh_interval):
+            self._describe_pending()
+            permission_set = self._get(name)
+        if permission_set is None:
+            raise KeyError(name)
+        return permission_set
+
+    def __iter__(self):
+        self._refresh(max_age=self.ttl)
+        self._describe_pending()
+        with self._lock:
+            return iter(list(self._by_name))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def refresh(self):
+        """Re-reads the ARN list and drops permission sets which no longer exist"""
+        self._refresh()
+
+    def get_removed(self, name):
+        """Returns a permission set dropped by a refresh, or None"""
+        with self._lock:
+            return self._removed.get(name)
+
+    def _get(self, name):
+        with self._lock:
+            return self._by_name.get(name)
+
+    def _is_older_than(self, seconds):
+        return self._listed_at is None or time.monotonic() - self._listed_at > seconds
+
+    def _refresh(self, max_age=None):
+        """Re-reads the ARN list when it is older than max_age, returns whether it was re-read"""
+        with self._lock:
+            if max_age is not None and not self._is_older_than(max_age):
+                return False
+            in_flight = self._refreshing
+            if in_flight is None:
+                self._refreshing = threading.Event()
+        if in_flight is not None:
+            in_flight.wait()
+            return True
+        try:
+            arns = []
+            for page in self.client.get_paginator("list_permission_sets").paginate(
+                InstanceArn=self.instance_arn
+            ):
+                arns += page["PermissionSets"]
+            with self._lock:
+                removed = set(self._arns) - set(arns)
+                for arn in removed:
+                    permission_set = self._by_arn.pop(arn, None)
+                    if permission_set is not None:
+                        self._by_name.pop(permission_set["Name"], None)
+                        self._removed[permission_set["Name"]] = permission_set
+                logger.info(
+                    "Permission set list refreshed: %s added, %s removed",
+                    len(set(arns) - set(self._arns)),
+                    len(removed),
+                )
+                self._arns = arns
+                self._listed_at = time.monotonic()
+        finally:
+            with self._lock:
+                done, self._refreshing = self._refreshing, None
+            done.set()
+        return True
+
+    def _describe(self, arn):
+        return self.client.describe_permission_set(
+            InstanceArn=self.instance_arn, PermissionSetArn=arn
+        )["PermissionSet"]
+
+    def _describe_pending(self):
+        """Describes the listed ARNs not described yet, returns whether any were pending"""
+        with self._lock:
+            undescribed = [arn for arn in self._arns if arn not in self._by_arn]
+            pending = [arn for arn in undescribed if arn not in self._describing]
+            in_flight = {self._describing[arn] for arn in undescribed if arn in self._describing}
+            described = threading.Event()
+            for arn in pending:
+                self._describing[arn] = described
+        try:
+            if pending:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    permission_sets = list(executor.map(self._describe, pending))
+                with self._lock:
+                    for arn, permission_set in zip(pending, permission_sets):
+                        # Dropped by a refresh in the meantime
+                        if arn not in self._arns:
+                            continue
+                        self._by_arn[arn] = permission_set
+                        self._by_name[permission_set["Name"]] = permission_set
+                        self._removed.pop(permission_set["Name"], None)
+        finally:
+            with self._lock:
+                for arn in pending:
+                    self._describing.pop(arn, None)
+            described.set()
+        for event in in_flight:
+            event.wait()
+        return bool(undescribed)
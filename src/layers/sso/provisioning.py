@@ -0,0 +1,132 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import time
+from dataclasses import dataclass, field
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = Logger(child=True)
+
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_FAILED = "FAILED"
+
+# Status operation and response key per assignment action
+STATUS_OPERATIONS = {
+    "CREATE": (
+        "describe_account_assignment_creation_status",
+        "AccountAssignmentCreationRequestId",
+        "AccountAssignmentCreationStatus",
+    ),
+    "DELETE": (
+        "describe_account_assignment_deletion_status",
+        "AccountAssignmentDeletionRequestId",
+        "AccountAssignmentDeletionStatus",
+    ),
+}
+
+
+@dataclass
+class ProvisioningRequest:
+    message_id: str
+    target_id: str
+    action: str
+    sso: object
+    status: dict
+    submitted_at: float = field(default_factory=time.monotonic)
+    completed_at: float = None
+
+    @property
+    def state(self):
+        return self.status.get("Status")
+
+    @property
+    def latency(self):
+        return (self.completed_at or time.monotonic()) - self.submitted_at
+
+
+class ProvisioningTracker:
+    """Follows asynchronous account assignment requests until they complete.
+
+    Requests still in progress are polled in rounds, every ``poll_interval``
+    seconds, until they succeed, fail or ``deadline`` (a time.monotonic
+    value) is reached. Status calls share the rate limiter of the assignment
+    calls. A status call that fails keeps its request pending for the next
+    round.
+    """
+
+    def __init__(self, rate_limiter, poll_interval=2.0):
+        self.rate_limiter = rate_limiter
+        self.poll_interval = poll_interval
+        self.requests = []
+
+    def track(self, message_id, target_id, action, sso, status):
+        request = ProvisioningRequest(message_id, target_id, action, sso, status)
+        if request.state != STATUS_IN_PROGRESS:
+            request.completed_at = request.submitted_at
+        self.requests.append(request)
+        return request
+
+    def pending(self):
+        return [request for request in self.requests if request.state == STATUS_IN_PROGRESS]
+
+    def wait(self, executor, deadline):
+        """Polls pending requests and returns the requests which failed"""
+        while (pending := self.pending()) and time.monotonic() + self.poll_interval < deadline:
+            time.sleep(self.poll_interval)
+            list(executor.map(self._poll, pending))
+        self._report()
+        return [request for request in self.requests if request.state == STATUS_FAILED]
+
+    def _poll(self, request):
+        operation_name, request_id_key, status_key = STATUS_OPERATIONS[request.action]
+        self.rate_limiter.acquire()
+        try:
+            response = getattr(request.sso.client, operation_name)(
+                InstanceArn=request.sso.instance_arn,
+                **{request_id_key: request.status["RequestId"]},
+            )
+        except request.sso.client.exceptions.ThrottlingException:
+            self.rate_limiter.throttled()
+            return
+        except (ClientError, BotoCoreError) as exception:
+            logger.warning(
+                f"Failed to read the status of request {request.status['RequestId']}: {exception}"
+            )
+            return
+        self.rate_limiter.succeeded()
+        request.status = response[status_key]
+        if request.state != STATUS_IN_PROGRESS:
+            request.completed_at = time.monotonic()
+
+    def _report(self):
+        for request in self.requests:
+            logger.info(
+                {
+                    "message": "Account assignment provisioning status",
+                    "MessageId": request.message_id,
+                    "RequestId": request.status.get("RequestId"),
+                    "Action": request.action,
+                    "TargetId": request.target_id,
+                    "Status": request.state,
+                    "FailureReason": request.status.get("FailureReason"),
+                    "LatencySeconds": round(request.latency, 3),
+                }
+            )
+        completed = [request for request in self.requests if request.completed_at is not None]
+        if completed:
+            latencies = [request.latency for request in completed]
+            logger.info(
+                {
+                    "message": "Account assignment provisioning summary",
+                    "Requests": len(self.requests),
+                    "Completed": len(completed),
+                    "Failed": len([r for r in completed if r.state == STATUS_FAILED]),
+                    "StillInProgress": len(self.requests) - len(completed),
+                    "AverageLatencySeconds": round(sum(latencies) / len(latencies), 3),
+                    "MaxLatencySeconds": round(max(latencies), 3),
+                }
+            )
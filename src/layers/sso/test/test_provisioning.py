@@ -0,0 +1,51 @@
+################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+################################################################################
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import botocore
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from .. import provisioning
+
+"""
+Provisioning tracker testing class
+"""
+
+
+class TestProvisioningTracker(unittest.TestCase):  # pylint: disable=R0904,C0116
+    def test_0_transient_status_errors_are_retried(self):
+        sso = Mock()
+        sso.instance_arn = "instance-arn"
+        sso.client.exceptions = botocore.session.get_session().create_client("sso-admin").exceptions
+        sso.client.describe_account_assignment_creation_status.side_effect = [
+            ClientError(
+                {"Error": {"Code": "InternalServerException", "Message": "Internal error"}},
+                "DescribeAccountAssignmentCreationStatus",
+            ),
+            EndpointConnectionError(endpoint_url="https://sso.us-east-1.amazonaws.com"),
+            {
+                "AccountAssignmentCreationStatus": {
+                    "RequestId": "request-1",
+                    "Status": "SUCCEEDED",
+                }
+            },
+        ]
+        tracker = provisioning.ProvisioningTracker(Mock(), poll_interval=0)
+        request = tracker.track(
+            "message-1",
+            "111111111111",
+            "CREATE",
+            sso,
+            {"RequestId": "request-1", "Status": "IN_PROGRESS"},
+        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            failed = tracker.wait(executor, deadline=time.monotonic() + 5)
+        assert failed == []
+        assert request.state == "SUCCEEDED"
+        assert sso.client.describe_account_assignment_creation_status.call_count == 3
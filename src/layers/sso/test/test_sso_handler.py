@@ -5,10 +5,13 @@
 
 
 import datetime
+import threading
+import time
 import unittest
 import botocore
 
 
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 from botocore.stub import Stubber, ANY
 from aws_lambda_powertools import Logger
@@ -138,10 +141,89 @@ class TestSsoLayer(unittest.TestCase):
             sso = handler.SsoService({})
             sso.client = self.sso_client
             sso.get_sso_data()
-            responce = sso.get_permission_sets()
+            responce = sso.get_permission_sets(max_workers=1)
         assert sso.instance_arn == "arn:aws:iam::112223334444:ssoinstance"
         assert sso.identity_store_id == "d-2b57a3f2cb"
         assert sso.permission_sets != None
+        # Permission sets are only listed and described on first use
+        assert "AWSReadOnlyAccess" in responce
+        assert sorted(responce) == ["AWSReadOnlyAccess", "AWSReadOnlyAccess1", "AWSReadOnlyAccess2"]
+        self.sso_client_stubber.assert_no_pending_responses()
         sso.get_permission_sets = Mock()
         sso.get_permission_sets.return_value = responce
         return sso
+
+    def test_1_permission_set_catalogue_refresh(self):
+        sso_client = botocore.session.get_session().create_client("sso-admin")
+        stubber = Stubber(sso_client)
+        instance_arn = "arn:aws:iam::112223334444:ssoinstance"
+        ps_arn = "arn:aws:sso:::permissionSet/ssoins-72238dcf2af4d70c/{0}".format
+
+        def add_list_response(arns):
+            stubber.add_response(
+                "list_permission_sets", {"PermissionSets": arns}, {"InstanceArn": instance_arn}
+            )
+
+        def add_describe_response(arn, name):
+            stubber.add_response(
+                "describe_permission_set",
+                {"PermissionSet": {"Name": name, "PermissionSetArn": arn}},
+                {"InstanceArn": instance_arn, "PermissionSetArn": arn},
+            )
+
+        add_list_response([ps_arn("ps-1"), ps_arn("ps-2")])
+        add_describe_response(ps_arn("ps-1"), "ReadOnly")
+        add_describe_response(ps_arn("ps-2"), "Admin")
+        # Refresh drops ps-2 and only describes the new ps-3
+        add_list_response([ps_arn("ps-1"), ps_arn("ps-3")])
+        add_describe_response(ps_arn("ps-3"), "Billing")
+        stubber.activate()
+
+        catalogue = handler.PermissionSetCatalogue(sso_client, instance_arn, max_workers=1)
+        assert catalogue["Admin"]["PermissionSetArn"] == ps_arn("ps-2")
+        assert catalogue.get("ReadOnly")["PermissionSetArn"] == ps_arn("ps-1")
+        catalogue.refresh()
+        assert "Admin" not in catalogue
+        # Assignments of the removed permission set can still be deleted
+        assert catalogue.get_removed("Admin")["PermissionSetArn"] == ps_arn("ps-2")
+        assert catalogue.get_removed("ReadOnly") is None
+        assert catalogue["Billing"]["PermissionSetArn"] == ps_arn("ps-3")
+        stubber.assert_no_pending_responses()
+
+    def test_2_permission_set_catalogue_describes_without_the_lock(self):
+        ps_arn = "arn:aws:sso:::permissionSet/ssoins-72238dcf2af4d70c/{0}".format
+        release = threading.Event()
+        sso_client = Mock()
+        sso_client.get_paginator.return_value.paginate.return_value = [
+            {"PermissionSets": [ps_arn("ps-1")]}
+        ]
+
+        def describe_permission_set(InstanceArn, PermissionSetArn):
+            if PermissionSetArn == ps_arn("ps-2"):
+                release.wait(5)
+                return {"PermissionSet": {"Name": "New", "PermissionSetArn": PermissionSetArn}}
+            return {"PermissionSet": {"Name": "ReadOnly", "PermissionSetArn": PermissionSetArn}}
+
+        sso_client.describe_permission_set.side_effect = describe_permission_set
+        catalogue = handler.PermissionSetCatalogue(sso_client, "instance-arn", max_workers=1)
+        assert catalogue["ReadOnly"]["PermissionSetArn"] == ps_arn("ps-1")
+        sso_client.get_paginator.return_value.paginate.return_value = [
+            {"PermissionSets": [ps_arn("ps-1"), ps_arn("ps-2")]}
+        ]
+        catalogue.refresh()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lookups = [executor.submit(catalogue.__getitem__, "New") for _ in range(2)]
+            time.sleep(0.1)
+            # Answered while ps-2 is being described
+            started = time.monotonic()
+            assert catalogue["ReadOnly"]["PermissionSetArn"] == ps_arn("ps-1")
+            assert time.monotonic() - started < 1
+            release.set()
+            assert [lookup.result()["Name"] for lookup in lookups] == ["New", "New"]
+        # The second lookup waited for the description in flight
+        described = [
+            call.kwargs["PermissionSetArn"]
+            for call in sso_client.describe_permission_set.call_args_list
+        ]
+        assert described == [ps_arn("ps-1"), ps_arn("ps-2")]